@@ -3,50 +3,310 @@ CS410 Mountain Group
 UkrainianConflict Dashboard
 """
 
-from datetime import date, timedelta
-
-from dash import Dash, dcc, html, Input, Output, dash_table
+import copy
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+import json
+import os
+import re
+import threading
+
+from dash import Dash, dcc, html, Input, Output, State, ClientsideFunction, dash_table
+from flask import Response
 import dash_bootstrap_components as dbc
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from datastore import DataStore
+from metrics import CallbackMetrics
+
 # Global Variables
 ## For QA purposes, we will cut off date ranges to this set time period
 START_DATE = date(2022, 11, 16)
 END_DATE = date(2022, 12, 5)
-TIME_DELTA = (END_DATE - START_DATE).days
-
-CITIES = {
-    "Kyiv": [50.449644, 30.519342],
-    "Kharkiv": [49.988321, 36.233442],
-    "Odesa": [46.460506, 30.731895],
-    "Dnipro": [48.459777, 35.039044],
-    "Donetsk": [47.986991, 37.788138],
-    "Zaporizhzhia": [47.844157, 35.158049],
-    "Lviv": [49.836399, 24.021443],
-    "Kryvyi Rih": [47.904343, 33.410210],
-    "Mykolaiv": [46.959381, 32.003766],
-    "Sevastopol": [44.560571, 33.615098],
-    "Mariupol": [47.106867, 37.562065],
-    "Luhansk": [48.560943, 39.348395]
-    }
-CITIES = pd.DataFrame(CITIES).T.rename({0:"lat", 1:"lon"}, axis=1)
+## With a number of days, the window instead ends today (UTC) and rolls
+## forward without a restart
+WINDOW_DAYS = int(os.environ.get("DASHBOARD_WINDOW_DAYS", 0))
+
+# Location coordinates, a copy of the labeling pipeline's gazetteer
+## (extract_data/data/ukraine-gazetteer.csv) shipped with the dashboard
+GAZETTEER = os.environ.get(
+    "DASHBOARD_GAZETTEER",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ukraine-gazetteer.csv"))
+if not os.path.isfile(GAZETTEER):
+    raise FileNotFoundError(f"Location gazetteer {GAZETTEER} not found, copy "
+                            "extract_data/data/ukraine-gazetteer.csv there or set "
+                            "DASHBOARD_GAZETTEER to its path")
+CITIES = pd.read_csv(GAZETTEER, index_col="name", keep_default_na=False)[["lat", "lon"]]
+
+# Labeled datasets, either CSV files/URLs or Parquet datasets partitioned by day
+## Overridden with environment variables, e.g. to serve local pipeline output
+HEADLINES_SOURCE = os.environ.get(
+    "DASHBOARD_HEADLINES_SOURCE",
+    "https://cs410-redis-sentiment-project.s3.us-west-2.amazonaws.com/UkrainianConflict-headlines-labeled.csv")
+COMMENTS_SOURCE = os.environ.get(
+    "DASHBOARD_COMMENTS_SOURCE",
+    "https://cs410-redis-sentiment-project.s3.us-west-2.amazonaws.com/UkrainianConflict-comments-labeled-updated.csv")
+## Downloaded sources are cached here and revalidated on every refresh
+CACHE_DIR = os.environ.get("DASHBOARD_CACHE_DIR",
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+## Seconds between background refreshes, 0 loads the data once
+REFRESH_SECONDS = float(os.environ.get("DASHBOARD_REFRESH_SECONDS", 300))
+## Comments shown as bars in the thread barchart, the rest are one "other" bar
+COMMENT_TOP_N = int(os.environ.get("DASHBOARD_COMMENT_TOP_N", 10))
+## Characters of a comment on the barchart axis and per hover text line
+HOVER_WIDTH = 30
+## Labeled CSV or Parquet files dropped here are appended to the running
+## app, their name tells if they hold "headlines" or "comments"
+DROP_DIR = os.environ.get("DASHBOARD_DROP_DIR", "")
+## Seconds between checks of DROP_DIR (and of the rolling window)
+INGEST_SECONDS = float(os.environ.get("DASHBOARD_INGEST_SECONDS", 10))
+## Workers of a multi-worker server map one Arrow copy of the data in
+## CACHE_DIR instead of each parsing their own, 0 disables
+SHARED_DATA = os.environ.get("DASHBOARD_SHARED_DATA", "1") != "0"
+## Only the columns used by the figures and callbacks are loaded
+HEADLINE_COLUMNS = ['created_utc', 'id', 'ups', 'downs', 'compound', 'city', 'headline']
+COMMENT_COLUMNS = ['created_utc', 'id', 'ups', 'compound', 'label', 'link_id', 'headline']
+## Directory of the summary tables written by extract_data/aggregate_data.py.
+## The overview panels are then served from them and startup does not wait
+## for the comments
+SUMMARY_SOURCE = os.environ.get("DASHBOARD_SUMMARY_SOURCE", "")
+## Summary source name to table directory and the columns loaded
+SUMMARY_TABLES = {'daily': 'daily_sentiment', 'cities': 'city_sentiment', 'threads': 'thread_sentiment'}
+SUMMARY_COLUMNS = {'daily': ['created_utc', 'kind', 'compound'],
+                   'cities': ['created_utc', 'city', 'count', 'compound'],
+                   'threads': ['created_utc', 'post_id', 'compound', 'negative', 'neutral', 'positive']}
+
+def window() -> tuple:
+    """
+    First and last day shown, START_DATE and END_DATE unless WINDOW_DAYS is set
+    """
 
-# App Dataframe Initializations
-headlines = pd.read_csv("https://cs410-redis-sentiment-project.s3.us-west-2.amazonaws.com/UkrainianConflict-headlines-labeled.csv")
-headlines['created_utc'] = pd.to_datetime(headlines['created_utc'])
-headlines = headlines[(headlines['created_utc'] >= str(START_DATE)) & (headlines['created_utc'] <= str(END_DATE))]
+    if not WINDOW_DAYS:
+        return START_DATE, END_DATE
+    today = datetime.now(timezone.utc).date()
+    return today - timedelta(WINDOW_DAYS - 1), today
+
+def load_labeled(source: str, columns: list, lineterminator: str = None) -> pd.DataFrame:
+    """
+    Load the given columns of a labeled dataset within the date window
+
+    Notes:
+        Parquet datasets (directories written by the pipeline with
+        --output-format parquet) and files are read column and day
+        partition wise, anything else is read as CSV
+
+    Keyword Arguments:
+        source (str): CSV path/URL or Parquet dataset directory
+        columns (list): Columns to load
+        lineterminator (str): CSV line terminator, comment bodies need "\n"
+
+    Returns:
+        pd.DataFrame: Labeled rows with created_utc parsed as datetime
+    """
+
+    start, end = window()
+    if os.path.isdir(source) or source.endswith('.parquet'):
+        labeled = pd.read_parquet(source,
+                                  columns=columns,
+                                  filters=[('created_utc', '>=', str(start)),
+                                           ('created_utc', '<=', str(end))])
+        labeled['created_utc'] = pd.to_datetime(labeled['created_utc'].astype(str))
+        return labeled
+
+    labeled = pd.read_csv(source, usecols=columns, lineterminator=lineterminator)
+    labeled['created_utc'] = pd.to_datetime(labeled['created_utc'])
+    return labeled[(labeled['created_utc'] >= str(start)) & (labeled['created_utc'] <= str(end))]
+
+def day_key(day) -> str:
+    """
+    Normalize a day (date picker string, date or timestamp) to a day index key
+
+    Keyword Arguments:
+        day: Day to normalize
+
+    Returns:
+        str: Day formatted as YYYY-MM-DD
+    """
+
+    return pd.Timestamp(day).strftime("%Y-%m-%d")
+
+def days_of(labeled: pd.DataFrame) -> np.ndarray:
+    """
+    Day of every row as datetime64[D], grouped on instead of formatted
+    strings so indexing does not create a string per row
+    """
+
+    return labeled['created_utc'].to_numpy().astype('datetime64[D]')
+
+def index_by_day(labeled: pd.DataFrame, sort_by: str = None, dedupe_by: str = None) -> dict:
+    """
+    Split labeled rows into the row positions of each day
 
-comments = pd.read_csv("https://cs410-redis-sentiment-project.s3.us-west-2.amazonaws.com/UkrainianConflict-comments-labeled-updated.csv", lineterminator="\n")
-comments['created_utc'] = pd.to_datetime(comments['created_utc'])
-comments = comments[(comments['created_utc'] >= str(START_DATE)) & (comments['created_utc'] <= str(END_DATE))]
+    Notes:
+        Built once at load time so callbacks cost a dictionary lookup plus
+        the size of one day, not a scan of the whole dataset. Positions are
+        kept instead of frames, so the index does not copy the (possibly
+        shared, memory-mapped) rows
+
+    Keyword Arguments:
+        labeled (pd.DataFrame): Labeled headlines or comments
+        sort_by (str): Column each day is sorted by, descending
+        dedupe_by (str): Column duplicates are dropped by within a day,
+            keeping the first row after sorting
+
+    Returns:
+        dict: Day key to the positions of that day's rows, in order
+    """
+
+    order = np.arange(len(labeled))
+    if sort_by is not None:
+        order = np.argsort(-labeled[sort_by].to_numpy(), kind='stable')
+    days = days_of(labeled)[order]
+    if dedupe_by is not None:
+        keep = ~pd.DataFrame({'day': days, 'key': labeled[dedupe_by].to_numpy()[order]}).duplicated().to_numpy()
+        order, days = order[keep], days[keep]
+    return {day_key(day): order[rows]
+            for day, rows in pd.Series(days).groupby(days, sort=False).indices.items()}
+
+def index_by_thread(labeled: pd.DataFrame) -> dict:
+    """
+    Group comments by the post they belong to
+
+    Notes:
+        Reddit link ids are post ids with the "t3_" type prefix, which is
+        removed so the index is keyed on the ids shown in the headline table.
+        Comments without a link id are left out
+
+    Keyword Arguments:
+        labeled (pd.DataFrame): Labeled comments
+
+    Returns:
+        dict: Post id to the positions of its comments
+    """
+
+    ## Grouped on the raw link ids, the prefix is only removed from the keys
+    threads = {}
+    for link_id, rows in labeled['link_id'].groupby(labeled['link_id'], sort=False).indices.items():
+        post_id = link_id.removeprefix("t3_")
+        if post_id in threads: # same post with and without prefix
+            rows = np.sort(np.concatenate([threads[post_id], rows]))
+        threads[post_id] = rows
+    return threads
+
+def merge_day_index(index: dict, labeled: pd.DataFrame, new_rows: np.ndarray,
+                    sort_by: str = None, dedupe_by: str = None) -> dict:
+    """
+    Update a day index after rows were appended, see index_by_day
+
+    Notes:
+        Only the days of the new rows are rebuilt, from the rows the index
+        already kept for that day plus the new ones. Dropped duplicates never
+        come back, they lose against the row that was kept, so the result is
+        the same as indexing everything again
+
+    Keyword Arguments:
+        index (dict): Day index of the rows before new_rows, not modified
+        labeled (pd.DataFrame): All rows, new_rows included
+        new_rows (np.ndarray): Positions of the appended rows
+        sort_by (str): Column each day is sorted by, descending
+        dedupe_by (str): Column duplicates are dropped by within a day
+
+    Returns:
+        dict: Day key to the positions of that day's rows, in order
+    """
+
+    index = dict(index)
+    for day, rows in index_by_day(labeled.take(new_rows)).items():
+        candidates = np.sort(np.concatenate([index.get(day, np.empty(0, dtype=np.intp)), new_rows[rows]]))
+        index[day] = candidates[index_by_day(labeled.take(candidates), sort_by, dedupe_by)[day]]
+    return index
+
+def merge_thread_index(index: dict, labeled: pd.DataFrame, new_rows: np.ndarray) -> dict:
+    """
+    Update a thread index after rows were appended, see index_by_thread
+    """
+
+    index = dict(index)
+    for post_id, rows in index_by_thread(labeled.take(new_rows)).items():
+        index[post_id] = np.concatenate([index.get(post_id, np.empty(0, dtype=np.intp)), new_rows[rows]])
+    return index
+
+def daily_sentiment(labeled: pd.DataFrame) -> dict:
+    """
+    Mean compound of every day, the over time figure is drawn from it
+    """
+
+    means = labeled['compound'].groupby(days_of(labeled)).mean()
+    return {day_key(day): mean for day, mean in means.items()}
+
+def summary_sentiment(daily: pd.DataFrame, kind: str) -> dict:
+    """
+    Mean compound score per day of headlines or comments from the daily summary
+    """
+
+    daily = daily[daily['kind'] == kind]
+    return {day_key(day): mean for day, mean in zip(days_of(daily), daily['compound'])}
+
+def thread_summary(threads: pd.DataFrame) -> dict:
+    """
+    Label counts and mean compound score of every thread from the thread summary
+
+    Returns:
+        dict: Day key to post id to negative, neutral and positive comment
+        counts and mean compound score
+    """
+
+    threads_by_day = {}
+    for day, threads_at_date in threads.groupby(days_of(threads)):
+        threads_by_day[day_key(day)] = dict(zip(
+            threads_at_date['post_id'].astype(str),
+            zip(threads_at_date['negative'], threads_at_date['neutral'],
+                threads_at_date['positive'], threads_at_date['compound'])))
+    return threads_by_day
 
 # Dash Server + App Config
 app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP, './assets/custom.css'])
 server = app.server
 
+@server.route('/cache-stats')
+def cache_stats() -> dict:
+    """
+    Hit and miss counts of the thread cache of the current data version
+    """
+
+    return DATA.current.cached_thread.cache_info()._asdict()
+
+## Times every callback request, see the /metrics route
+METRICS = CallbackMetrics(app)
+
+@server.route('/metrics')
+def metrics() -> Response:
+    """
+    Callback and thread cache metrics in the Prometheus text format
+
+    Notes:
+        The thread cache belongs to the current data version, its counts
+        start again from zero when a new version is swapped in
+    """
+
+    info = DATA.current.cached_thread.cache_info()
+    lookups = info.hits + info.misses
+    gauges = {
+        'dashboard_thread_cache_hits': ("Thread cache hits of the current data version", info.hits),
+        'dashboard_thread_cache_misses': ("Thread cache misses of the current data version", info.misses),
+        'dashboard_thread_cache_hit_ratio': ("Share of thread lookups answered from the cache",
+                                             round(info.hits / lookups, 4) if lookups else 0),
+        'dashboard_thread_cache_size': ("Threads in the cache", info.currsize),
+        }
+    return Response(METRICS.render(gauges), mimetype="text/plain; version=0.0.4")
+
 # Figures/functions that do not require any callbacks
+SIZER_RANGES = [0, 1, 3, 5, 7, 10, 15, 20, 30, 40, 50, 75, 100, 150, 200]
+SIZER_SIZES = [10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60, 65, 70, 75, 80]
+
 def sizer(val: int) -> int:
     """
     Apply set sizes to chloroplath scatter given number of posts in day
@@ -62,22 +322,403 @@ def sizer(val: int) -> int:
         int: Corresponding size given value
     """
 
-    ranges = [0, 1, 3, 5, 7, 10, 15, 20, 30, 40, 50, 75, 100, 150, 200]
-    sizes = [10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60, 65, 70, 75, 80]
-
-    for i, j in zip(ranges, sizes):
+    for i, j in zip(SIZER_RANGES, SIZER_SIZES):
         if val <= i:
             return j
 
     return 0
 
-def sentiment_over_time() -> go.Figure:
+def sizer_array(vals: pd.Series) -> np.ndarray:
+    """
+    Vectorized sizer, missing counts get size 0 like in sizer
+    """
+
+    sizes = np.append(SIZER_SIZES, 0)
+    bins = np.searchsorted(SIZER_RANGES, vals.fillna(np.inf).to_numpy(), side='left')
+    return sizes[bins]
+
+def city_cube(labeled: pd.DataFrame) -> dict:
+    """
+    Build the day x city table of the cities map
+
+    Notes:
+        Built once at load time, so moving the slider is a dictionary lookup.
+        Every day has one row per gazetteer location, locations without posts
+        that day have size 0 and compound 0
+
+    Keyword Arguments:
+        labeled (pd.DataFrame): Labeled headlines
+
+    Returns:
+        dict: Day key to lat, lon, count, compound and size per location
+    """
+
+    cube = labeled.groupby([days_of(labeled), 'city'])['compound'].agg(['count', 'mean'])
+    return cube_by_day(cube.rename(columns={'mean': 'compound'}))
+
+def cube_by_day(cube: pd.DataFrame) -> dict:
+    """
+    Split a (day, city) table of counts and mean compound into the cities
+    map of each day, see city_cube. Also used for the city summary table
+    """
+
+    cities_by_day = {}
+    for day, cities in cube.groupby(level=0):
+        cities_at_date = CITIES.join(cities.droplevel(0))
+        cities_at_date['size'] = sizer_array(cities_at_date['count'])
+        cities_by_day[day_key(day)] = cities_at_date.fillna(0.0)
+    return cities_by_day
+
+NO_CITIES = CITIES.assign(count=0.0, compound=0.0, size=0)
+
+# Threads (day, post id) kept resolved, least recently used evicted first
+THREAD_CACHE_SIZE = 256
+# Headline table rows per page, pages are cut from the per-day index
+TABLE_PAGE_SIZE = 10
+## Table column ids to headline columns
+TABLE_COLUMNS = {'Headline': 'headline', 'Upvotes': 'ups', 'Downvotes': 'downs'}
+## One part of a DataTable filter query, e.g. "{Upvotes} ge 100" or "{Headline} icontains kyiv",
+## the table UI prefixes operators with s (case sensitive) or i (case insensitive)
+FILTER_PART = re.compile(r"^\{(?P<name>[^}]+)\}\s+(?P<case>[is]?)(?P<operator>>=|<=|!=|<|>|=|ge|le|lt|gt|ne|eq|contains)\s+(?P<value>.+)$")
+FILTER_OPERATORS = {'ge': '>=', 'le': '<=', 'lt': '<', 'gt': '>', 'ne': '!=', 'eq': '='}
+
+class LabeledData:
+    """
+    One version of the labeled headlines and comments and their indexes
+
+    Notes:
+        Indexes are built once per version, off the request path. Callbacks
+        read DATA.current once and only use that object, so a refresh
+        swapping in new data never changes it halfway through a callback.
+        New rows are added with append, which returns the next version and
+        leaves this one as it is
+
+        With the summary tables of the pipeline, the per-day aggregates are
+        read from them instead and comments can be given as a function, they
+        are then indexed the first time a thread needs them
+
+    Keyword Arguments:
+        headlines (pd.DataFrame): Labeled headlines
+        comments (pd.DataFrame or callable): Labeled comments, or a function
+            returning them
+        daily (pd.DataFrame): Daily summary, mean sentiment per day and kind
+        cities (pd.DataFrame): City summary, count and mean sentiment per
+            day and city
+        threads (pd.DataFrame): Thread summary, label counts and mean
+            sentiment per day and post
+    """
+
+    def __init__(self, headlines: pd.DataFrame, comments, daily: pd.DataFrame = None,
+                 cities: pd.DataFrame = None, threads: pd.DataFrame = None):
+        self.start, self.end = window()
+        self.headlines = headlines
+        ## Per-day indexes, headlines already sorted by upvotes and deduplicated
+        self.headlines_by_day = index_by_day(headlines, sort_by='ups', dedupe_by='id')
+        self.headline_rows_by_day = index_by_day(headlines)
+        self.comments = None
+        self.load_comments = comments if callable(comments) else lambda: comments
+        self.comments_lock = threading.Lock()
+        if not callable(comments):
+            self.ensure_comments()
+        ## Per-day aggregates of the cities map, the over time figure and the
+        ## thread pie, days without a thread summary use the comments
+        if cities is None:
+            self.cities_by_day = city_cube(headlines)
+        else:
+            self.cities_by_day = cube_by_day(
+                cities.set_index([days_of(cities), 'city'])[['count', 'compound']])
+        if daily is None:
+            self.headline_sentiment = daily_sentiment(headlines)
+            self.ensure_comments()
+            self.comment_sentiment = daily_sentiment(self.comments)
+        else:
+            self.headline_sentiment = summary_sentiment(daily, 'headlines')
+            self.comment_sentiment = summary_sentiment(daily, 'comments')
+        self.threads_by_day = {} if threads is None else thread_summary(threads)
+        self.finish()
+
+    def ensure_comments(self) -> None:
+        """
+        Load and index the comments if they are not yet
+
+        Notes:
+            Callbacks needing comments call this first, concurrent first
+            calls wait for one load
+        """
+
+        if self.comments is not None:
+            return
+        with self.comments_lock:
+            if self.comments is None:
+                comments = self.load_comments()
+                self.comments_by_day = index_by_day(comments)
+                self.comments_by_thread = index_by_thread(comments)
+                ## Set last, it tells the indexes are ready
+                self.comments = comments
+
+    def finish(self) -> None:
+        """
+        Build what is derived from the indexes and aggregates of a version
+        """
+
+        ## Figures without inputs, serialized once to plain JSON types
+        self.over_time_figure = json.loads(
+            sentiment_over_time(self.headline_sentiment, self.comment_sentiment).to_json())
+        ## Each version has its own thread cache, dropped with the version
+        self.cached_thread = lru_cache(maxsize=THREAD_CACHE_SIZE)(self.thread)
+
+    def append(self, headlines: pd.DataFrame = None, comments: pd.DataFrame = None,
+               **summaries) -> "LabeledData":
+        """
+        Next version with new rows added and the date window rolled forward
+
+        Notes:
+            Only the days that got new rows are indexed and aggregated again,
+            rows outside the window and rows whose id is already shown that
+            day are skipped. Days that left the window are dropped from the
+            indexes, their rows stay in the frames until the next full
+            refresh rebuilds them. The aggregates of those days are computed
+            from the rows, their thread summary is dropped
+
+        Keyword Arguments:
+            headlines (pd.DataFrame): New labeled headlines
+            comments (pd.DataFrame): New labeled comments
+            summaries: Summary tables are not appended to, ignored
+
+        Returns:
+            LabeledData: The next version, or this one if nothing changed
+        """
+
+        start, end = window()
+        new_headlines = self.new_rows(self.headlines, self.headline_rows_by_day, headlines, start, end)
+        if comments is not None and len(comments):
+            self.ensure_comments()
+            new_comments = self.new_rows(self.comments, self.comments_by_day, comments, start, end)
+        else:
+            new_comments = ()
+        if (start, end) == (self.start, self.end) and not len(new_headlines) and not len(new_comments):
+            return self
+
+        data = copy.copy(self)
+        data.start, data.end = start, end
+        data.comments_lock = threading.Lock()
+
+        if len(new_headlines):
+            data.headlines = pd.concat([self.headlines, new_headlines], ignore_index=True)
+            new_rows = np.arange(len(self.headlines), len(data.headlines))
+            data.headlines_by_day = merge_day_index(
+                self.headlines_by_day, data.headlines, new_rows, sort_by='ups', dedupe_by='id')
+            data.headline_rows_by_day = merge_day_index(self.headline_rows_by_day, data.headlines, new_rows)
+            data.cities_by_day = dict(self.cities_by_day)
+            data.headline_sentiment = dict(self.headline_sentiment)
+            for day in index_by_day(new_headlines):
+                headlines_at_date = data.headlines.take(data.headline_rows_by_day[day])
+                data.cities_by_day.update(city_cube(headlines_at_date))
+                data.headline_sentiment.update(daily_sentiment(headlines_at_date))
+
+        if len(new_comments):
+            data.comments = pd.concat([self.comments, new_comments], ignore_index=True)
+            new_rows = np.arange(len(self.comments), len(data.comments))
+            data.comments_by_day = merge_day_index(self.comments_by_day, data.comments, new_rows)
+            data.comments_by_thread = merge_thread_index(self.comments_by_thread, data.comments, new_rows)
+            data.comment_sentiment = dict(self.comment_sentiment)
+            data.threads_by_day = dict(self.threads_by_day)
+            for day in index_by_day(new_comments):
+                data.comment_sentiment.update(
+                    daily_sentiment(data.comments.take(data.comments_by_day[day])))
+                data.threads_by_day.pop(day, None)
+
+        if start != self.start:
+            first = day_key(start)
+            for name in ['headlines_by_day', 'headline_rows_by_day', 'comments_by_day',
+                         'cities_by_day', 'headline_sentiment', 'comment_sentiment',
+                         'threads_by_day']:
+                if getattr(data, name, None) is None: # comments not loaded yet
+                    continue
+                setattr(data, name, {day: value for day, value in getattr(data, name).items()
+                                     if day >= first})
+
+        data.finish()
+        return data
+
+    @staticmethod
+    def new_rows(labeled: pd.DataFrame, rows_by_day: dict, new: pd.DataFrame,
+                 start: date, end: date) -> pd.DataFrame:
+        """
+        Rows of new within the window and not shown yet, in the dtypes of labeled
+        """
+
+        if new is None or not len(new):
+            return labeled.iloc[0:0]
+
+        days = days_of(new)
+        new = new[(days >= np.datetime64(start, 'D')) & (days <= np.datetime64(end, 'D'))]
+        new = new.drop_duplicates('id')
+        ## Positions index the frame as is, so rows are dropped once at the end
+        ids = new['id'].to_numpy()
+        keep = np.ones(len(new), dtype=bool)
+        for day, rows in index_by_day(new).items():
+            shown = labeled['id'].take(rows_by_day.get(day, [])).to_numpy()
+            keep[rows[np.isin(ids[rows], shown)]] = False
+        return new[keep][labeled.columns].astype(labeled.dtypes.to_dict())
+
+    def headlines_on(self, day) -> pd.DataFrame:
+        """
+        Headlines of a day, most upvoted first, empty if there are none
+        """
+
+        return self.headlines.take(self.headlines_by_day.get(day_key(day), []))
+
+    def comments_on(self, day) -> pd.DataFrame:
+        """
+        Comments of a day, empty if there are none
+        """
+
+        self.ensure_comments()
+        return self.comments.take(self.comments_by_day.get(day_key(day), []))
+
+    def thread_comments(self, post_id: str, day=None) -> pd.DataFrame:
+        """
+        Comments of a post, optionally only those of a day, empty if none
+        """
+
+        self.ensure_comments()
+        comments_of_post = self.comments.take(self.comments_by_thread.get(post_id, []))
+        if day is not None:
+            comments_of_post = comments_of_post[
+                days_of(comments_of_post) == np.datetime64(day_key(day), 'D')]
+        return comments_of_post
+
+    def cities_on(self, day) -> pd.DataFrame:
+        """
+        Locations with post count, mean sentiment and marker size of a day
+        """
+
+        return self.cities_by_day.get(day_key(day), NO_CITIES)
+
+    def thread(self, day: str, post_id: str) -> tuple:
+        """
+        Resolve the post selected in the headline table and its comments
+
+        Notes:
+            Called through cached_thread, shared by the comment barchart and
+            pie callbacks, which fire on the same clicks, so a thread is
+            resolved once. Returned frames are shared between callers and
+            must not be modified in place
+
+        Keyword Arguments:
+            day (str): Day key, see day_key
+            post_id (str): Selected post, the most upvoted post of the day
+                if None or not posted that day
+
+        Returns:
+            tuple: Post id and the comments of that post on the day
+        """
+
+        post_id = self.post_of(day, post_id)
+        return post_id, self.thread_comments(post_id, day)
+
+    def post_of(self, day, post_id: str) -> str:
+        """
+        Selected post if posted that day, else the most upvoted post of the
+        day, None if nothing was posted that day (its thread is empty)
+        """
+
+        headlines_at_date = self.headlines_on(day)
+        if not len(headlines_at_date):
+            return None
+        if post_id is None or not (headlines_at_date['id'] == post_id).any():
+            post_id = headlines_at_date.iloc[0]['id']
+        return post_id
+
+    def resolve_thread(self, day, headline: dict) -> tuple:
+        """
+        Resolve the thread of the table active cell, top post if none selected
+
+        Notes:
+            Table rows carry the post id, so the active cell names the post
+            whatever page, sort order or filter the table shows
+        """
+
+        post_id = None if headline is None else headline.get('row_id')
+        return self.cached_thread(day_key(day), post_id)
+
+    def thread_sentiment(self, day, headline: dict) -> tuple:
+        """
+        Comment label counts and mean sentiment of the thread of the table
+        active cell, top post if none selected
+
+        Notes:
+            Read from the thread summary if the day has one, so the pie does
+            not need the comments, else computed from the resolved thread
+
+        Returns:
+            tuple: Counts per label name and mean compound score, None if
+            the thread has no comments that day
+        """
+
+        day = day_key(day)
+        if day not in self.threads_by_day:
+            _, comments_at_date = self.resolve_thread(day, headline)
+            if not len(comments_at_date):
+                return pd.Series(dtype=int), None
+            sentiment_distribution = comments_at_date['label'].value_counts()
+            sentiment_distribution.rename({-1: "Negative", 1: "Positive", 0: "Neutral"}, inplace=True)
+            return sentiment_distribution, comments_at_date['compound'].mean()
+
+        post_id = self.post_of(day, None if headline is None else headline.get('row_id'))
+        thread = self.threads_by_day[day].get(post_id)
+        if thread is None:
+            return pd.Series(dtype=int), None
+        negative, neutral, positive, compound = thread
+        sentiment_distribution = pd.Series({"Negative": negative, "Neutral": neutral, "Positive": positive})
+        sentiment_distribution = sentiment_distribution[sentiment_distribution > 0]
+        return sentiment_distribution.sort_values(ascending=False, kind='stable'), compound
+
+def with_hover_text(labeled: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the barchart axis label and wrapped hover text of every comment
+
+    Notes:
+        Done once at load time instead of for every thread shown, comments
+        without text get empty labels
+
+    Keyword Arguments:
+        labeled (pd.DataFrame): Labeled comments
+
+    Returns:
+        pd.DataFrame: Comments with headline_axis and headline_hover columns
+    """
+
+    text = labeled['headline'].fillna('').astype(str)
+    return labeled.assign(
+        headline_axis=text.str.slice(0, HOVER_WIDTH),
+        headline_hover=text.str.wrap(HOVER_WIDTH).str.replace('\n', '<br>', regex=False))
+
+def load_source(name: str, path: str) -> pd.DataFrame:
+    """
+    Load the labeled headlines or comments dataset or a summary table from a
+    local path
+    """
+
+    if name == "comments":
+        return with_hover_text(load_labeled(path, COMMENT_COLUMNS, lineterminator="\n"))
+    if name in SUMMARY_COLUMNS:
+        return load_labeled(path, SUMMARY_COLUMNS[name])
+    return load_labeled(path, HEADLINE_COLUMNS)
+
+def sentiment_over_time(headline_sentiment: dict, comment_sentiment: dict) -> go.Figure:
     """
     Track mean sentiment of headlines and comments over time
 
     Notes:
-        Figure does not require any callbacks, so can be set explicitly
-        as the figure argument
+        Figure does not require any callbacks, so it is built and serialized
+        once per data version (see LabeledData) and set explicitly as the
+        figure argument
+
+    Keyword Arguments:
+        headline_sentiment (dict): Day key to mean headline compound
+        comment_sentiment (dict): Day key to mean comment compound
 
     Returns:
         go.Figure: Figure showing sentiment over time
@@ -85,8 +726,10 @@ def sentiment_over_time() -> go.Figure:
 
     fig = go.Figure()
 
-    headlines_group = headlines.groupby(headlines['created_utc'])['compound'].mean()
-    comments_group = comments.groupby(comments['created_utc'])['compound'].mean()
+    headlines_group = pd.Series(headline_sentiment, dtype=float).sort_index()
+    headlines_group.index = pd.to_datetime(headlines_group.index)
+    comments_group = pd.Series(comment_sentiment, dtype=float).sort_index()
+    comments_group.index = pd.to_datetime(comments_group.index)
 
     fig.add_trace(go.Scatter(x=headlines_group.index,
                              y=headlines_group.values,
@@ -114,6 +757,72 @@ def sentiment_over_time() -> go.Figure:
 
     return fig
 
+def comment_barchart() -> go.Figure:
+    """
+    Empty barchart of thread comments, upvotes as bars and mean sentiment
+    as markers on a second axis
+
+    Notes:
+        The browser fills in the bars of the selected thread in the sort
+        order of the comment-sort-by radio, see thread_comments and
+        assets/comments.js
+
+    Returns:
+        go.Figure: Figure with an empty bar and scatter trace
+    """
+
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+
+    fig.add_trace(
+        go.Bar(
+            x=[],
+            y=[],
+            hovertext=[],
+            showlegend=False),
+        secondary_y=False)
+
+    fig.add_trace(
+        go.Scatter(
+            x=[],
+            y=[],
+            mode="markers",
+            showlegend=False),
+        secondary_y=True)
+
+    fig.update_yaxes(title_text="Upvotes", secondary_y=False)
+    fig.update_yaxes(title_text="Net Composite Vader Score", secondary_y=True)
+    fig.update_layout(template="plotly_white",
+                      margin=dict(l=10, r=10, t=10, b=10),
+                      xaxis_tickangle=-45)
+
+    return fig
+
+## Serialized once, sent with the page and filled in by the browser
+COMMENT_FIGURE = json.loads(comment_barchart().to_json())
+
+# App Dataframe Initializations
+## The first load blocks startup, later versions are swapped in by a
+## background thread while requests keep using the current one. With
+## SHARED_DATA, workers on a host share one memory-mapped copy of the data.
+## With SUMMARY_SOURCE, comments load in the background while the overview
+## panels are already served
+SOURCES = {"headlines": HEADLINES_SOURCE, "comments": COMMENTS_SOURCE}
+if SUMMARY_SOURCE:
+    SOURCES.update({name: os.path.join(SUMMARY_SOURCE, table) for name, table in SUMMARY_TABLES.items()})
+DATA = DataStore(SOURCES,
+                 load_source,
+                 LabeledData,
+                 CACHE_DIR,
+                 shared=SHARED_DATA,
+                 key=lambda: repr((HEADLINE_COLUMNS, COMMENT_COLUMNS, SUMMARY_COLUMNS, window(), HOVER_WIDTH)),
+                 drop_dir=DROP_DIR or None,
+                 deferred=("comments",) if SUMMARY_SOURCE else ())
+DATA.refresh()
+if REFRESH_SECONDS > 0:
+    DATA.start(REFRESH_SECONDS)
+if DROP_DIR or WINDOW_DAYS:
+    DATA.watch(INGEST_SECONDS)
+
 
 # HTML
 title = dbc.Row([
@@ -125,115 +834,145 @@ title = dbc.Row([
         )],
     style={"textAlign": "center"})
 
-overall_sentiment_analysis = dbc.Row([
-    dbc.Row(
-        html.H4("Overall Sentiment")
-        ),
-    dbc.Row([
-        dbc.Col([
-            dbc.Row(
-                html.Div("Net Sentiment Over Time")
-                ),
-            dbc.Row(
-                dcc.Graph(figure=sentiment_over_time()),
-                style={"borderRight": "2px lightgray solid"})],
-            width=6),
-        dbc.Col([
-            dbc.Row(
-                html.Div("Sentiment by Top 10 Cities")
-                ),
-            dbc.Row(
-                dcc.Graph(id='cities')
-                ),
-            dcc.Slider(min=0,
-                       max=TIME_DELTA,
-                       step=None,
-                       id='slider',
-                       marks={i:(START_DATE + timedelta(i)).strftime("%m/%d")
-                              for i in range(TIME_DELTA+1)})],
-            width=6),
-        ])],
-    style={"borderBottom": "2px lightgray solid", "marginBottom": "1%"})
-
-sentiment_by_post = dbc.Row([
-    dbc.Row(
-        html.H4("Sentiment by Post")
-        ),
-    dbc.Row([
-        dbc.Col([
-            dbc.Row([
-                dbc.Col(
-                    html.Div("Top Post by Date")
+def overall_sentiment_analysis(data: LabeledData) -> dbc.Row:
+    """
+    Overall sentiment panels of a data version and its date window
+    """
+
+    time_delta = (data.end - data.start).days
+    return dbc.Row([
+        dbc.Row(
+            html.H4("Overall Sentiment")
+            ),
+        dbc.Row([
+            dbc.Col([
+                dbc.Row(
+                    html.Div("Net Sentiment Over Time")
                     ),
-                dbc.Col(
-                    dcc.DatePickerSingle(
-                        id='post-date-filter',
-                        month_format='MMM Do, YY',
-                        placeholder='MMM Do, YY',
-                        date=START_DATE
-                        ),
-                    style={"textAlign": "right"})
-                ]),
-            dbc.Row([
-                dbc.Col(
-                    dash_table.DataTable(
-                        headlines.to_dict('records'),
-                        [{"name": i, "id": i} for i in ['Headline', 'Upvotes', 'Downvotes']],
-                        style_cell={
-                            'overflow': 'hidden',
-                            'textOverflow': 'ellipsis',
-                            'maxWidth': 0,
-                        },
-                        style_cell_conditional=[
-                            {'if': {'column_id': 'Headline'},
-                             'width': '60%'},
-                            {'if': {'column_id': 'Up Votes'},
-                             'width': '20%'},
-                            {'if': {'column_id': 'Down Votes'},
-                             'width': '20%'},
-                        ],
-                    id="post-table"),
-                    style={"borderRight": "2px lightgray solid"})
-                ])
-            ], width=3),
-        dbc.Col([
+                dbc.Row(
+                    dcc.Graph(figure=data.over_time_figure),
+                    style={"borderRight": "2px lightgray solid"})],
+                width=6),
             dbc.Col([
                 dbc.Row(
-                    html.Div("Thread Data")
+                    html.Div("Sentiment by Location")
+                    ),
+                dbc.Row(
+                    dcc.Graph(id='cities')
                     ),
+                dcc.Slider(min=0,
+                           max=time_delta,
+                           step=None,
+                           id='slider',
+                           marks={i:(data.start + timedelta(i)).strftime("%m/%d")
+                                  for i in range(time_delta+1)})],
+                width=6),
+            ])],
+        style={"borderBottom": "2px lightgray solid", "marginBottom": "1%"})
+
+def sentiment_by_post(data: LabeledData) -> dbc.Row:
+    """
+    Post table and thread panels, the date picker starts at the window start
+    """
+
+    return dbc.Row([
+        dbc.Row(
+            html.H4("Sentiment by Post")
+            ),
+        dbc.Row([
+            dbc.Col([
                 dbc.Row([
                     dbc.Col(
-                        html.Div("Sentiment by Upvoted Comments")
+                        html.Div("Top Post by Date")
                         ),
                     dbc.Col(
-                        dcc.RadioItems([{"label": "Compound", "value": "compound"},
-                                        {"label": "Upvotes", "value": "ups"}],
-                                        value="ups",
-                                        id='comment-sort-by',
-                                        inline=True),
-                            style={'textAlign': 'right'})
+                        dcc.DatePickerSingle(
+                            id='post-date-filter',
+                            month_format='MMM Do, YY',
+                            placeholder='MMM Do, YY',
+                            date=data.start
+                            ),
+                        style={"textAlign": "right"})
                     ]),
+                dbc.Row([
+                    dbc.Col(
+                        dash_table.DataTable(
+                            [],
+                            [{"name": i, "id": i} for i in TABLE_COLUMNS],
+                            page_action='custom',
+                            page_current=0,
+                            page_size=TABLE_PAGE_SIZE,
+                            sort_action='custom',
+                            sort_mode='single',
+                            sort_by=[],
+                            filter_action='custom',
+                            filter_query='',
+                            style_cell={
+                                'overflow': 'hidden',
+                                'textOverflow': 'ellipsis',
+                                'maxWidth': 0,
+                            },
+                            style_cell_conditional=[
+                                {'if': {'column_id': 'Headline'},
+                                 'width': '60%'},
+                                {'if': {'column_id': 'Up Votes'},
+                                 'width': '20%'},
+                                {'if': {'column_id': 'Down Votes'},
+                                 'width': '20%'},
+                            ],
+                        id="post-table"),
+                        style={"borderRight": "2px lightgray solid"})
+                    ])
+                ], width=3),
+            dbc.Col([
+                dbc.Col([
+                    dbc.Row(
+                        html.Div("Thread Data")
+                        ),
+                    dbc.Row([
+                        dbc.Col(
+                            html.Div("Sentiment by Upvoted Comments")
+                            ),
+                        dbc.Col(
+                            dcc.RadioItems([{"label": "Compound", "value": "compound"},
+                                            {"label": "Upvotes", "value": "ups"}],
+                                            value="ups",
+                                            id='comment-sort-by',
+                                            inline=True),
+                                style={'textAlign': 'right'})
+                        ]),
+                    dbc.Row(
+                        dcc.Graph(id="comment-barchart")
+                        ),
+                    dcc.Store(id="comment-store"),
+                    dcc.Store(id="comment-figure", data=COMMENT_FIGURE)
+                    ])],
+                width=6),
+            dbc.Col([
+                dbc.Row(
+                    html.Div("Net Thread Sentiment")
+                    ),
                 dbc.Row(
-                    dcc.Graph(id="comment-barchart")
-                    )
-                ])],
-            width=6),
-        dbc.Col([
-            dbc.Row(
-                html.Div("Net Thread Sentiment")
-                ),
-            dbc.Row(
-                dcc.Graph(id="comment-pie")
-                )],
-            width=3)
+                    dcc.Graph(id="comment-pie")
+                    )],
+                width=3)
+            ])
         ])
-    ])
 
-app.layout = html.Div([
-    title,
-    overall_sentiment_analysis,
-    sentiment_by_post
-    ], style={"marginLeft": "3%", "marginRight": "3%"})
+def serve_layout() -> html.Div:
+    """
+    Page layout, built for every page load from the current data version so
+    new data and a rolled date window show up without a restart
+    """
+
+    data = DATA.current
+    return html.Div([
+        title,
+        overall_sentiment_analysis(data),
+        sentiment_by_post(data)
+        ], style={"marginLeft": "3%", "marginRight": "3%"})
+
+app.layout = serve_layout
 
 # Dashboard Callbacks
 @app.callback(
@@ -242,12 +981,13 @@ app.layout = html.Div([
     )
 def posts_by_top_cities(day: int) -> go.Figure:
     """
-    Shows total number of post and mean sentiment through main cities of Ukraine
+    Shows total number of post and mean sentiment through the locations of
+    the gazetteer, cities as well as oblasts and regions
 
     Notes:
-        Cities are cutoff to be the top 11 most populated cities to avoid
-        oversaturating the visual with too many points. See CITIES global
-        variable for all encapsulated cities
+        Locations and their coordinates come from the gazetteer shared with
+        the labeling pipeline, see CITIES global variable. Counts and mean
+        sentiment are looked up in the day x city table, see city_cube
 
     Keyword Arguments:
         day (int): Day since beginning of data parsing
@@ -262,28 +1002,23 @@ def posts_by_top_cities(day: int) -> go.Figure:
 
     fig = go.Figure()
 
-    cities_at_date = CITIES.copy()
-    day = (START_DATE + timedelta(day)).strftime("%m/%d/%y")
-
-    cities_at_date['count'] = headlines[headlines['created_utc'] == day]['city'].value_counts()
-    cities_at_date['compound'] = headlines.compound.groupby(headlines['city']).mean()
-    cities_at_date['size'] = cities_at_date['count'].apply(sizer)
-    cities_at_date.fillna(0.0, inplace=True)
-
-    for i, col in cities_at_date.iterrows():
-        fig.add_trace(go.Scattermapbox(lat=[col['lat']],
-                                       lon=[col['lon']],
-                                       text=[i],
-                                       mode='markers',
-                                       showlegend=False,
-                                       marker=go.scattermapbox.Marker(size=col['size'],
-                                                                      cmax=0.25,
-                                                                      cmin=-0.25,
-                                                                      opacity=0.5,
-                                                                      color=[col['compound']],
-                                                                      colorscale="Bluered_r",
-                                                                      colorbar=dict(thickness=20)),
-                                       hovertemplate="<b>%{text}</b><br>Mean Sentiment: %{marker.color:,}<extra></extra>"))
+    data = DATA.current
+    cities_at_date = data.cities_on(data.start + timedelta(day))
+
+    ## One trace for all locations, the figure grows by a point per location
+    fig.add_trace(go.Scattermapbox(lat=cities_at_date['lat'],
+                                   lon=cities_at_date['lon'],
+                                   text=cities_at_date.index,
+                                   mode='markers',
+                                   showlegend=False,
+                                   marker=go.scattermapbox.Marker(size=cities_at_date['size'],
+                                                                  cmax=0.25,
+                                                                  cmin=-0.25,
+                                                                  opacity=0.5,
+                                                                  color=cities_at_date['compound'],
+                                                                  colorscale="Bluered_r",
+                                                                  colorbar=dict(thickness=20)),
+                                   hovertemplate="<b>%{text}</b><br>Mean Sentiment: %{marker.color:,}<extra></extra>"))
 
     fig.update_layout(
         hovermode='closest',
@@ -299,123 +1034,164 @@ def posts_by_top_cities(day: int) -> go.Figure:
 
     return fig
 
+def filter_headlines(headlines_at_date: pd.DataFrame, filter_query: str) -> pd.DataFrame:
+    """
+    Apply a DataTable filter query to headlines
+
+    Notes:
+        Queries look like "{Upvotes} gt 100 && {Headline} contains Kyiv",
+        parts with unknown columns or operators are ignored. Operators
+        prefixed with s compare text case sensitively, with i case
+        insensitively. Without a prefix contains ignores case and
+        the comparisons do not
+
+    Keyword Arguments:
+        headlines_at_date (pd.DataFrame): Headlines to filter
+        filter_query (str): filter_query of the post table
+
+    Returns:
+        pd.DataFrame: Headlines matching every part of the query
+    """
+
+    for part in (filter_query or '').split(' && '):
+        match = FILTER_PART.match(part.strip())
+        if match is None or match['name'] not in TABLE_COLUMNS:
+            continue
+
+        values = headlines_at_date[TABLE_COLUMNS[match['name']]]
+        operator = FILTER_OPERATORS.get(match['operator'], match['operator'])
+        value = match['value'].strip().strip('"\'`')
+
+        if operator == 'contains':
+            mask = values.astype(str).str.contains(value, case=match['case'] == 's', regex=False)
+        else:
+            if values.dtype.kind in 'iuf':
+                value = pd.to_numeric(value, errors='coerce')
+            elif match['case'] == 'i':
+                values, value = values.astype(str).str.lower(), value.lower()
+            mask = {'>=': values >= value,
+                    '<=': values <= value,
+                    '<': values < value,
+                    '>': values > value,
+                    '!=': values != value,
+                    '=': values == value}[operator]
+        headlines_at_date = headlines_at_date[mask]
+
+    return headlines_at_date
+
 @app.callback(
-   Output('post-table', 'data'),
-   Input('post-date-filter', 'date')
+   [Output('post-table', 'data'),
+    Output('post-table', 'page_count')],
+   [Input('post-date-filter', 'date'),
+    Input('post-table', 'page_current'),
+    Input('post-table', 'page_size'),
+    Input('post-table', 'sort_by'),
+    Input('post-table', 'filter_query')]
     )
-def headline_table_filter(day: str) -> list:
+def headline_table_filter(day: str, page_current: int, page_size: int,
+                          sort_by: list, filter_query: str) -> tuple:
     """
-    Filter Headline post table by date
+    Serve one page of the Headline post table of a date
 
     Notes:
         Output of dcc.SingleDatePicker is str, which can easily be used
         with pandas datetime filtering.
-        Dashtable by default will have all entries in the object, callback
-        will only send few back to show based on filter conditions
+        Paging, sorting and filtering are done here (custom actions), the
+        table starts empty and only receives the rows of the page it shows.
+        Days are already sorted by upvotes, other sort orders and filters
+        only touch the rows of the day
 
     Keyword Arguments:
         day (str): Date to filter headline posts
+        page_current (int): Page shown, starting at 0
+        page_size (int): Rows per page
+        sort_by (list): Column and direction of the table sort, if any
+        filter_query (str): Table filter query
 
     Returns:
-        list: Records of filtered headlines
+        tuple: Records of the page (with post id) and the number of pages
     """
 
-    headlines_at_date = headlines.copy()
+    page_current = page_current or 0
+    page_size = page_size or TABLE_PAGE_SIZE
 
-    headlines_at_date = headlines_at_date[headlines_at_date['created_utc'] == day]
-    headlines_at_date.sort_values('ups', ascending=False, inplace=True)
-    headlines_at_date.drop_duplicates('id', inplace=True)
-    headlines_at_date = headlines_at_date.iloc[0:10]
-    headlines_at_date.rename({'ups': "Upvotes",
-                              'downs': "Downvotes",
-                              'headline': "Headline"},
-                             axis=1,
-                             inplace=True)
+    headlines_at_date = filter_headlines(DATA.current.headlines_on(day), filter_query)
+    if sort_by:
+        headlines_at_date = headlines_at_date.sort_values(
+            TABLE_COLUMNS[sort_by[0]['column_id']],
+            ascending=sort_by[0]['direction'] == 'asc',
+            kind='stable')
 
-    headlines_at_date = headlines_at_date[['Headline', 'Upvotes', 'Downvotes']]
+    page_count = max(1, -(-len(headlines_at_date) // page_size))
+    headlines_at_date = headlines_at_date.iloc[page_current * page_size:(page_current + 1) * page_size]
+    headlines_at_date = headlines_at_date.rename({'ups': "Upvotes",
+                                                  'downs': "Downvotes",
+                                                  'headline': "Headline"},
+                                                 axis=1)
 
-    return headlines_at_date.to_dict('records')
+    headlines_at_date = headlines_at_date[['id', 'Headline', 'Upvotes', 'Downvotes']]
+
+    return headlines_at_date.to_dict('records'), page_count
 
 @app.callback(
-    Output('comment-barchart', 'figure'),
+    Output('comment-store', 'data'),
     [Input('post-date-filter', 'date'),
-     Input('comment-sort-by', 'value'),
      Input('post-table', 'active_cell')]
     )
-def sentiment_by_comment(day: str, sort_by: str, headline: dict) -> go.Figure:
+def thread_comments(day: str, headline: dict) -> dict:
     """
-    Show overall mean sentiment and upvotes associated with top comments
+    Send the comments of the selected thread to the browser for the barchart
 
     Keyword Arguments:
         day (str): Date to filter comments
-        sort_by (str): Argument to show which sort for comments
         headline (dict): Active cell showing which post selected
 
     Notes:
         Dashtable active cell does not return active cell value but rather
-        table indices, therefore we need to recreate table from previous
-        function and select from local object
+        table indices and the row id, therefore the post is resolved from
+        the day and row id (post id) through the shared thread cache.
+        Only the top COMMENT_TOP_N comments by either sort key are sent, with
+        the total upvotes and mean sentiment of the comments past the top N
+        of each key. The comment-sort-by radio then re-sorts the barchart in
+        the browser (assets/comments.js) without a request
 
     Returns:
-        go.Figure: Figure showing comments by upvotes and mean sentiment
+        dict: Comment columns in thread order and the "other" bar per sort key
     """
 
-    if headline is None:
-        row, col = 0, 'id'
-    else:
-        row, col = headline['row'], 'id'
-
-    fig = make_subplots(specs=[[{"secondary_y": True}]])
-
-    headlines_at_date = headlines.copy()
-
-    headlines_at_date = headlines_at_date[headlines_at_date['created_utc'] == day]
-    headlines_at_date.sort_values('ups', ascending=False, inplace=True)
-    headlines_at_date.drop_duplicates('id', inplace=True)
-    headlines_at_date = headlines_at_date.iloc[0:10]
-
-    post_id = headlines_at_date.iloc[row][col]
-
-    comments_at_date = comments.copy()
-
-    comments_at_date = comments_at_date[comments_at_date['created_utc'] == day]
-    comments_at_date = comments_at_date[comments_at_date['link_id'].str.contains(post_id)]
-    comments_at_date.sort_values(sort_by, ascending=False, inplace=True)
-    # comments_at_date = comments_at_date.iloc[0:10]
-    comments_at_date['headline_axis'] = comments_at_date['headline'].str.slice(0, 30)
-    comments_at_date['headline_hover'] = comments_at_date['headline'].str.wrap(30)
-    comments_at_date['headline_hover'] = comments_at_date['headline_hover'].apply(lambda x: x.replace('\n', '<br>'))
-
-    if not len(comments_at_date): # No comments found
-        comments_at_date = pd.DataFrame({"headline_axis": "No comments found",
-                                         "headline_hover": "No comments found",
-                                         "ups": 0,
-                                         "compound": 0},
-                                        index=[0])
-
-    fig.add_trace(
-        go.Bar(
-            x=comments_at_date['headline_axis'],
-            y=comments_at_date['ups'],
-            hovertext=comments_at_date['headline_hover'],
-            showlegend=False),
-        secondary_y=False)
-
-    fig.add_trace(
-        go.Scatter(
-            x=comments_at_date['headline_axis'],
-            y=comments_at_date['compound'],
-            mode="markers",
-            showlegend=False),
-        secondary_y=True)
-
-    fig.update_yaxes(title_text="Upvotes", secondary_y=False)
-    fig.update_yaxes(title_text="Net Composite Vader Score", secondary_y=True)
-    fig.update_layout(template="plotly_white",
-                      margin=dict(l=10, r=10, t=10, b=10),
-                      xaxis_tickangle=-45)
-
-    return fig
+    _, comments_at_date = DATA.current.resolve_thread(day, headline)
+
+    ## Stable sorts, so ties keep thread order like the sort in the browser
+    top = {sort_by: np.argsort(-comments_at_date[sort_by].to_numpy(), kind="stable")
+           for sort_by in ("compound", "ups")}
+    rows = np.unique(np.concatenate([order[:COMMENT_TOP_N] for order in top.values()]))
+    shown = comments_at_date.iloc[rows]
+
+    other = {}
+    for sort_by, order in top.items():
+        rest = comments_at_date.iloc[order[COMMENT_TOP_N:]]
+        if len(rest):
+            other[sort_by] = {"axis": f"Other ({len(rest)})",
+                              "hover": f"{len(rest)} other comments<br>"
+                                       f"Total upvotes and mean sentiment",
+                              "ups": int(rest['ups'].sum()),
+                              "compound": float(rest['compound'].mean())}
+
+    return {"axis": shown['headline_axis'].tolist(),
+            "hover": shown['headline_hover'].tolist(),
+            "ups": shown['ups'].tolist(),
+            "compound": shown['compound'].tolist(),
+            "other": other,
+            "top_n": COMMENT_TOP_N}
+
+## Re-sorts the stored thread comments into the barchart in the browser
+app.clientside_callback(
+    ClientsideFunction(namespace='comments', function_name='sortBarchart'),
+    Output('comment-barchart', 'figure'),
+    [Input('comment-store', 'data'),
+     Input('comment-sort-by', 'value')],
+    State('comment-figure', 'data')
+    )
 
 @app.callback(
     Output('comment-pie', 'figure'),
@@ -432,40 +1208,21 @@ def net_comment_sentiment(day: str, headline: dict) -> go.Figure:
 
     Notes:
         Dashtable active cell does not return active cell value but rather
-        table indices, therefore we need to recreate table from previous
-        function and select from local object
+        table indices and the row id, therefore the post is resolved from
+        the day and row id (post id), see LabeledData.thread_sentiment
 
     Returns:
         go.Figure: Pie Chart with sentiment distribution and mean sentiment
     """
 
-    if headline is None:
-        row, col = 0, 'id'
-    else:
-        row, col = headline['row'], 'id'
-
     fig = go.Figure()
 
-    headlines_at_date = headlines.copy()
-
-    headlines_at_date = headlines_at_date[headlines_at_date['created_utc'] == day]
-    headlines_at_date.sort_values('ups', ascending=False, inplace=True)
-    headlines_at_date.drop_duplicates('id', inplace=True)
-    headlines_at_date = headlines_at_date.iloc[0:10]
-
-    post_id = headlines_at_date.iloc[row][col]
-
-    comments_at_date = comments.copy()
-
-    comments_at_date = comments_at_date[comments_at_date['created_utc'] == day]
-    comments_at_date = comments_at_date[comments_at_date['link_id'].str.contains(post_id)]
-    if not len(comments_at_date):
+    sentiment_distribution, mean_sentiment = DATA.current.thread_sentiment(day, headline)
+    if mean_sentiment is None:
         mean_sentiment = "N/A"
         sentiment_distribution = pd.Series(1, [1])
     else:
-        mean_sentiment = round(comments_at_date['compound'].mean(), 3)
-        sentiment_distribution = comments_at_date['label'].value_counts()
-        sentiment_distribution.rename({-1: "Negative", 1: "Positive", 0: "Neutral"}, inplace=True)
+        mean_sentiment = round(mean_sentiment, 3)
 
     fig.add_trace(
         go.Pie(
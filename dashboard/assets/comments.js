@@ -0,0 +1,60 @@
+/*
+CS410 Mountain Group
+Clientside callbacks of the thread comment barchart
+*/
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    comments: {
+        /*
+        Fill the empty barchart with the top comments of the stored thread
+
+        Keyword Arguments:
+            store (object): Comments sent by thread_comments in app.py
+            sortBy (string): "compound" or "ups"
+            figure (object): Empty barchart, see comment_barchart in app.py
+
+        Returns:
+            object: Figure with the top comments sorted by sortBy, the other
+            comments summed into one bar
+        */
+        sortBarchart: function(store, sortBy, figure) {
+            if (!store) {
+                return window.dash_clientside.no_update;
+            }
+
+            // Stable sort, ties keep thread order like the server
+            const rows = store.axis.map((_, i) => i)
+                .sort((a, b) => store[sortBy][b] - store[sortBy][a])
+                .slice(0, store.top_n);
+            const bars = {
+                axis: rows.map(i => store.axis[i]),
+                hover: rows.map(i => store.hover[i]),
+                ups: rows.map(i => store.ups[i]),
+                compound: rows.map(i => store.compound[i])
+            };
+
+            const other = store.other[sortBy];
+            if (other) {
+                for (const key of ["axis", "hover", "ups", "compound"]) {
+                    bars[key].push(other[key]);
+                }
+            }
+
+            if (!bars.axis.length) { // No comments found
+                bars.axis = ["No comments found"];
+                bars.hover = ["No comments found"];
+                bars.ups = [0];
+                bars.compound = [0];
+            }
+
+            const [bar, markers] = figure.data;
+            return {
+                data: [
+                    Object.assign({}, bar, {x: bars.axis, y: bars.ups, hovertext: bars.hover}),
+                    Object.assign({}, markers, {x: bars.axis, y: bars.compound})
+                ],
+                layout: figure.layout
+            };
+        }
+    }
+});
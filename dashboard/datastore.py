@@ -0,0 +1,394 @@
+"""
+CS410 Mountain Group
+Dashboard data sources, disk cache and hot reload
+"""
+
+from functools import partial
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlparse
+
+import pandas as pd
+import pyarrow as pa
+
+try:
+    import fcntl
+except ImportError: # Windows, workers may then convert the same file twice
+    fcntl = None
+
+## Seconds a download may stall before the cached copy is used instead
+DOWNLOAD_TIMEOUT = 60
+
+def is_url(source: str) -> bool:
+    """
+    Whether a source is downloaded (http/https) or read from disk
+    """
+
+    return urlparse(source).scheme in ("http", "https")
+
+def local_version(path: str) -> str:
+    """
+    Version of a local file or dataset directory
+
+    Notes:
+        Modification times in nanoseconds, for directories (partitioned
+        Parquet datasets) the newest file plus the file count, so added and
+        removed partitions are noticed too
+
+    Keyword Arguments:
+        path (str): File or directory
+
+    Returns:
+        str: Changes whenever the data on disk changes
+    """
+
+    if not os.path.isdir(path):
+        return str(os.stat(path).st_mtime_ns)
+
+    mtimes = [os.stat(os.path.join(root, name)).st_mtime_ns
+              for root, _, names in os.walk(path) for name in names]
+    return f"{max(mtimes, default=0)}-{len(mtimes)}"
+
+def fetch(source: str, cache_dir: str) -> tuple:
+    """
+    Resolve a source to a local path, downloading URLs into the disk cache
+
+    Notes:
+        Cached downloads are revalidated with If-None-Match (ETag) and
+        If-Modified-Since (Last-Modified), unchanged data is answered with
+        304 and not downloaded again. If the server can not be reached, the
+        cached copy is used. Downloads are written to a temporary file and
+        moved into place, so readers never see a partial file
+
+    Keyword Arguments:
+        source (str): Local path or http(s) URL
+        cache_dir (str): Directory downloads are cached in
+
+    Returns:
+        tuple: Local path and its version (ETag, Last-Modified or mtime)
+    """
+
+    if not is_url(source):
+        return source, local_version(source)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, os.path.basename(urlparse(source).path) or "dataset")
+    meta_path = f"{path}.meta.json"
+
+    meta = {}
+    if os.path.isfile(path) and os.path.isfile(meta_path):
+        with open(meta_path, mode="r", encoding="utf-8") as fh:
+            meta = json.loads(fh.read())
+
+    request = urllib.request.Request(source)
+    if meta.get("etag"):
+        request.add_header("If-None-Match", meta["etag"])
+    if meta.get("last_modified"):
+        request.add_header("If-Modified-Since", meta["last_modified"])
+
+    try:
+        with urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT) as response:
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, mode="wb") as fh:
+                shutil.copyfileobj(response, fh)
+            os.replace(tmp, path)
+            meta = {"etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified")}
+        with open(meta_path, mode="w", encoding="utf-8") as fh:
+            fh.write(json.dumps(meta))
+    except urllib.error.HTTPError as error:
+        if error.code == 304: # not modified, the cached copy is current
+            pass
+        elif meta:
+            print(f"{source}: {error}, using cached {path}")
+        else:
+            raise
+    except urllib.error.URLError as error:
+        if not meta:
+            raise
+        print(f"{source}: {error.reason}, using cached {path}")
+
+    return path, meta.get("etag") or meta.get("last_modified") or local_version(path)
+
+def shared_frame(name: str, version: str, load, cache_dir: str) -> pd.DataFrame:
+    """
+    Load a frame through a read-only, memory-mapped Arrow IPC file
+
+    Notes:
+        The first worker to need a version calls load and writes the file,
+        holding a file lock so the other workers wait instead of parsing too.
+        Every worker then maps the same file: numbers are read-only numpy
+        views and strings Arrow backed (string[pyarrow]), so the data lives
+        once in the page cache whatever the number of workers. Files of
+        older versions are removed once a new one is written
+
+    Keyword Arguments:
+        name (str): Source name, prefix of the file name
+        version (str): Source version, a new version gets a new file
+        load (callable): Returns the frame to share, called at most once per
+            version on a host (unless file locks are unavailable)
+        cache_dir (str): Directory the Arrow files are written to
+
+    Returns:
+        pd.DataFrame: Frame backed by the memory-mapped file
+    """
+
+    os.makedirs(cache_dir, exist_ok=True)
+    digest = hashlib.blake2b(version.encode("utf-8"), digest_size=8).hexdigest()
+    path = os.path.join(cache_dir, f"{name}-{digest}.arrow")
+
+    if not os.path.isfile(path):
+        with open(f"{path}.lock", mode="w", encoding="utf-8") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            ## Another worker may have written it while we waited
+            if not os.path.isfile(path):
+                table = pa.Table.from_pandas(load(), preserve_index=False)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with pa.OSFile(tmp, "wb") as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+                os.replace(tmp, path)
+                for stale in glob.glob(os.path.join(cache_dir, f"{name}-*.arrow*")):
+                    if not stale.startswith(path):
+                        try:
+                            os.remove(stale)
+                        except OSError: # still mapped, e.g. on Windows
+                            pass
+
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    return table.to_pandas(split_blocks=True,
+                           types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+
+class DataStore:
+    """
+    Keeps the current version of the dashboard data and swaps in new ones
+
+    Notes:
+        load reads one source into a frame and build turns the frames of all
+        sources into one immutable data object. Readers take
+        DataStore.current once per request, a refresh builds the next version
+        on the side and replaces the reference in a single assignment, so
+        requests are never blocked or see a mix of two versions.
+        With shared, frames go through memory-mapped Arrow files (see
+        shared_frame), so workers on a host map the data instead of each
+        parsing and holding a copy.
+        Files dropped in drop_dir are loaded like their source (the source
+        name must be part of the file name) and passed to the append method
+        of the current data object, which returns the next version. Each
+        file is read once, its rows are kept compacted in one frame per
+        source and appended again from memory after a refresh.
+        Sources named in deferred are loaded in a background thread and
+        passed to build as a function returning the frame once loaded, so
+        the build does not wait for data only some requests need
+
+    Keyword Arguments:
+        sources (dict): Name to local path or URL, names are build arguments
+        load (callable): Called with a source name and local path
+        build (callable): Called with the frame of each source
+        cache_dir (str): Directory downloads and shared files are kept in
+        shared (bool): Share frames between processes through Arrow files
+        key (str or callable): Part of the version besides the source
+            version, change it when load reads different columns or rows.
+            A callable is called on every refresh
+        drop_dir (str): Directory of CSV or Parquet files with new rows
+        deferred (tuple): Names of sources loaded in the background
+    """
+
+    def __init__(self, sources: dict, load, build, cache_dir: str,
+                 shared: bool = False, key="", drop_dir: str = None, deferred: tuple = ()):
+        self.sources = sources
+        self.load = load
+        self.build = build
+        self.cache_dir = cache_dir
+        self.shared = shared
+        self.key = key
+        self.drop_dir = drop_dir
+        self.deferred = deferred
+        self.dropped = set()
+        self.dropped_rows = {name: [] for name in sources}
+        self.versions = None
+        self.current = None
+        self.refresh_lock = threading.Lock()
+
+    def refresh(self) -> bool:
+        """
+        Revalidate all sources and rebuild the data if any of them changed
+
+        Returns:
+            bool: Whether a new version was swapped in
+        """
+
+        with self.refresh_lock:
+            key = self.key() if callable(self.key) else self.key
+            fetched = {name: fetch(source, self.cache_dir) for name, source in self.sources.items()}
+            versions = {name: f"{key}:{version}" for name, (_, version) in fetched.items()}
+            if versions == self.versions:
+                return False
+
+            frames = {}
+            for name, (path, _) in fetched.items():
+                frames[name] = self.loader(name, path, versions[name])
+                if name in self.deferred:
+                    threading.Thread(target=frames[name], name=f"datastore-{name}",
+                                     daemon=True).start()
+                else:
+                    frames[name] = frames[name]()
+            ## Rows dropped so far are applied again on top of the sources,
+            ## from memory instead of reading every drop file again
+            for name, rows in self.dropped_rows.items():
+                if len(rows) > 1:
+                    rows[:] = [pd.concat(rows, ignore_index=True)]
+            data = self.build(**frames)
+            data = data.append(**{name: rows[0] if rows else None
+                                  for name, rows in self.dropped_rows.items()})
+            self.current = self.append_dropped(data)
+            self.versions = versions
+            return True
+
+    def loader(self, name: str, path: str, version: str):
+        """
+        Function loading a source version
+
+        Notes:
+            The frame is loaded by the first call, concurrent calls wait for
+            it and later calls return it. A failed load is retried by the
+            next call
+
+        Keyword Arguments:
+            name (str): Source name
+            path (str): Local path of the source
+            version (str): Source version, names the shared file
+
+        Returns:
+            callable: Returns the frame, through a shared file with shared
+        """
+
+        load = partial(self.load, name, path)
+        if self.shared:
+            load = partial(shared_frame, name, version, load, self.cache_dir)
+        lock = threading.Lock()
+        frame = []
+
+        def loaded() -> pd.DataFrame:
+            with lock:
+                if not frame:
+                    frame.append(load())
+            return frame[0]
+
+        return loaded
+
+    def append_dropped(self, data):
+        """
+        Append the rows of drop_dir files not appended yet to a data version
+
+        Notes:
+            Files are recognized by path, size and modification time, so a
+            file that is replaced is read again. Writers should move
+            finished files into drop_dir, so a half written file is never read.
+            The rows read are kept for the next refresh
+
+        Keyword Arguments:
+            data: Data version with an append method
+
+        Returns:
+            The next data version, data itself if nothing changed
+        """
+
+        frames = {name: [] for name in self.sources}
+        dropped = set()
+        if self.drop_dir is not None and os.path.isdir(self.drop_dir):
+            for entry in sorted(os.scandir(self.drop_dir), key=lambda e: (e.stat().st_mtime_ns, e.name)):
+                if not entry.is_file() or not entry.name.endswith((".csv", ".parquet")):
+                    continue
+                file_id = (entry.path, entry.stat().st_size, entry.stat().st_mtime_ns)
+                name = next((name for name in self.sources if name in entry.name), None)
+                if name is None or file_id in self.dropped:
+                    continue
+                frames[name].append(self.load(name, entry.path))
+                dropped.add(file_id)
+
+        data = data.append(**{name: pd.concat(frame, ignore_index=True) if frame else None
+                              for name, frame in frames.items()})
+        self.dropped |= dropped
+        for name, frame in frames.items():
+            self.dropped_rows[name] += frame
+        return data
+
+    def ingest(self) -> bool:
+        """
+        Append new drop_dir files to the current data
+
+        Notes:
+            append is called even without new files, so the data can also
+            roll its date window forward
+
+        Returns:
+            bool: Whether a new version was swapped in
+        """
+
+        with self.refresh_lock:
+            data = self.append_dropped(self.current)
+            if data is self.current:
+                return False
+            self.current = data
+            return True
+
+    def start(self, interval: float) -> threading.Thread:
+        """
+        Refresh every interval seconds in a background thread
+
+        Notes:
+            A failed refresh keeps the current data and is retried on the
+            next interval
+
+        Keyword Arguments:
+            interval (float): Seconds between refreshes
+
+        Returns:
+            threading.Thread: The daemon refresh thread
+        """
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self.refresh():
+                        print("data refreshed")
+                except Exception as error: # keep serving the current data
+                    print(f"data refresh failed: {error!r}")
+
+        thread = threading.Thread(target=run, name="datastore-refresh", daemon=True)
+        thread.start()
+        return thread
+
+    def watch(self, interval: float) -> threading.Thread:
+        """
+        Ingest drop_dir files every interval seconds in a background thread
+
+        Keyword Arguments:
+            interval (float): Seconds between checks
+
+        Returns:
+            threading.Thread: The daemon ingest thread
+        """
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self.ingest():
+                        print("new data appended")
+                except Exception as error: # keep serving the current data
+                    print(f"data ingest failed: {error!r}")
+
+        thread = threading.Thread(target=run, name="datastore-ingest", daemon=True)
+        thread.start()
+        return thread
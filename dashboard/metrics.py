@@ -0,0 +1,150 @@
+"""
+CS410 Mountain Group
+Dashboard callback metrics in the Prometheus text format
+"""
+
+from bisect import bisect_left
+import threading
+import time
+
+import flask
+
+## Upper bounds of the latency (seconds) and payload (bytes) histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PAYLOAD_BUCKETS = (1000, 5000, 10000, 25000, 50000, 100000, 250000, 500000, 1000000, 5000000)
+
+## Path Dash posts every callback to
+DISPATCH_PATH = "/_dash-update-component"
+
+class Histogram:
+    """
+    Cumulative Prometheus histogram of one label set
+
+    Keyword Arguments:
+        buckets (tuple): Sorted upper bounds, +Inf is added
+    """
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        """
+        Count a value in the first bucket it fits in, cumulated on export
+        """
+
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name: str, labels: str) -> list:
+        """
+        Bucket, sum and count samples of the histogram
+        """
+
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            le = "+Inf" if bound == float("inf") else str(bound)
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {total}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {total}")
+        return lines
+
+class CallbackMetrics:
+    """
+    Call counts, latency and payload size of every Dash callback
+
+    Notes:
+        Callbacks are timed around the request to DISPATCH_PATH, so the time
+        includes decoding the inputs and serializing the figure, which is
+        what a user waits for. The callback is named after its function,
+        looked up by output id in app.callback_map. Recording is a few
+        dictionary lookups under a lock per request. Metrics are kept per
+        process, under a multi-worker server each scrape sees the worker
+        that answered it
+
+    Keyword Arguments:
+        app (Dash): App whose server is instrumented
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.latency = {}
+        self.payload = {}
+        app.server.before_request(self.before_request)
+        app.server.after_request(self.after_request)
+
+    def callback_name(self, output: str) -> str:
+        """
+        Function name of the callback updating output
+        """
+
+        ## Clientside callbacks have no function, the browser runs them
+        function = self.app.callback_map.get(output, {}).get("callback")
+        return function.__name__ if function else "unknown"
+
+    def before_request(self):
+        """
+        Start the clock of a callback request
+        """
+
+        if flask.request.path == DISPATCH_PATH:
+            flask.g.callback_start = time.perf_counter()
+
+    def after_request(self, response: flask.Response) -> flask.Response:
+        """
+        Record latency, payload size and status of a callback request
+        """
+
+        start = flask.g.pop("callback_start", None)
+        if start is None:
+            return response
+        seconds = time.perf_counter() - start
+        body = flask.request.get_json(silent=True) or {}
+        name = self.callback_name(body.get("output", ""))
+        size = response.calculate_content_length() or 0
+
+        with self.lock:
+            key = (name, response.status_code)
+            self.calls[key] = self.calls.get(key, 0) + 1
+            if name not in self.latency:
+                self.latency[name] = Histogram(LATENCY_BUCKETS)
+                self.payload[name] = Histogram(PAYLOAD_BUCKETS)
+            self.latency[name].observe(seconds)
+            self.payload[name].observe(size)
+        return response
+
+    def render(self, gauges: dict = None) -> str:
+        """
+        Metrics in the Prometheus text exposition format
+
+        Keyword Arguments:
+            gauges (dict): Extra gauges, name to (help, value)
+
+        Returns:
+            str: Text served on the metrics route
+        """
+
+        lines = ["# HELP dashboard_callback_calls_total Callback requests by HTTP status",
+                 "# TYPE dashboard_callback_calls_total counter"]
+        with self.lock:
+            for (name, status), count in sorted(self.calls.items()):
+                lines.append(f'dashboard_callback_calls_total{{callback="{name}",status="{status}"}} {count}')
+
+            for metric, help_text, histograms in (
+                    ("dashboard_callback_latency_seconds", "Callback request latency", self.latency),
+                    ("dashboard_callback_payload_bytes", "Callback response body size", self.payload)):
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} histogram")
+                for name, histogram in sorted(histograms.items()):
+                    lines.extend(histogram.lines(metric, f'callback="{name}"'))
+
+        for name, (help_text, value) in (gauges or {}).items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,10 @@
+"""
+CS410 Mountain Group
+The dashboard modules import each other by name, so tests run with the
+dashboard directory on the path
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,83 @@
+"""
+CS410 Mountain Group
+Tests of the dashboard app on small local datasets
+"""
+
+import importlib
+import os
+
+import pandas as pd
+import pytest
+
+HEADLINES = pd.DataFrame({
+    "created_utc": ["2022-11-20", "2022-11-20", "2022-11-20", "2022-11-21"],
+    "id": ["h1", "h2", "h3", "h4"],
+    "ups": [300, 200, 100, 50],
+    "downs": [0, 1, 2, 3],
+    "compound": [0.5, -0.5, 0.0, 0.2],
+    "city": ["Kyiv", "Kherson", "", "Kyiv"],
+    "headline": ["War in Kyiv", "Kherson war report", "WAR news", "Peace talks in Kyiv"]})
+COMMENTS = pd.DataFrame({
+    "created_utc": ["2022-11-20", "2022-11-20", "2022-11-20", "2022-11-21"],
+    "id": ["c1", "c2", "c3", "c4"],
+    "ups": [10, 5, 1, 7],
+    "compound": [0.6, -0.4, 0.0, 0.3],
+    "label": [1, -1, 0, 1],
+    "link_id": ["t3_h1", "t3_h1", "t3_h2", "t3_h4"],
+    "headline": ["Good", "Bad", "Fine", "Hope"]})
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp("data")
+    HEADLINES.to_csv(data_dir / "headlines.csv", index=False)
+    COMMENTS.to_csv(data_dir / "comments.csv", index=False)
+    os.environ.update({"DASHBOARD_HEADLINES_SOURCE": str(data_dir / "headlines.csv"),
+                       "DASHBOARD_COMMENTS_SOURCE": str(data_dir / "comments.csv"),
+                       "DASHBOARD_CACHE_DIR": str(data_dir / "cache"),
+                       "DASHBOARD_REFRESH_SECONDS": "0",
+                       "DASHBOARD_SHARED_DATA": "0"})
+    return importlib.import_module("app")
+
+@pytest.mark.parametrize("query, ids", [
+    ("{Headline} contains war", ["h1", "h2", "h3"]),
+    ("{Headline} icontains war", ["h1", "h2", "h3"]),
+    ("{Headline} scontains war", ["h2"]),
+    ("{Headline} scontains War", ["h1"]),
+    ("{Headline} s= WAR news", ["h3"]),
+    ("{Headline} i= war news", ["h3"]),
+    ("{Headline} ieq war news", ["h3"]),
+    ("{Headline} = war news", []),
+    ("{Upvotes} s>= 200", ["h1", "h2"]),
+    ("{Upvotes} ge 200 && {Headline} icontains kherson", ["h2"]),
+    ("{Downvotes} i< 2", ["h1", "h2"]),
+])
+def test_filter_operators(app, query, ids):
+    filtered = app.filter_headlines(HEADLINES, query)
+    assert filtered["id"].tolist() == ids
+
+def test_dropped_rows_skip_shown_ids_on_every_day(app, tmp_path):
+    ## One id already shown on the first day, so that day loses a row
+    dropped = pd.DataFrame({
+        "created_utc": ["2022-11-20"] * 3 + ["2022-11-21"] * 3,
+        "id": ["h1", "h5", "h6", "h7", "h8", "h9"],
+        "ups": [999, 90, 80, 70, 60, 40],
+        "downs": 0,
+        "compound": 0.1,
+        "city": "",
+        "headline": ["Shown", "New 5", "New 6", "New 7", "New 8", "New 9"]})
+    path = tmp_path / "headlines-new.csv"
+    dropped.to_csv(path, index=False)
+
+    data = app.DATA.current.append(headlines=app.load_source("headlines", str(path)))
+
+    assert data.headlines_on("2022-11-20")["id"].tolist() == ["h1", "h2", "h3", "h5", "h6"]
+    assert data.headlines_on("2022-11-21")["id"].tolist() == ["h7", "h8", "h4", "h9"]
+    assert data.headlines_on("2022-11-20")["ups"].iloc[0] == 300
+
+def test_day_without_posts_has_an_empty_thread(app):
+    store = app.thread_comments("2022-11-25", None)
+    assert store["axis"] == [] and store["other"] == {}
+
+    distribution, compound = app.DATA.current.thread_sentiment("2022-11-25", None)
+    assert not len(distribution) and compound is None
+    app.net_comment_sentiment("2022-11-25", None)
@@ -0,0 +1,158 @@
+"""
+CS410 Mountain Group
+Tests of the dashboard data sources against a local HTTP server
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import urllib.error
+
+import pandas as pd
+import pytest
+
+from datastore import DataStore, fetch
+
+class DatasetServer(ThreadingHTTPServer):
+    """
+    Serves body under any path with an ETag, answering 304 when the client
+    already has it. status makes every request fail with that status
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), DatasetHandler)
+        self.body = b"created_utc,compound\n2022-11-20,0.5\n"
+        self.etag = '"v1"'
+        self.status = None
+        self.responses = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/comments.csv"
+
+    def publish(self, body: bytes, etag: str) -> None:
+        self.body, self.etag = body, etag
+
+class DatasetHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.server.status is not None:
+            status = self.server.status
+        elif self.headers.get("If-None-Match") == self.server.etag:
+            status = 304
+        else:
+            status = 200
+        self.server.responses.append(status)
+        self.send_response(status)
+        if status == 200:
+            self.send_header("ETag", self.server.etag)
+            self.send_header("Content-Length", str(len(self.server.body)))
+            self.end_headers()
+            self.wfile.write(self.server.body)
+        else:
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+class Version:
+    """
+    Data version built by the store, counts the builds and keeps the
+    appended frames
+    """
+
+    builds = 0
+
+    def __init__(self, comments: pd.DataFrame):
+        Version.builds += 1
+        self.comments = comments
+        self.appended = []
+
+    def append(self, **frames):
+        if frames["comments"] is not None:
+            self.appended.append(frames["comments"])
+        return self
+
+@pytest.fixture
+def server():
+    server = DatasetServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def store(server, tmp_path):
+    Version.builds = 0
+    return DataStore({"comments": server.url}, lambda name, path: pd.read_csv(path),
+                     Version, str(tmp_path / "cache"))
+
+def test_unchanged_source_is_revalidated_not_downloaded(server, tmp_path):
+    path, version = fetch(server.url, str(tmp_path))
+    assert fetch(server.url, str(tmp_path)) == (path, version)
+
+    assert server.responses == [200, 304]
+    assert version == '"v1"'
+    with open(path, mode="rb") as fh:
+        assert fh.read() == server.body
+
+def test_changed_etag_rebuilds_the_data(server, store):
+    assert store.refresh()
+    assert not store.refresh()
+    assert Version.builds == 1
+
+    server.publish(b"created_utc,compound\n2022-11-21,-0.5\n", '"v2"')
+    assert store.refresh()
+
+    assert server.responses == [200, 304, 200]
+    assert Version.builds == 2
+    assert store.current.comments["compound"].tolist() == [-0.5]
+
+def test_unreachable_server_falls_back_to_cached_copy(server, tmp_path):
+    cached = fetch(server.url, str(tmp_path))
+    url = server.url
+    server.shutdown()
+    server.server_close()
+
+    assert fetch(url, str(tmp_path)) == cached
+
+def test_server_error_falls_back_to_cached_copy(server, store):
+    assert store.refresh()
+    server.status = 500
+
+    ## A failed revalidation keeps the current data
+    assert not store.refresh()
+    assert server.responses == [200, 500]
+    assert store.current.comments["compound"].tolist() == [0.5]
+
+def test_no_cached_copy_raises(server, tmp_path):
+    server.status = 500
+    with pytest.raises(urllib.error.HTTPError):
+        fetch(server.url, str(tmp_path))
+
+def test_refresh_appends_dropped_rows_without_reading_the_files_again(server, tmp_path):
+    drop_dir = tmp_path / "drop"
+    drop_dir.mkdir()
+    reads = []
+
+    def load(name, path):
+        reads.append(path)
+        return pd.read_csv(path)
+
+    store = DataStore({"comments": server.url}, load, Version,
+                      str(tmp_path / "cache"), drop_dir=str(drop_dir))
+    store.refresh()
+    pd.DataFrame({"created_utc": ["2022-11-22"], "compound": [0.1]}).to_csv(
+        drop_dir / "comments-1.csv", index=False)
+    store.ingest()
+    pd.DataFrame({"created_utc": ["2022-11-23"], "compound": [0.2]}).to_csv(
+        drop_dir / "comments-2.csv", index=False)
+    store.ingest()
+    drop_reads = len(reads)
+
+    server.publish(b"created_utc,compound\n2022-11-21,-0.5\n", '"v2"')
+    assert store.refresh()
+
+    ## Only the new source is read, the dropped rows come from memory
+    assert len(reads) == drop_reads + 1
+    assert [frame["compound"].tolist() for frame in store.current.appended] == [[0.1, 0.2]]
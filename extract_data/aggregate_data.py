@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Aggregates labeled headlines and comments into per-day summary tables for the
+dashboard, so its overview panels do not need the labeled rows.
+Input: Labeled headline and (updated) comment CSV or Parquet datasets
+Output: Parquet summary tables partitioned by created_utc day and a manifest
+of the per-day input hashes, only days whose input changed are rewritten
+"""
+
+import argparse
+import json
+import os
+import shutil
+import pandas as pd
+from columnar import load_labeled
+
+MANIFEST = "manifest.json"
+HEADLINE_COLUMNS = ["created_utc", "id", "compound", "city"]
+COMMENT_COLUMNS = ["created_utc", "id", "compound", "label", "link_id"]
+# Summary table: input dataset it is aggregated from
+SUMMARY_TABLES = {
+    "daily_sentiment": ("headlines", "comments"),
+    "city_sentiment": ("headlines",),
+    "thread_sentiment": ("comments",),
+}
+LABEL_NAMES = {-1: "negative", 0: "neutral", 1: "positive"}
+
+
+def with_day(labeled_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds the YYYY-MM-DD day of created_utc, dates and timestamps alike
+    """
+    days = pd.to_datetime(labeled_df["created_utc"].astype(str)).to_numpy()
+    return labeled_df.assign(day=days.astype("datetime64[D]").astype(str))
+
+
+def day_hashes(labeled_df: pd.DataFrame, columns: list) -> dict:
+    """
+    Hash of the rows of each day. Row hashes are summed, so the hash does not
+    depend on the row order of the input
+    """
+    row_hashes = pd.util.hash_pandas_object(labeled_df[columns], index=False)
+    sums = row_hashes.groupby(labeled_df["day"].to_numpy()).agg(["sum", "count"])
+    # Read column-wise, iterrows would upcast the uint64 sums to float64
+    return {
+        day: f"{int(total):016x}-{int(count)}"
+        for day, total, count in zip(sums.index, sums["sum"], sums["count"])
+    }
+
+
+def daily_sentiment(
+    headlines_df: pd.DataFrame, comments_df: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Row count and mean compound score of headlines and comments per day
+    """
+    frames = []
+    for kind, labeled_df in (("headlines", headlines_df), ("comments", comments_df)):
+        daily = labeled_df.groupby("day")["compound"].agg(["count", "mean"])
+        frames.append(daily.reset_index().assign(kind=kind))
+    daily = pd.concat(frames, ignore_index=True)
+    return daily.rename(columns={"mean": "compound"})[
+        ["day", "kind", "count", "compound"]
+    ]
+
+
+def city_sentiment(headlines_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Headline count and mean compound score per day and city
+    """
+    cities = headlines_df.groupby(["day", "city"])["compound"].agg(["count", "mean"])
+    return cities.reset_index().rename(columns={"mean": "compound"})
+
+
+def thread_sentiment(comments_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Comment count, mean compound score and label counts per day and post
+    """
+    post_id = comments_df["link_id"].astype(str).str.replace("^t3_", "", regex=True)
+    comments_df = comments_df.assign(post_id=post_id)
+    keys = ["day", "post_id"]
+    threads = comments_df.groupby(keys)["compound"].agg(["count", "mean"])
+    labels = pd.crosstab(
+        [comments_df["day"], comments_df["post_id"]], comments_df["label"]
+    )
+    labels = labels.reindex(columns=list(LABEL_NAMES), fill_value=0)
+    threads = threads.join(labels.rename(columns=LABEL_NAMES).rename_axis(keys))
+    return threads.reset_index().rename(columns={"mean": "compound"})
+
+
+def write_partition(table_df: pd.DataFrame, table_dir: str, day: str) -> None:
+    """
+    Replaces the partition of a day. The file is written under a hidden name
+    and moved into place, so readers never see a partial file
+    """
+    day_dir = os.path.join(table_dir, f"created_utc={day}")
+    os.makedirs(day_dir, exist_ok=True)
+    tmp = os.path.join(day_dir, ".part-0.parquet.tmp")
+    table_df.drop(columns="day").to_parquet(tmp, index=False)
+    os.replace(tmp, os.path.join(day_dir, "part-0.parquet"))
+
+
+def load_manifest(summary_dir: str) -> dict:
+    """
+    Per-day input hashes of the last run, empty if there was none
+    """
+    path = os.path.join(summary_dir, MANIFEST)
+    if not os.path.isfile(path):
+        return {}
+    with open(path, mode="r", encoding="utf-8") as fh:
+        return json.loads(fh.read())
+
+
+def aggregate(
+    headlines_dataset: str, comments_dataset: str, summary_dir: str, full: bool = False
+) -> dict:
+    """
+    Rewrites the summary partitions of the days whose input changed since the
+    last run and removes those of days no longer in the input. Returns the
+    days rewritten per table
+    """
+    inputs = {
+        "headlines": with_day(
+            load_labeled(headlines_dataset, columns=HEADLINE_COLUMNS)
+        ),
+        "comments": with_day(load_labeled(comments_dataset, columns=COMMENT_COLUMNS)),
+    }
+    hashes = {
+        "headlines": day_hashes(inputs["headlines"], HEADLINE_COLUMNS),
+        "comments": day_hashes(inputs["comments"], COMMENT_COLUMNS),
+    }
+    previous = {} if full else load_manifest(summary_dir)
+    changed = {
+        kind: {
+            day
+            for day in set(day_hash) | set(previous.get(kind, {}))
+            if day_hash.get(day) != previous.get(kind, {}).get(day)
+        }
+        for kind, day_hash in hashes.items()
+    }
+    if full and os.path.isdir(summary_dir):
+        shutil.rmtree(summary_dir)
+
+    rewritten = {}
+    for table, kinds in SUMMARY_TABLES.items():
+        days = sorted(set().union(*(changed[kind] for kind in kinds)))
+        rewritten[table] = days
+        if not days:
+            continue
+        table_dir = os.path.join(summary_dir, table)
+        for day in days:
+            day_dir = os.path.join(table_dir, f"created_utc={day}")
+            if os.path.isdir(day_dir):
+                shutil.rmtree(day_dir)
+
+        selected = {
+            kind: labeled_df[labeled_df["day"].isin(days)]
+            for kind, labeled_df in inputs.items()
+        }
+        if table == "daily_sentiment":
+            table_df = daily_sentiment(selected["headlines"], selected["comments"])
+        elif table == "city_sentiment":
+            table_df = city_sentiment(selected["headlines"])
+        else:
+            table_df = thread_sentiment(selected["comments"])
+        for day, day_df in table_df.groupby("day"):
+            write_partition(day_df, table_dir, day)
+
+    # Written last, an interrupted run redoes its days on the next run
+    os.makedirs(summary_dir, exist_ok=True)
+    tmp = os.path.join(summary_dir, f".{MANIFEST}.tmp")
+    with open(tmp, mode="w", encoding="utf-8") as fh:
+        fh.write(json.dumps(hashes, sort_keys=True))
+    os.replace(tmp, os.path.join(summary_dir, MANIFEST))
+    return rewritten
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--headlines-dataset",
+        type=str,
+        required=False,
+        help="labeled headlines dataset, CSV or Parquet directory",
+        default="./data/UkrainianConflict-headlines-labeled.csv",
+    )
+    parser.add_argument(
+        "--comments-dataset",
+        type=str,
+        required=False,
+        help="labeled (updated) comments dataset, CSV or Parquet directory",
+        default="./data/UkrainianConflict-comments-labeled-updated.csv",
+    )
+    parser.add_argument(
+        "--summary-dir",
+        type=str,
+        required=False,
+        help="directory the summary tables are written to",
+        default="./data/summary",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="rebuild every day instead of only the changed ones",
+    )
+    args = parser.parse_args()
+    rewritten = aggregate(
+        args.headlines_dataset, args.comments_dataset, args.summary_dir, full=args.full
+    )
+    for table, days in rewritten.items():
+        print(f"{table}: {len(days)} days rewritten")
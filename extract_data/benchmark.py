@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the labeling functions and process_dataset on synthetic datasets.
+Output: rows/sec and peak memory per benchmark, appended to a JSON lines file
+and tagged with the git commit so runs can be compared across commits
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+import pandas as pd
+from synthetic_data import SIZES, generate_dataset
+
+BENCHMARK_DIR = "./benchmarks"
+RESULTS_FILE = "./benchmarks/results.jsonl"
+
+
+def setup_clean_body(input_dataset: str, output_dir: str):
+    from label_data import clean_body, load_data
+
+    source_df = load_data(input_dataset)
+    return lambda: source_df["body"].map(clean_body)
+
+
+def setup_clean_column(input_dataset: str, output_dir: str):
+    from label_data import clean_column, load_data
+
+    source_df = load_data(input_dataset)
+    return lambda: clean_column(source_df["body"])
+
+
+def setup_contains_city(input_dataset: str, output_dir: str):
+    from label_data import clean_column, contains_city, load_data
+
+    headline = clean_column(load_data(input_dataset)["body"])
+    # Compile the gazetteer outside of the timed section
+    contains_city("")
+    return lambda: headline.map(contains_city)
+
+
+def setup_rank_data(input_dataset: str, output_dir: str):
+    from label_data import load_data, rank_data
+
+    source_df = load_data(input_dataset)
+    return lambda: rank_data(source_df)
+
+
+def setup_rank_data_batch(input_dataset: str, output_dir: str):
+    from label_data import load_data, rank_data_batch
+
+    source_df = load_data(input_dataset)
+    return lambda: rank_data_batch(source_df)
+
+
+def setup_rank_data_batch_parallel(input_dataset: str, output_dir: str):
+    from label_data import load_data, rank_data_batch
+
+    source_df = load_data(input_dataset)
+    return lambda: rank_data_batch(source_df, workers=os.cpu_count())
+
+
+def setup_label_data(input_dataset: str, output_dir: str):
+    from label_data import label_data, load_data, rank_data_batch
+
+    ranked_df = rank_data_batch(load_data(input_dataset))
+    return lambda: label_data(ranked_df.copy(), -0.2, 0.2)
+
+
+def setup_process_dataset(input_dataset: str, output_dir: str):
+    from label_data import process_dataset
+
+    output_dataset = os.path.join(output_dir, "labeled.csv")
+    return lambda: process_dataset(input_dataset, output_dataset)
+
+
+def setup_process_dataset_streaming(input_dataset: str, output_dir: str):
+    from label_data import process_dataset_streaming
+
+    output_dataset = os.path.join(output_dir, "labeled-streaming.csv")
+    return lambda: process_dataset_streaming(input_dataset, output_dataset)
+
+
+def setup_analyzer_startup(input_dataset: str, output_dir: str):
+    # Nothing is imported before the timed section, so it covers importing
+    # nltk, loading the lexicon cache and scoring the first text
+    def timed():
+        from vader_lexicon import sentiment_analyzer
+
+        sentiment_analyzer().polarity_scores("first score")
+
+    return timed
+
+
+# Each setup loads its inputs and returns the function that is timed
+BENCHMARKS = {
+    "analyzer_startup": setup_analyzer_startup,
+    "clean_body": setup_clean_body,
+    "clean_column": setup_clean_column,
+    "contains_city": setup_contains_city,
+    "rank_data": setup_rank_data,
+    "rank_data_batch": setup_rank_data_batch,
+    "rank_data_batch_parallel": setup_rank_data_batch_parallel,
+    "label_data": setup_label_data,
+    "process_dataset": setup_process_dataset,
+    "process_dataset_streaming": setup_process_dataset_streaming,
+}
+
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """
+    Peak resident memory of the current process, or with RUSAGE_CHILDREN of
+    the largest of its finished child processes (e.g. scoring workers)
+    """
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def run_benchmark(name: str, input_dataset: str, output_dir: str, results) -> None:
+    """
+    Runs one benchmark, in a fresh process so peak memory is its own. Worker
+    processes are measured separately, their peak is read once they exited
+    """
+    timed = BENCHMARKS[name](input_dataset, output_dir)
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    timed()
+    seconds = time.perf_counter() - start
+    results.put(
+        {
+            "seconds": seconds,
+            "peak_rss_mb": peak_rss_mb(),
+            "children_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+            "setup_rss_mb": baseline,
+        }
+    )
+
+
+def git_commit() -> str:
+    """
+    Commit the benchmarks ran on, marked dirty when there are local changes
+    """
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def synthetic_dataset(kind: str, size: str, seed: int) -> str:
+    """
+    Path of a synthetic dataset, generated on first use
+    """
+    data_dir = os.path.join(BENCHMARK_DIR, "data")
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"synthetic-{kind}-{size}-seed{seed}.csv")
+    if not os.path.isfile(path):
+        print(f"generating {path}")
+        generate_dataset(kind, SIZES[size], path, seed=seed)
+    return path
+
+
+def compare(results_file: str, last: int) -> pd.DataFrame:
+    """
+    Rows/sec of each benchmark for the last commits that were benchmarked
+    """
+    results = pd.read_json(results_file, lines=True)
+    commits = list(dict.fromkeys(results["commit"]))[-last:]
+    results = results[results["commit"].isin(commits)]
+    table = results.pivot_table(
+        index=["benchmark", "kind", "rows"],
+        columns="commit",
+        values="rows_per_sec",
+        aggfunc="last",
+    )
+    return table[commits].round(0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--benchmarks",
+        type=str,
+        required=False,
+        help="comma separated benchmarks, one of " + ", ".join(BENCHMARKS),
+        default=",".join(BENCHMARKS),
+    )
+    parser.add_argument(
+        "--sizes",
+        type=str,
+        required=False,
+        help="comma separated dataset sizes, one of " + ", ".join(SIZES),
+        default="1k,100k",
+    )
+    parser.add_argument(
+        "--kinds",
+        type=str,
+        required=False,
+        help="comma separated synthetic datasets, headlines and/or comments",
+        default="comments",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        required=False,
+        help="seed of the synthetic datasets",
+        default=0,
+    )
+    parser.add_argument(
+        "--results-file",
+        type=str,
+        required=False,
+        help="JSON lines file results are appended to",
+        default=RESULTS_FILE,
+    )
+    parser.add_argument(
+        "--compare",
+        type=int,
+        required=False,
+        metavar="N",
+        help="print rows/sec of the last N benchmarked commits and exit",
+        default=0,
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        with pd.option_context("display.width", 200, "display.max_rows", None):
+            print(compare(args.results_file, args.compare))
+        sys.exit(0)
+
+    commit = git_commit()
+    context = multiprocessing.get_context("spawn")
+    os.makedirs(os.path.join(BENCHMARK_DIR, "output"), exist_ok=True)
+    for size in args.sizes.split(","):
+        for kind in args.kinds.split(","):
+            input_dataset = synthetic_dataset(kind, size, args.seed)
+            for name in args.benchmarks.split(","):
+                results = context.Queue()
+                process = context.Process(
+                    target=run_benchmark,
+                    args=(
+                        name,
+                        input_dataset,
+                        os.path.join(BENCHMARK_DIR, "output"),
+                        results,
+                    ),
+                )
+                process.start()
+                while True:
+                    try:
+                        result = results.get(timeout=1)
+                        break
+                    except queue.Empty:
+                        if not process.is_alive():
+                            sys.exit(f"benchmark {name} failed")
+                process.join()
+
+                record = {
+                    "commit": commit,
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "benchmark": name,
+                    "kind": kind,
+                    "rows": SIZES[size],
+                    "rows_per_sec": SIZES[size] / result["seconds"],
+                    **result,
+                }
+                with open(args.results_file, mode="a", encoding="utf-8") as fh:
+                    fh.write(json.dumps(record) + "\n")
+                print(
+                    f"{name} {kind} {size}: {record['rows_per_sec']:.0f} rows/sec, "
+                    f"{record['seconds']:.2f}s, peak {record['peak_rss_mb']:.0f} MB, "
+                    f"workers peak {record['children_peak_rss_mb']:.0f} MB"
+                )
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Columnar storage for labeled datasets. Datasets are written as Parquet
+files partitioned by created_utc day, so readers can load only the columns
+and days they need.
+"""
+
+import os
+import shutil
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+LABELED_SCHEMA = pa.schema(
+    [
+        ("created_utc", pa.string()),
+        ("id", pa.string()),
+        ("subreddit_id", pa.string()),
+        ("downs", pa.int64()),
+        ("ups", pa.int64()),
+        ("author", pa.string()),
+        ("total_awards_received", pa.int64()),
+        ("neg", pa.float64()),
+        ("neu", pa.float64()),
+        ("pos", pa.float64()),
+        ("compound", pa.float64()),
+        ("label", pa.int8()),
+        ("city", pa.string()),
+        ("headline", pa.string()),
+        ("link_id", pa.string()),
+    ]
+)
+PARTITIONING = ds.partitioning(pa.schema([("created_utc", pa.string())]), flavor="hive")
+
+
+def columnar_path(output_dataset: str) -> str:
+    """
+    Parquet dataset directory written next to a CSV output
+    """
+    return os.path.splitext(output_dataset)[0] + ".parquet"
+
+
+def write_dataset(labeled_df: pd.DataFrame, path: str, append: bool = False) -> None:
+    """
+    Writes labeled rows partitioned by created_utc day. Unless appending, an
+    existing dataset at path is replaced
+    """
+    if not append and os.path.isdir(path):
+        shutil.rmtree(path)
+    schema = pa.schema([f for f in LABELED_SCHEMA if f.name in labeled_df])
+    labeled_df = labeled_df.assign(created_utc=labeled_df["created_utc"].astype(str))
+    table = pa.Table.from_pandas(labeled_df, schema=schema, preserve_index=False)
+    ds.write_dataset(
+        table,
+        path,
+        format="parquet",
+        partitioning=PARTITIONING,
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+
+def read_dataset(
+    path: str, columns: list = None, start: str = None, end: str = None
+) -> pd.DataFrame:
+    """
+    Reads a partitioned dataset. Only the requested columns are read and only
+    the day partitions between start and end (inclusive, YYYY-MM-DD) opened
+    """
+    dataset = ds.dataset(path, format="parquet", partitioning=PARTITIONING)
+    day_filter = None
+    if start is not None:
+        day_filter = ds.field("created_utc") >= start
+    if end is not None:
+        end_filter = ds.field("created_utc") <= end
+        day_filter = end_filter if day_filter is None else day_filter & end_filter
+    table = dataset.to_table(columns=columns, filter=day_filter)
+    return table.to_pandas()
+
+
+def load_labeled(
+    path: str, columns: list = None, start: str = None, end: str = None
+) -> pd.DataFrame:
+    """
+    Loads a labeled dataset from a Parquet dataset directory or a CSV file,
+    restricted to columns and to days between start and end
+    """
+    if os.path.isdir(path):
+        return read_dataset(path, columns=columns, start=start, end=end)
+
+    usecols = columns
+    if columns is not None and "created_utc" not in columns:
+        usecols = columns + ["created_utc"]
+    labeled_df = pd.read_csv(path, usecols=usecols, lineterminator="\n")
+    if start is not None:
+        labeled_df = labeled_df[labeled_df["created_utc"] >= start]
+    if end is not None:
+        labeled_df = labeled_df[labeled_df["created_utc"] <= end]
+    if columns is not None:
+        labeled_df = labeled_df[columns]
+    return labeled_df.reset_index(drop=True)
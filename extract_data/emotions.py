@@ -1,56 +1,128 @@
+import argparse
+import json
+import os
+import re
+import numpy as np
 import pandas as pd
-from nrclex import NRCLex
-import plotly.express as px 
+import nrclex
+import plotly.express as px
+from columnar import load_labeled
 
 """ Pandas is used for creating data frames
-    NRCLex is used for Emotion Sentiment Analysis
+    NRCLex is used for Emotion Sentiment Analysis (only its lexicon is used,
+    headlines are scored with a precompiled index, see build_index)
     Plotly is used for creating figures """
 
+## Words as NRCLex (TextBlob) sees them; hyphenated words stay one token
+TOKEN_PATTERN = re.compile(r"[A-Za-z]+(?:[-'][A-Za-z]+)*")
+BATCH_SIZE = 10000
 
-##Create Dataframe by reading original file with headlines
-mydf = pd.read_csv("./data/UkrainianConflict-headlines-labeled.csv", sep=",")
 
-#Just slice 13 column which has headline 
-my_list = mydf['headline'].tolist()
+def load_lexicon() -> dict:
+    """
+    NRC lexicon shipped with NRCLex, read from its nrc_en.json. NRCLex 3
+    installs it next to the module, NRCLex 4 in nrclex/data
+    """
+    package_dir = os.path.dirname(nrclex.__file__)
+    for path in (
+        os.path.join(package_dir, "data", "nrc_en.json"),
+        os.path.join(package_dir, "nrc_en.json"),
+    ):
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as fh:
+                return json.load(fh)
+    raise FileNotFoundError(f"nrc_en.json not found in {package_dir}")
 
 
-##Get Emotion score for each line in headlines and add it to headlineemotions []
-headlineemotions = []
-for headline in my_list:
-    # Create headline_object for NRCLex processing 
-    headline_object = NRCLex(headline)
-    headlineemotions.append(headline_object.raw_emotion_scores)
-    
+def build_index(lexicon: dict = None) -> tuple:
+    """
+    Compiles the NRC lexicon once into a word -> row lookup and a
+    (word x emotion) count matrix. The NRCLex lexicon is loaded when no
+    lexicon is given
+    """
+    if lexicon is None:
+        lexicon = load_lexicon()
+    emotions = sorted({emotion for affects in lexicon.values() for emotion in affects})
+    columns = {emotion: i for i, emotion in enumerate(emotions)}
+    vocabulary = {word: i for i, word in enumerate(lexicon)}
+    matrix = np.zeros((len(vocabulary), len(emotions)), dtype=np.int32)
+    for word, affects in lexicon.items():
+        for emotion in affects:
+            matrix[vocabulary[word], columns[emotion]] += 1
+    return vocabulary, emotions, matrix
 
-#Changed dictionary to dataframe 
-myheadlinedf = pd.DataFrame(headlineemotions)
 
-##Clean up the NaN data with 0 
-myheadlinedf = myheadlinedf.fillna(0)
+def score_headlines(headlines: list, index: tuple, batch_size: int = BATCH_SIZE) -> pd.DataFrame:
+    """
+    Counts NRC emotions per headline like NRCLex raw_emotion_scores (same
+    lexicon, case sensitive lookup). Unlike TextBlob, words wrapped in quotes
+    are still matched. Each batch is tokenized once, then the matrix rows of
+    all lexicon hits are summed per headline in one vectorized step
+    """
+    vocabulary, emotions, matrix = index
+    counts = np.zeros((len(headlines), len(emotions)), dtype=np.int32)
+    for start in range(0, len(headlines), batch_size):
+        rows, words = [], []
+        for row, headline in enumerate(headlines[start:start + batch_size], start):
+            for token in TOKEN_PATTERN.findall(headline):
+                word = vocabulary.get(token)
+                if word is not None:
+                    rows.append(row)
+                    words.append(word)
+        np.add.at(counts, np.array(rows, dtype=np.intp), matrix[np.array(words, dtype=np.intp)])
+    return pd.DataFrame(counts, columns=emotions)
 
-##Merge original dataset with emotions as new columns
-mergeddf = pd.concat([mydf, myheadlinedf], axis=1)
-print(mergeddf)
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--input-dataset",
+        type=str,
+        required=False,
+        help="labeled headlines dataset, CSV or partitioned Parquet",
+        default="./data/UkrainianConflict-headlines-labeled.csv",
+    )
+    parser.add_argument(
+        "--output-dataset",
+        type=str,
+        required=False,
+        help="headlines with one count column per emotion",
+        default="./data/UkrainianConflict-headlines-emotions.csv",
+    )
+    parser.add_argument(
+        "--no-figures",
+        action="store_true",
+        help="do not open the figures, e.g. when run by pipeline.py",
+    )
+    args = parser.parse_args()
 
-##Get total counts from all the headlines
-##https://medium.com/geekculture/simple-emotion-classification-in-python-40fb24692541
-str_headline = ','.join(mergeddf['headline'])
-headline_object = NRCLex(str_headline)
-headlinedata = headline_object.raw_emotion_scores
-print(headlinedata)
+    ##Create Dataframe by reading original file with headlines, only the columns we need
+    mydf = load_labeled(args.input_dataset, columns=['created_utc', 'id', 'headline'])
 
+    ##Get Emotion score for each line in headlines as a headline x emotion count matrix
+    myheadlinedf = score_headlines(mydf['headline'].fillna('').tolist(), build_index())
 
-#Now, Create the graph for this
-## https://medium.com/geekculture/simple-emotion-classification-in-python-40fb24692541
-emotion_df = pd.DataFrame.from_dict(headlinedata, orient='index')
-emotion_df = emotion_df.reset_index()
-emotion_df = emotion_df.rename(columns={'index' : 'Emotion Classification' , 0: 'Emotion Count'})
-emotion_df = emotion_df.sort_values(by=['Emotion Count'], ascending=False)
-print(emotion_df)
+    ##Merge original dataset with emotions as new columns and keep them on disk
+    mergeddf = pd.concat([mydf, myheadlinedf], axis=1)
+    mergeddf.to_csv(args.output_dataset, index=False)
+    print(mergeddf)
 
-fig_bar = px.bar(emotion_df, x='Emotion Count', y='Emotion Classification', color = 'Emotion Classification', title = "Ukraine War Reddit Sentiment Analysis", orientation='h', width = 800, height = 400)
-#fig.show()
-fig_pie = px.pie(emotion_df, values = "Emotion Count", names = "Emotion Classification", color = 'Emotion Classification', title = "Ukraine War Reddit Sentiment Analysis", width = 800, height = 400)
-fig_pie.show()
-fig_bar.show()
+    ##Get total counts from all the headlines, the column sums of the count matrix
+    ##https://medium.com/geekculture/simple-emotion-classification-in-python-40fb24692541
+    headlinedata = myheadlinedf.sum()
+    headlinedata = headlinedata[headlinedata > 0]
+    print(headlinedata.to_dict())
+
+    #Now, Create the graph for this
+    ## https://medium.com/geekculture/simple-emotion-classification-in-python-40fb24692541
+    emotion_df = headlinedata.reset_index()
+    emotion_df = emotion_df.rename(columns={'index' : 'Emotion Classification' , 0: 'Emotion Count'})
+    emotion_df = emotion_df.sort_values(by=['Emotion Count'], ascending=False)
+    print(emotion_df)
+
+    fig_bar = px.bar(emotion_df, x='Emotion Count', y='Emotion Classification', color = 'Emotion Classification', title = "Ukraine War Reddit Sentiment Analysis", orientation='h', width = 800, height = 400)
+    #fig.show()
+    fig_pie = px.pie(emotion_df, values = "Emotion Count", names = "Emotion Classification", color = 'Emotion Classification', title = "Ukraine War Reddit Sentiment Analysis", width = 800, height = 400)
+    if not args.no_figures:
+        fig_pie.show()
+        fig_bar.show()
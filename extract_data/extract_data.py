@@ -3,81 +3,215 @@
 Extracts comments and headlines from Reddit API. Requires the creation of a
 developer application on Reddit. https://www.reddit.com/prefs/apps
 """
+import argparse
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import praw
 from praw.models import MoreComments
 import pandas as pd
 
 
 DATASET_SIZE = 1000
+# Records buffered per stream before they are written and checkpointed
+FLUSH_SIZE = 100
 SUBREDDIT = "UkrainianConflict"
+HEADLINES_FILE = "./data/UkrainianConflict-headlines.csv"
+COMMENTS_FILE = "./data/UkrainianConflict-comments.csv"
+CHECKPOINT_FILE = "./data/extract-checkpoint.json"
 
+checkpoint_lock = threading.Lock()
 
-def extract_headlines():
-    headlines = []
-
-    for submission in reddit.subreddit(SUBREDDIT).new(limit=DATASET_SIZE):
-        headlines.append(
-            {
-                "created_utc": submission.created_utc,
-                "id": submission.id,
-                "subreddit_id": submission.subreddit_id,
-                "downs": submission.downs,
-                "ups": submission.ups,
-                "author": submission.author,
-                "total_awards_received": submission.total_awards_received,
-                "body": submission.title,
-            }
-        )
-        print(f"headlines extracted {len(headlines)}")
-    return headlines
 
+def to_record(item, body: str) -> dict:
+    """
+    Selects the columns stored for a submission or comment
+    """
+    return {
+        "created_utc": item.created_utc,
+        "id": item.id,
+        "subreddit_id": item.subreddit_id,
+        "downs": item.downs,
+        "ups": item.ups,
+        "author": item.author,
+        "total_awards_received": item.total_awards_received,
+        "body": body,
+    }
 
-def extract_comments():
-    comments = []
 
-    for top_level_comment in reddit.subreddit(SUBREDDIT).stream.comments():
-        if len(comments) == DATASET_SIZE:
-            break
-        if isinstance(top_level_comment, MoreComments):
-            continue
-        comments.append(
-            {
-                "created_utc": top_level_comment.created_utc,
-                "id": top_level_comment.id,
-                "subreddit_id": top_level_comment.subreddit_id,
-                "downs": top_level_comment.downs,
-                "ups": top_level_comment.ups,
-                "author": top_level_comment.author,
-                "total_awards_received": top_level_comment.total_awards_received,
-                "body": top_level_comment.body,
-            }
-        )
-        print(f"comments extracted {len(comments)}")
-    return comments
+def load_checkpoint(filename: str = CHECKPOINT_FILE) -> dict:
+    """
+    Loads the per-stream checkpoint. high_water_mark is the newest created_utc
+    written, extracted the number of records written by an unfinished run
+    """
+    if not os.path.isfile(filename):
+        return {}
+    with open(filename, mode="r", encoding="utf-8") as fh:
+        return json.loads(fh.read())
+
+
+def update_checkpoint(
+    stream: str, state: dict, filename: str = CHECKPOINT_FILE
+) -> None:
+    """
+    Replaces the checkpoint of one stream, the file is swapped atomically
+    """
+    with checkpoint_lock:
+        checkpoint = load_checkpoint(filename)
+        checkpoint[stream] = state
+        with open(f"{filename}.tmp", mode="w", encoding="utf-8") as fh:
+            fh.write(json.dumps(checkpoint, indent=2))
+        os.replace(f"{filename}.tmp", filename)
+
+
+def load_ids(filename: str) -> set:
+    """
+    Returns the ids already written to a dataset
+    """
+    if not os.path.isfile(filename):
+        return set()
+    return set(pd.read_csv(filename, usecols=["id"], dtype={"id": str})["id"])
+
 
+def write_file(filename: str, reddit_data: list, seen_ids: set = None) -> list:
+    """
+    Appends records whose id is not in the dataset yet and returns them.
+    seen_ids caches the dataset ids between calls and is updated in place
+    """
+    if seen_ids is None:
+        seen_ids = load_ids(filename)
+    new_data = []
+    for record in reddit_data:
+        if record["id"] not in seen_ids:
+            seen_ids.add(record["id"])
+            new_data.append(record)
+    if not new_data:
+        return new_data
 
-def write_file(filename: str, reddit_data: list) -> None:
-    df = pd.DataFrame(data=reddit_data)
+    df = pd.DataFrame(data=new_data)
     if not os.path.isfile(filename):
         df.to_csv(filename, header="column_names", index=False)
     else:
         df.to_csv(filename, mode="a", header=False, index=False)
+    return new_data
+
+
+def extract_stream(
+    stream: str,
+    records,
+    filename: str,
+    stop_at_checkpoint: bool,
+    checkpoint: str = CHECKPOINT_FILE,
+) -> int:
+    """
+    Writes records to filename in batches of FLUSH_SIZE until DATASET_SIZE
+    new records were written, checkpointing after every batch. A run that
+    was interrupted only extracts the records it is missing. With
+    stop_at_checkpoint, records are assumed newest first and extraction
+    stops at the high-water mark of the last finished run
+    """
+    state = load_checkpoint(checkpoint).get(
+        stream, {"high_water_mark": 0, "extracted": 0}
+    )
+    resuming = state["extracted"] > 0
+    seen_ids = load_ids(filename)
+    batch = []
+
+    def flush() -> None:
+        written = write_file(filename, batch, seen_ids)
+        if written:
+            state["extracted"] += len(written)
+            state["high_water_mark"] = max(
+                [state["high_water_mark"]] + [r["created_utc"] for r in written]
+            )
+            update_checkpoint(stream, state, checkpoint)
+        print(f"{stream} extracted {state['extracted']}")
+        batch.clear()
+
+    previous_mark = state["high_water_mark"]
+    for record in records:
+        if (
+            stop_at_checkpoint
+            and not resuming
+            and record["created_utc"] <= previous_mark
+        ):
+            break
+        if record["id"] in seen_ids:
+            continue
+        batch.append(record)
+        if len(batch) == FLUSH_SIZE or state["extracted"] + len(batch) == DATASET_SIZE:
+            flush()
+        if state["extracted"] >= DATASET_SIZE:
+            break
+    if batch:
+        flush()
+
+    extracted = state["extracted"]
+    state["extracted"] = 0
+    update_checkpoint(stream, state, checkpoint)
+    return extracted
+
+
+def extract_headlines(
+    reddit: praw.Reddit,
+    filename: str = HEADLINES_FILE,
+    checkpoint: str = CHECKPOINT_FILE,
+) -> int:
+    submissions = reddit.subreddit(SUBREDDIT).new(limit=None)
+    records = (to_record(s, s.title) for s in submissions)
+    return extract_stream(
+        "headlines", records, filename, stop_at_checkpoint=True, checkpoint=checkpoint
+    )
+
+
+def extract_comments(
+    reddit: praw.Reddit,
+    filename: str = COMMENTS_FILE,
+    checkpoint: str = CHECKPOINT_FILE,
+) -> int:
+    comments = reddit.subreddit(SUBREDDIT).stream.comments()
+    records = (
+        to_record(c, c.body) for c in comments if not isinstance(c, MoreComments)
+    )
+    return extract_stream(
+        "comments", records, filename, stop_at_checkpoint=False, checkpoint=checkpoint
+    )
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        required=False,
+        help="directory the raw datasets and the checkpoint are written to",
+        default=os.path.dirname(HEADLINES_FILE),
+    )
+    args = parser.parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    def output_path(default: str) -> str:
+        return os.path.join(args.output_dir, os.path.basename(default))
+
     with open("creds.json", mode="r", encoding="utf-8") as fh:
         creds = json.loads(fh.read())[0]
 
-    reddit = praw.Reddit(
-        client_id=creds["client_id"],
-        client_secret=creds["client_secret"],
-        user_agent=creds["user_agent"],
-    )
-
-    headlines = extract_headlines()
-    write_file(filename="./data/UkrainianConflict-headlines.csv", reddit_data=headlines)
+    def reddit_factory() -> praw.Reddit:
+        return praw.Reddit(
+            client_id=creds["client_id"],
+            client_secret=creds["client_secret"],
+            user_agent=creds["user_agent"],
+        )
 
-    comments = extract_comments()
-    write_file(filename="./data/UkrainianConflict-comments.csv", reddit_data=comments)
+    # Headlines and comments are independent, each stream gets its own client
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        checkpoint = output_path(CHECKPOINT_FILE)
+        headlines = pool.submit(
+            extract_headlines, reddit_factory(), output_path(HEADLINES_FILE), checkpoint
+        )
+        comments = pool.submit(
+            extract_comments, reddit_factory(), output_path(COMMENTS_FILE), checkpoint
+        )
+        print(f"headlines written {headlines.result()}")
+        print(f"comments written {comments.result()}")
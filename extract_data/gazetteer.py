@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Matches Ukrainian locations in comment/headline text.
+Input: Gazetteer CSV with canonical name, type, "|" separated aliases and
+coordinates (shared with the dashboard map)
+"""
+
+import os
+import re
+import pandas as pd
+
+GAZETTEER_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "ukraine-gazetteer.csv"
+)
+
+
+def load_gazetteer(path: str = GAZETTEER_PATH) -> pd.DataFrame:
+    """
+    Loads the gazetteer indexed by canonical location name
+    """
+    gazetteer_df = pd.read_csv(path, keep_default_na=False)
+    return gazetteer_df.set_index("name")
+
+
+def trie_pattern(node: dict) -> str:
+    """
+    Turns a character trie into a regular expression. Shared prefixes are
+    only tested once and longer names are tried before their prefixes, so the
+    whole gazetteer is matched in a single left to right scan
+    """
+    is_end = "" in node
+    branches = [
+        re.escape(char) + trie_pattern(child)
+        for char, child in sorted(node.items())
+        if char != ""
+    ]
+    if not branches:
+        return ""
+    if len(branches) == 1 and not is_end:
+        return branches[0]
+    pattern = "(?:" + "|".join(branches) + ")"
+    return pattern + "?" if is_end else pattern
+
+
+class Gazetteer:
+    """
+    Location matcher compiled once from the gazetteer. Names match case
+    insensitively on word boundaries and aliases map to the canonical name.
+    Text is lowercased once per call rather than matched with re.IGNORECASE,
+    which is about twice as fast
+    """
+
+    def __init__(self, gazetteer_df: pd.DataFrame):
+        self.canonical = {}
+        for name, aliases in gazetteer_df["aliases"].items():
+            for alias in [name] + [a for a in aliases.split("|") if a]:
+                self.canonical[alias.lower()] = name
+
+        trie = {}
+        for alias in self.canonical:
+            node = trie
+            for char in alias:
+                node = node.setdefault(char, {})
+            node[""] = {}
+        self.pattern = re.compile(
+            r"(?<![0-9a-z])" + trie_pattern(trie) + r"(?![0-9a-z])"
+        )
+
+    @classmethod
+    def from_csv(cls, path: str = GAZETTEER_PATH) -> "Gazetteer":
+        """
+        Builds the matcher from a gazetteer CSV
+        """
+        return cls(load_gazetteer(path))
+
+    def find_all(self, text: str) -> list:
+        """
+        Returns every location found in text, in order of first appearance
+        """
+        found = {}
+        for match in self.pattern.finditer(text.lower()):
+            found.setdefault(self.canonical[match.group(0)], None)
+        return list(found)
+
+    def find_first(self, text: str) -> str:
+        """
+        Returns the first location found in text, empty string if none
+        """
+        match = self.pattern.search(text.lower())
+        return self.canonical[match.group(0)] if match else ""
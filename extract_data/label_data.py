@@ -5,14 +5,61 @@ Input: Raw Reddit headline and comment CSV
 Output: Labeled and clean headline and comment CSV
 """
 
+import os
+import shutil
 import string
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
+from functools import partial
+from itertools import chain
 import argparse
-from nltk.sentiment.vader import SentimentIntensityAnalyzer as SIA
 import pandas as pd
-import nltk
+from columnar import columnar_path, write_dataset
+from gazetteer import Gazetteer
+from score_cache import ScoreCache
+from vader_lexicon import sentiment_analyzer
 
-nltk.download("vader_lexicon")
+SCORE_COLUMNS = ["neg", "neu", "pos", "compound"]
+SCORE_CHUNK_SIZE = 5000
+STREAM_CHUNK_SIZE = 100000
+LABELED_COLUMNS = [
+    "created_utc",
+    "id",
+    "subreddit_id",
+    "downs",
+    "ups",
+    "author",
+    "total_awards_received",
+    "neg",
+    "neu",
+    "pos",
+    "compound",
+    "label",
+    "city",
+    "headline",
+]
+
+# ASCII characters that are not in string.printable, i.e. control characters
+UNPRINTABLE = {i: None for i in range(128) if chr(i) not in string.printable}
+# Typographic punctuation without an NFKD decomposition to ASCII
+TYPOGRAPHIC = str.maketrans(
+    {
+        "\u2018": "'",
+        "\u2019": "'",
+        "\u201c": '"',
+        "\u201d": '"',
+        "\u2013": "-",
+        "\u2014": "-",
+    }
+)
+URL_PATTERN = r"(?:https?://|www\.)\S+"
+
+# Analyzer owned by the current (worker) process, see init_scorer
+_SIA = None
+# Location matcher, see default_gazetteer
+_GAZETTEER = None
 
 
 def load_data(source_data: str) -> pd.DataFrame:
@@ -28,7 +75,7 @@ def rank_data(source_df: pd.DataFrame) -> list:
     Uses Vader Sentiment Analyzer to rank text as positive, negative, or
     nuetral using lexicon.
     """
-    sia = SIA()
+    sia = sentiment_analyzer()
     sia_data = []
     for i in range(len(source_df)):
         author = source_df.loc[i, "author"]
@@ -57,85 +104,338 @@ def rank_data(source_df: pd.DataFrame) -> list:
     return sia_data
 
 
+def init_scorer() -> None:
+    """
+    Creates the Vader analyzer for the current process. Used as process pool
+    initializer so every worker loads the lexicon once, not once per chunk
+    """
+    global _SIA
+    if _SIA is None:
+        _SIA = sentiment_analyzer()
+
+
+def score_texts(texts: list) -> list:
+    """
+    Scores a chunk of cleaned text, returns one (neg, neu, pos, compound)
+    tuple per text
+    """
+    init_scorer()
+    scores = []
+    for text in texts:
+        pol_score = _SIA.polarity_scores(text)
+        scores.append(tuple(pol_score[column] for column in SCORE_COLUMNS))
+    return scores
+
+
+def score_column(
+    texts: pd.Series,
+    workers: int = 1,
+    chunk_size: int = SCORE_CHUNK_SIZE,
+    pool: ProcessPoolExecutor = None,
+) -> pd.DataFrame:
+    """
+    Scores a whole text column in chunks. The chunks are scored in pool if
+    given (see scoring_pool), with more than one worker in a process pool
+    made for this call, otherwise in the current process. Returns
+    neg/neu/pos/compound columns aligned to the index of texts
+    """
+    values = texts.tolist()
+    if not values:
+        return pd.DataFrame(columns=SCORE_COLUMNS, index=texts.index, dtype=float)
+    chunks = [values[i : i + chunk_size] for i in range(0, len(values), chunk_size)]
+    if pool is not None:
+        scored = list(pool.map(score_texts, chunks))
+    elif workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(chunks)), initializer=init_scorer
+        ) as pool:
+            scored = list(pool.map(score_texts, chunks))
+    else:
+        scored = [score_texts(chunk) for chunk in chunks]
+    return pd.DataFrame.from_records(
+        list(chain.from_iterable(scored)), columns=SCORE_COLUMNS, index=texts.index
+    )
+
+
+def scoring_pool(scoring_mode: str = "batch", workers: int = 1):
+    """
+    Process pool for a whole run, so its workers load the lexicon once
+    instead of once per chunk of the input. With row scoring or a single
+    worker a context that does nothing and enters as None
+    """
+    if scoring_mode == "batch" and workers > 1:
+        return ProcessPoolExecutor(max_workers=workers, initializer=init_scorer)
+    return nullcontext()
+
+
+def rank_data_batch(
+    source_df: pd.DataFrame,
+    workers: int = 1,
+    chunk_size: int = SCORE_CHUNK_SIZE,
+    score_cache: ScoreCache = None,
+    clean_options: dict = None,
+    pool: ProcessPoolExecutor = None,
+) -> pd.DataFrame:
+    """
+    Column-wise version of rank_data. Produces the same scores and columns
+    as rank_data, but as a DataFrame and optionally using several processes.
+    With a score cache only rows missing from the cache are scored.
+    clean_options are passed on to clean_column, pool to score_column
+    """
+    # Comments made by AutoModerator should be excluded / cleaning step
+    source_df = source_df[source_df["author"] != "AutoModerator"]
+
+    headline = clean_column(source_df["body"], **(clean_options or {}))
+    if score_cache is None:
+        ranked_df = score_column(
+            headline, workers=workers, chunk_size=chunk_size, pool=pool
+        )
+    else:
+        keys = score_cache.keys(source_df["id"], headline)
+        ranked_df = score_cache.lookup(keys)
+        missing = ranked_df["compound"].isna()
+        if missing.any():
+            scored_df = score_column(
+                headline[missing], workers=workers, chunk_size=chunk_size, pool=pool
+            )
+            ranked_df.loc[missing, SCORE_COLUMNS] = scored_df
+            score_cache.add(keys[missing], scored_df)
+
+    ranked_df["created_utc"] = pd.to_datetime(
+        source_df["created_utc"].astype("int64"), unit="s"
+    ).dt.strftime("%Y-%m-%d")
+    for column in [
+        "id",
+        "subreddit_id",
+        "downs",
+        "ups",
+        "author",
+        "total_awards_received",
+    ]:
+        ranked_df[column] = source_df[column]
+    ranked_df["headline"] = headline
+    ranked_df["city"] = headline.map(contains_city)
+
+    return ranked_df.reset_index(drop=True)
+
+
 def clean_body(line: str) -> str:
     """
     Filters comment/headline to remove all but String of ASCII characters which
     are considered printable. This is a combination of digits, ascii_letters,
     punctuation, and whitespace. / cleaning step
     """
-    printable = set(string.printable)
-    return "".join(filter(lambda x: x in printable, line)).strip()
+    # Non-ASCII characters are dropped by the encode, ASCII control characters
+    # outside string.printable by the precompiled translate table
+    return line.encode("ascii", "ignore").decode("ascii").translate(UNPRINTABLE).strip()
 
 
-def contains_city(headline: str) -> str:
+def clean_column(
+    texts: pd.Series,
+    strip_urls: bool = False,
+    collapse_whitespace: bool = False,
+    normalize_unicode: bool = False,
+) -> pd.Series:
     """
-    Returns first city found in comment/headline from top 10 by population
+    Column-wise version of clean_body, without options the output matches
+    clean_body exactly. Optional steps remove URLs, collapse runs of
+    whitespace to a single space, and transliterate accented letters and
+    typographic punctuation to ASCII instead of dropping them
     """
-    ukraine_top_cities = [
-        "Kyiv",
-        "Kharkiv",
-        "Odesa",
-        "Dnipro",
-        "Donetsk",
-        "Zaporizhzhia",
-        "Lviv",
-        "Kryvyi Rih",
-        "Mykolaiv",
-        "Sevastopol",
-    ]
+    texts = texts.fillna("").astype(str)
+    if normalize_unicode:
+        texts = texts.str.translate(TYPOGRAPHIC).str.normalize("NFKD")
+    cleaned = texts.str.encode("ascii", "ignore").str.decode("ascii")
+    cleaned = cleaned.str.translate(UNPRINTABLE)
+    if strip_urls:
+        cleaned = cleaned.str.replace(URL_PATTERN, "", regex=True)
+    if collapse_whitespace:
+        cleaned = cleaned.str.replace(r"\s+", " ", regex=True)
+    return cleaned.str.strip()
 
-    for city in ukraine_top_cities:
-        if city.lower() in headline.lower():
-            return city
-    return ""
+
+def default_gazetteer() -> Gazetteer:
+    """
+    Returns the location matcher, compiled on first use
+    """
+    global _GAZETTEER
+    if _GAZETTEER is None:
+        _GAZETTEER = Gazetteer.from_csv()
+    return _GAZETTEER
 
 
-def label_data(sia_data: list, thresh_neg: float, thresh_pos: float) -> pd.DataFrame:
+def contains_city(headline: str, all_matches: bool = False):
+    """
+    Returns first location from the gazetteer found in comment/headline, or a
+    list of every location found when all_matches is set
+    """
+    if all_matches:
+        return default_gazetteer().find_all(headline)
+    return default_gazetteer().find_first(headline)
+
+
+def label_data(sia_data, thresh_neg: float, thresh_pos: float) -> pd.DataFrame:
     """
     -1 (Extremely Negative) to 1 (Extremely Positive)
+    Accepts the records from rank_data or the DataFrame from rank_data_batch
     """
-    labeled_df = pd.DataFrame.from_records(sia_data)
+    if isinstance(sia_data, pd.DataFrame):
+        labeled_df = sia_data
+    else:
+        labeled_df = pd.DataFrame.from_records(sia_data)
     labeled_df["label"] = 0
     labeled_df.loc[labeled_df["compound"] > thresh_pos, "label"] = 1
     labeled_df.loc[labeled_df["compound"] < thresh_neg, "label"] = -1
     return labeled_df
 
 
-def process_dataset(input_dataset: str, output_dataset: str) -> None:
+def label_frame(
+    source_df: pd.DataFrame,
+    scoring_mode: str = "batch",
+    workers: int = 1,
+    score_cache: ScoreCache = None,
+    clean_options: dict = None,
+    pool: ProcessPoolExecutor = None,
+) -> pd.DataFrame:
     """
-    Executes load, rank, and label steps on the input dataset and
-    writes a labeled CSV
+    Executes rank and label steps on raw rows and returns them with the
+    labeled dataset column order. scoring_mode "row" scores one row at a
+    time with rank_data, "batch" scores whole columns with rank_data_batch
+    using the given number of worker processes (or pool), the optional score
+    cache and the clean_column options
     """
-    source_df = load_data(input_dataset)
-
-    sia_data = rank_data(source_df)
+    if scoring_mode == "row":
+        sia_data = rank_data(source_df)
+    else:
+        sia_data = rank_data_batch(
+            source_df,
+            workers=workers,
+            score_cache=score_cache,
+            clean_options=clean_options,
+            pool=pool,
+        )
 
     labeled_df = label_data(sia_data, -0.2, 0.2)
 
     # Change order of dataframe columns
-    labeled_df = labeled_df[
-        [
-            "created_utc",
-            "id",
-            "subreddit_id",
-            "downs",
-            "ups",
-            "author",
-            "total_awards_received",
-            "neg",
-            "neu",
-            "pos",
-            "compound",
-            "label",
-            "city",
-            "headline",
-        ]
-    ]
+    return labeled_df[LABELED_COLUMNS]
+
+
+def report_cache(score_cache: ScoreCache, input_dataset: str) -> None:
+    """
+    Prints hit/scored counts of the score cache, its entries are already
+    written chunk by chunk
+    """
+    if score_cache is None:
+        return
+    print(
+        f"{input_dataset}: {score_cache.hits} cache hits, "
+        f"{score_cache.scored} rows scored"
+    )
+    score_cache.reset_counts()
+
+
+def process_dataset(
+    input_dataset: str,
+    output_dataset: str,
+    scoring_mode: str = "batch",
+    workers: int = 1,
+    score_cache: ScoreCache = None,
+    clean_options: dict = None,
+    output_format: str = "csv",
+) -> None:
+    """
+    Executes load, rank, and label steps on the input dataset and
+    writes a labeled CSV. output_format "parquet" writes a Parquet dataset
+    partitioned by day next to output_dataset instead, "both" writes both
+    """
+    source_df = load_data(input_dataset)
+
+    labeled_df = label_frame(
+        source_df,
+        scoring_mode=scoring_mode,
+        workers=workers,
+        score_cache=score_cache,
+        clean_options=clean_options,
+    )
+    report_cache(score_cache, input_dataset)
+
     # Sort by date
     sorted_labeled_df = labeled_df.sort_values(by="created_utc", ascending=False)
 
-    # Write labeled data to CSV
-    sorted_labeled_df.to_csv(output_dataset, encoding="utf-8", index=False)
+    # Write labeled data to CSV and/or partitioned Parquet
+    if output_format in ("csv", "both"):
+        sorted_labeled_df.to_csv(output_dataset, encoding="utf-8", index=False)
+    if output_format in ("parquet", "both"):
+        write_dataset(sorted_labeled_df, columnar_path(output_dataset))
+
+
+def process_dataset_streaming(
+    input_dataset: str,
+    output_dataset: str,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    scoring_mode: str = "batch",
+    workers: int = 1,
+    score_cache: ScoreCache = None,
+    clean_options: dict = None,
+    output_format: str = "csv",
+) -> None:
+    """
+    Bounded memory version of process_dataset. Reads the input dataset in
+    chunks, labels each chunk and appends its rows to one partition file per
+    day. The partitions are then concatenated newest day first, which gives
+    the same date order as sorting by created_utc without holding the
+    dataset in memory. Parquet output is appended chunk by chunk to the
+    day-partitioned dataset directly. With several workers all chunks are
+    scored by one process pool
+    """
+    write_csv = output_format in ("csv", "both")
+    write_parquet = output_format in ("parquet", "both")
+    output_dir = os.path.dirname(os.path.abspath(output_dataset))
+    with scoring_pool(scoring_mode, workers) as pool, tempfile.TemporaryDirectory(
+        dir=output_dir
+    ) as partition_dir:
+        chunks = pd.read_csv(input_dataset, lineterminator="\n", chunksize=chunk_size)
+        for chunk_no, source_df in enumerate(chunks):
+            # rank_data looks rows up by position
+            source_df = source_df.reset_index(drop=True)
+            labeled_df = label_frame(
+                source_df,
+                scoring_mode=scoring_mode,
+                workers=workers,
+                score_cache=score_cache,
+                clean_options=clean_options,
+                pool=pool,
+            )
+            if write_parquet:
+                write_dataset(
+                    labeled_df, columnar_path(output_dataset), append=chunk_no > 0
+                )
+            if not write_csv:
+                continue
+            for day, day_df in labeled_df.groupby("created_utc", sort=False):
+                day_df.to_csv(
+                    os.path.join(partition_dir, f"{day}.csv"),
+                    mode="a",
+                    header=False,
+                    encoding="utf-8",
+                    index=False,
+                )
+
+        if not write_csv:
+            report_cache(score_cache, input_dataset)
+            return
+
+        # Write the header, then copy the partitions without parsing them
+        pd.DataFrame(columns=LABELED_COLUMNS).to_csv(
+            output_dataset, encoding="utf-8", index=False
+        )
+        with open(output_dataset, mode="ab") as out_fh:
+            for partition in sorted(os.listdir(partition_dir), reverse=True):
+                with open(os.path.join(partition_dir, partition), mode="rb") as in_fh:
+                    shutil.copyfileobj(in_fh, out_fh)
+
+    report_cache(score_cache, input_dataset)
 
 
 if __name__ == "__main__":
@@ -168,15 +468,111 @@ if __name__ == "__main__":
         help="cleaned and labeled comments dataset",
         default="./data/UkrainianConflict-comments-labeled-demo.csv",
     )
-    args = parser.parse_args()
-    # process headlines
-    process_dataset(
-        input_dataset=args.headlines_input_dataset,
-        output_dataset=args.headlines_output_dataset,
+    parser.add_argument(
+        "--kinds",
+        type=str,
+        required=False,
+        help="comma separated datasets to label, headlines and/or comments",
+        default="headlines,comments",
     )
-
-    # process comments
-    process_dataset(
-        input_dataset=args.comments_input_dataset,
-        output_dataset=args.comments_output_dataset,
+    parser.add_argument(
+        "--scoring-mode",
+        type=str,
+        required=False,
+        choices=["row", "batch"],
+        help="score one row at a time or whole columns in chunks",
+        default="batch",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        required=False,
+        help="worker processes used by batch scoring, 1 scores in-process",
+        default=1,
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="label the input in chunks with bounded memory",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        required=False,
+        help="rows read per chunk in streaming mode",
+        default=STREAM_CHUNK_SIZE,
+    )
+    parser.add_argument(
+        "--score-cache",
+        type=str,
+        required=False,
+        help="SQLite score cache used by batch scoring, empty string disables it",
+        default="./data/vader-score-cache.sqlite",
+    )
+    parser.add_argument(
+        "--strip-urls",
+        action="store_true",
+        help="remove URLs from comment/headline text (batch scoring)",
+    )
+    parser.add_argument(
+        "--collapse-whitespace",
+        action="store_true",
+        help="collapse runs of whitespace to one space (batch scoring)",
     )
+    parser.add_argument(
+        "--normalize-unicode",
+        action="store_true",
+        help="transliterate accents and typographic punctuation to ASCII "
+        "instead of dropping them (batch scoring)",
+    )
+    parser.add_argument(
+        "--output-format",
+        type=str,
+        required=False,
+        choices=["csv", "parquet", "both"],
+        help="labeled CSV, Parquet partitioned by day (<output>.parquet), or both",
+        default="csv",
+    )
+    args = parser.parse_args()
+    kinds = args.kinds.split(",")
+    unknown = [kind for kind in kinds if kind not in ("headlines", "comments")]
+    if unknown:
+        parser.error(
+            f"--kinds: unknown dataset {', '.join(unknown)}, "
+            "choose from headlines, comments"
+        )
+    clean_options = {
+        "strip_urls": args.strip_urls,
+        "collapse_whitespace": args.collapse_whitespace,
+        "normalize_unicode": args.normalize_unicode,
+    }
+    # Row scoring keeps the original clean_body path
+    if args.scoring_mode == "row" and any(clean_options.values()):
+        parser.error(
+            "--strip-urls, --collapse-whitespace and --normalize-unicode "
+            "require --scoring-mode batch"
+        )
+    # Row scoring does not use the cache
+    score_cache = None
+    if args.score_cache and args.scoring_mode == "batch":
+        score_cache = ScoreCache(args.score_cache)
+    if args.streaming:
+        process = partial(process_dataset_streaming, chunk_size=args.chunk_size)
+    else:
+        process = process_dataset
+
+    datasets = {
+        "headlines": (args.headlines_input_dataset, args.headlines_output_dataset),
+        "comments": (args.comments_input_dataset, args.comments_output_dataset),
+    }
+    for kind in kinds:
+        input_dataset, output_dataset = datasets[kind]
+        process(
+            input_dataset=input_dataset,
+            output_dataset=output_dataset,
+            scoring_mode=args.scoring_mode,
+            workers=args.workers,
+            score_cache=score_cache,
+            clean_options=clean_options,
+            output_format=args.output_format,
+        )
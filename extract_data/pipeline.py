@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Runs the pipeline scripts as one dependency graph.
+Stages whose input files, code and arguments are unchanged since their last
+successful run are skipped, independent stages (e.g. the headline and comment
+branches) run in parallel. Prints the time taken by each stage
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = "./data/pipeline-state.json"
+IMPORT_PATTERN = re.compile(r"^\s*(?:from|import)\s+(\w+)", re.MULTILINE)
+# Files the modules read next to the code, hashed like code
+CODE_DATA = [os.path.join(SCRIPT_DIR, "data", "ukraine-gazetteer.csv")]
+
+
+class Stage:
+    """
+    One script run of the pipeline. Stages producing a file another stage
+    reads are its dependencies. External stages read Reddit, which can not
+    be hashed, so they run every time unless skipped
+    """
+
+    def __init__(
+        self,
+        name: str,
+        script: str,
+        args: list,
+        inputs: list,
+        outputs: list,
+        external: bool = False,
+    ):
+        self.name = name
+        self.script = script
+        self.args = args
+        self.inputs = inputs
+        self.outputs = outputs
+        self.external = external
+
+    def command(self) -> list:
+        """
+        Command line of the stage, run with the current interpreter
+        """
+        return [sys.executable, os.path.join(SCRIPT_DIR, self.script)] + self.args
+
+
+def build_stages(data_dir: str, workers: int) -> list:
+    """
+    Stages of extract -> label -> update -> emotions/aggregate on the datasets
+    in data_dir. Headlines and comments are labeled by separate stages, each
+    with its own score cache, so the two branches can run in parallel
+    """
+
+    def path(name: str) -> str:
+        return os.path.join(data_dir, f"UkrainianConflict-{name}")
+
+    stages = [
+        Stage(
+            "extract",
+            "extract_data.py",
+            ["--output-dir", data_dir],
+            [],
+            [path("headlines.csv"), path("comments.csv")],
+            external=True,
+        )
+    ]
+    for kind in ("headlines", "comments"):
+        stages.append(
+            Stage(
+                f"label_{kind}",
+                "label_data.py",
+                [
+                    "--kinds",
+                    kind,
+                    f"--{kind}-input-dataset",
+                    path(f"{kind}.csv"),
+                    f"--{kind}-output-dataset",
+                    path(f"{kind}-labeled.csv"),
+                    "--workers",
+                    str(workers),
+                    "--score-cache",
+                    os.path.join(data_dir, f"vader-score-cache-{kind}.sqlite"),
+                ],
+                [path(f"{kind}.csv")],
+                [path(f"{kind}-labeled.csv")],
+            )
+        )
+    stages += [
+        Stage(
+            "update_comments",
+            "update_data.py",
+            [
+                "--input-dataset",
+                path("comments-labeled.csv"),
+                "--output-dataset",
+                path("comments-labeled-updated.csv"),
+            ],
+            [path("comments-labeled.csv")],
+            [path("comments-labeled-updated.csv")],
+            external=True,
+        ),
+        Stage(
+            "emotions",
+            "emotions.py",
+            [
+                "--input-dataset",
+                path("headlines-labeled.csv"),
+                "--output-dataset",
+                path("headlines-emotions.csv"),
+                "--no-figures",
+            ],
+            [path("headlines-labeled.csv")],
+            [path("headlines-emotions.csv")],
+        ),
+        Stage(
+            "aggregate",
+            "aggregate_data.py",
+            [
+                "--headlines-dataset",
+                path("headlines-labeled.csv"),
+                "--comments-dataset",
+                path("comments-labeled-updated.csv"),
+                "--summary-dir",
+                os.path.join(data_dir, "summary"),
+            ],
+            [path("headlines-labeled.csv"), path("comments-labeled-updated.csv")],
+            [os.path.join(data_dir, "summary")],
+        ),
+    ]
+    return stages
+
+
+def code_files(script: str) -> list:
+    """
+    The script and the modules of this directory it imports, recursively
+    """
+    files, pending = [], [script]
+    while pending:
+        name = pending.pop()
+        if name in files:
+            continue
+        files.append(name)
+        with open(os.path.join(SCRIPT_DIR, name), mode="r", encoding="utf-8") as fh:
+            modules = IMPORT_PATTERN.findall(fh.read())
+        pending += [
+            f"{module}.py"
+            for module in modules
+            if os.path.isfile(os.path.join(SCRIPT_DIR, f"{module}.py"))
+        ]
+    return sorted(files)
+
+
+def hash_path(path: str) -> str:
+    """
+    Content hash of a file, or of every file of a directory (e.g. a Parquet
+    dataset) with its relative path. Missing paths hash to "missing"
+    """
+    if not os.path.exists(path):
+        return "missing"
+    if os.path.isfile(path):
+        files = [(os.path.basename(path), path)]
+    else:
+        files = sorted(
+            (os.path.relpath(os.path.join(root, name), path), os.path.join(root, name))
+            for root, _, names in os.walk(path)
+            for name in names
+            if not name.startswith(".")
+        )
+    digest = hashlib.blake2b(digest_size=16)
+    for name, file_path in files:
+        digest.update(name.encode("utf-8"))
+        with open(file_path, mode="rb") as fh:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def stage_key(stage: Stage) -> str:
+    """
+    Hash of everything a stage's outputs depend on: its arguments, its code
+    and the content of its input files
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps(stage.args).encode("utf-8"))
+    code = [os.path.join(SCRIPT_DIR, name) for name in code_files(stage.script)]
+    for path in code + CODE_DATA + stage.inputs:
+        digest.update(hash_path(path).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def is_current(stage: Stage, last: dict) -> bool:
+    """
+    Whether the last successful run of a stage had the same key and its
+    outputs are still the files it wrote
+    """
+    if stage.external or last is None or last["key"] != stage_key(stage):
+        return False
+    return all(hash_path(path) == last["outputs"].get(path) for path in stage.outputs)
+
+
+def load_state(state_file: str) -> dict:
+    """
+    Keys and output hashes of the last successful run of each stage
+    """
+    if not os.path.isfile(state_file):
+        return {}
+    with open(state_file, mode="r", encoding="utf-8") as fh:
+        return json.loads(fh.read())
+
+
+def save_state(state_file: str, state: dict) -> None:
+    """
+    Writes the stage state, replacing the file in one step
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(state_file)), exist_ok=True)
+    tmp = f"{state_file}.tmp"
+    with open(tmp, mode="w", encoding="utf-8") as fh:
+        fh.write(json.dumps(state, indent=2, sort_keys=True))
+    os.replace(tmp, state_file)
+
+
+def run_stage(stage: Stage, last: dict, force: bool, log_dir: str) -> tuple:
+    """
+    Runs a stage unless it is current. Output goes to a log file per stage,
+    so parallel stages do not interleave. Returns the status, seconds and
+    the new state of the stage
+    """
+    start = time.perf_counter()
+    if not force and is_current(stage, last):
+        return "skipped", time.perf_counter() - start, last
+
+    missing = [path for path in stage.inputs if not os.path.exists(path)]
+    if missing:
+        print(f"{stage.name}: missing input {', '.join(missing)}")
+        return "failed", time.perf_counter() - start, last
+
+    key = stage_key(stage)
+    log_file = os.path.join(log_dir, f"{stage.name}.log")
+    with open(log_file, mode="w", encoding="utf-8") as log:
+        result = subprocess.run(stage.command(), stdout=log, stderr=subprocess.STDOUT)
+    seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        print(
+            f"{stage.name}: failed with exit code {result.returncode}, see {log_file}"
+        )
+        return "failed", seconds, last
+
+    outputs = {path: hash_path(path) for path in stage.outputs}
+    return "ran", seconds, {"key": key, "outputs": outputs}
+
+
+def run_pipeline(
+    stages: list, state_file: str, workers: int, force: bool = False
+) -> dict:
+    """
+    Runs stages once all stages producing their inputs are done, up to
+    workers at a time. Stages depending on a failed stage are not run.
+    Returns the status and seconds of each stage
+    """
+    producers = {path: stage.name for stage in stages for path in stage.outputs}
+    depends = {
+        stage.name: {producers[path] for path in stage.inputs if path in producers}
+        for stage in stages
+    }
+    depends = {
+        name: {dep for dep in deps if dep in depends} for name, deps in depends.items()
+    }
+    state = load_state(state_file)
+    log_dir = os.path.join(
+        os.path.dirname(os.path.abspath(state_file)), "pipeline-logs"
+    )
+    os.makedirs(log_dir, exist_ok=True)
+
+    results, running = {}, {}
+    pending = {stage.name: stage for stage in stages}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                statuses = [results.get(dep, (None,))[0] for dep in depends[name]]
+                if any(status in ("failed", "not run") for status in statuses):
+                    results[name] = ("not run", 0.0)
+                    del pending[name]
+                elif all(status in ("ran", "skipped") for status in statuses):
+                    future = executor.submit(
+                        run_stage, stage, state.get(name), force, log_dir
+                    )
+                    running[future] = name
+                    del pending[name]
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                status, seconds, last = future.result()
+                results[name] = (status, seconds)
+                print(f"{name}: {status} ({seconds:.1f}s)")
+                if last is not None:
+                    state[name] = last
+                save_state(state_file, state)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--data-dir",
+        type=str,
+        required=False,
+        help="directory of the raw, labeled and summary datasets",
+        default="./data",
+    )
+    parser.add_argument(
+        "--skip",
+        type=str,
+        required=False,
+        help="comma separated stages not to run, e.g. extract,update_comments "
+        "to work on datasets already on disk",
+        default="",
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        required=False,
+        help="stages run at the same time",
+        default=2,
+    )
+    parser.add_argument(
+        "--label-workers",
+        type=int,
+        required=False,
+        help="scoring processes of each label stage",
+        default=1,
+    )
+    parser.add_argument(
+        "--state-file",
+        type=str,
+        required=False,
+        help="keys and output hashes of the last run of each stage",
+        default=STATE_FILE,
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="run every stage even if its inputs are unchanged",
+    )
+    args = parser.parse_args()
+
+    skip = set(filter(None, args.skip.split(",")))
+    stages = [
+        stage
+        for stage in build_stages(args.data_dir, args.label_workers)
+        if stage.name not in skip
+    ]
+    start = time.perf_counter()
+    results = run_pipeline(stages, args.state_file, args.parallel, force=args.force)
+
+    print(f"\n{'stage':<18}{'status':<10}{'seconds':>8}")
+    for stage in stages:
+        status, seconds = results[stage.name]
+        print(f"{stage.name:<18}{status:<10}{seconds:>8.1f}")
+    print(f"{'total':<28}{time.perf_counter() - start:>8.1f}")
+    if any(status[0] in ("failed", "not run") for status in results.values()):
+        sys.exit(1)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Persistent cache of Vader scores used by label_data.py so a re-run only
+scores rows that are new or were edited since the last run.
+Cache entries are keyed by Reddit id plus a hash of the cleaned body.
+"""
+
+import hashlib
+import os
+import sqlite3
+import pandas as pd
+
+SCORE_COLUMNS = ["neg", "neu", "pos", "compound"]
+# Keys per lookup query, below SQLite's bound parameter limit
+LOOKUP_BATCH = 500
+
+
+def cache_key(reddit_id: str, headline: str) -> str:
+    """
+    Builds the cache key for a comment/headline, an edited body gives a new key
+    """
+    body_hash = hashlib.blake2b(headline.encode("utf-8"), digest_size=8).hexdigest()
+    return f"{reddit_id}:{body_hash}"
+
+
+class ScoreCache:
+    """
+    Vader scores stored in an SQLite table keyed on the cache key. Lookups
+    only hold the keys of the current chunk in memory, and scores are
+    committed as soon as they are added, so a crashed run keeps every chunk
+    it finished
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.scored = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, "
+            "neg REAL, neu REAL, pos REAL, compound REAL) WITHOUT ROWID"
+        )
+
+    def reset_counts(self) -> None:
+        """
+        Resets the hit and scored counters, e.g. between datasets
+        """
+        self.hits = 0
+        self.scored = 0
+
+    def keys(self, ids: pd.Series, headlines: pd.Series) -> pd.Series:
+        """
+        Cache keys for aligned id and cleaned headline columns
+        """
+        return pd.Series(
+            [cache_key(str(i), h) for i, h in zip(ids, headlines)],
+            index=ids.index,
+            dtype=object,
+        )
+
+    def lookup(self, keys: pd.Series) -> pd.DataFrame:
+        """
+        Returns cached neg/neu/pos/compound aligned to keys, rows that are not
+        cached are NaN
+        """
+        values = keys.tolist()
+        scores = {}
+        for i in range(0, len(values), LOOKUP_BATCH):
+            batch = values[i : i + LOOKUP_BATCH]
+            rows = self.connection.execute(
+                f"SELECT key, {', '.join(SCORE_COLUMNS)} FROM scores "
+                f"WHERE key IN ({', '.join('?' * len(batch))})",
+                batch,
+            )
+            scores.update((row[0], row[1:]) for row in rows)
+        missing = (float("nan"),) * len(SCORE_COLUMNS)
+        found = pd.DataFrame.from_records(
+            [scores.get(key, missing) for key in values],
+            columns=SCORE_COLUMNS,
+            index=keys.index,
+        )
+        hits = int(found["compound"].notna().sum())
+        self.hits += hits
+        self.scored += len(found) - hits
+        return found
+
+    def add(self, keys: pd.Series, scores_df: pd.DataFrame) -> None:
+        """
+        Stores newly computed scores for keys and commits them
+        """
+        records = scores_df[SCORE_COLUMNS].itertuples(index=False, name=None)
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?)",
+                ((key,) + tuple(record) for key, record in zip(keys, records)),
+            )
+
+    def close(self) -> None:
+        """
+        Closes the cache file
+        """
+        self.connection.close()
@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+"""
+Labels comments as they are posted instead of in a later batch job.
+A producer thread reads the subreddit comment stream (or replays a raw CSV)
+into a bounded queue, worker threads label micro-batches of it with the
+label_data steps and append them to the labeled dataset.
+Input: Reddit comment stream, or a raw comments CSV with --replay
+Output: Labeled comments appended to CSV and/or Parquet, optionally one file
+per micro-batch moved into the dashboard drop directory
+"""
+
+import argparse
+import json
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+import numpy as np
+import pandas as pd
+from columnar import columnar_path, load_labeled, write_dataset
+from label_data import label_frame
+
+QUEUE_SIZE = 10000
+BATCH_SIZE = 500
+# Longest time a record waits for its micro-batch to fill
+BATCH_SECONDS = 2.0
+REPORT_SECONDS = 30.0
+# Queue get/put timeout, bounds how long shutdown takes to be noticed
+POLL_SECONDS = 0.5
+# Ids remembered to skip replayed records. A restarted Reddit stream replays
+# at most its last 100 comments, older ids are forgotten so memory stays
+# bounded on a daemon that runs for weeks
+RECENT_IDS = 50000
+RAW_COLUMNS = [
+    "created_utc",
+    "id",
+    "subreddit_id",
+    "downs",
+    "ups",
+    "author",
+    "total_awards_received",
+    "body",
+    "link_id",
+]
+
+
+def reddit_records(reddit):
+    """
+    New comments of the subreddit with the post they belong to. Yields None
+    whenever the stream is caught up, so the producer can notice a shutdown
+    between polls
+    """
+    # Imported here so replaying does not need PRAW credentials
+    from praw.models import MoreComments
+    from extract_data import SUBREDDIT, to_record
+
+    for comment in reddit.subreddit(SUBREDDIT).stream.comments(pause_after=0):
+        if comment is None:
+            yield None
+        elif not isinstance(comment, MoreComments):
+            yield dict(to_record(comment, comment.body), link_id=comment.link_id)
+
+
+def replay_records(input_dataset: str, rate: float = 0.0):
+    """
+    Local stand-in for the comment stream, yields the rows of a raw comments
+    CSV at rate records per second (0 as fast as possible). created_utc is
+    set to the time a row is yielded, as if it had just been posted. Rows
+    without link_id are labeled without it
+    """
+    interval = 1.0 / rate if rate > 0 else 0.0
+    next_record = time.monotonic()
+    for chunk in pd.read_csv(input_dataset, lineterminator="\n", chunksize=10000):
+        chunk = chunk.reindex(columns=RAW_COLUMNS)
+        for record in chunk.to_dict(orient="records"):
+            if interval:
+                time.sleep(max(0.0, next_record - time.monotonic()))
+                next_record += interval
+            record["created_utc"] = time.time()
+            yield record
+
+
+class RecentIds:
+    """
+    The last maxlen ids added, a set for lookups and a deque to forget the
+    oldest one when it is full
+    """
+
+    def __init__(self, ids: list = (), maxlen: int = RECENT_IDS):
+        self.order = deque(maxlen=maxlen)
+        self.ids = set()
+        for i in ids:
+            self.add(i)
+
+    def __contains__(self, i: str) -> bool:
+        return i in self.ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, i: str) -> None:
+        if i in self.ids:
+            return
+        if len(self.order) == self.order.maxlen:
+            self.ids.discard(self.order[0])
+        self.order.append(i)
+        self.ids.add(i)
+
+
+def known_ids(output_dataset: str, output_format: str, limit: int = RECENT_IDS) -> list:
+    """
+    Last limit ids in the labeled output, so a restarted stream does not
+    append them again
+    """
+    if output_format in ("csv", "both") and os.path.isfile(output_dataset):
+        ids = load_labeled(output_dataset, columns=["id"])["id"]
+    elif output_format == "parquet" and os.path.isdir(columnar_path(output_dataset)):
+        ids = load_labeled(columnar_path(output_dataset), columns=["id"])["id"]
+    else:
+        return []
+    return ids.iloc[-limit:].astype(str).tolist()
+
+
+class LagStats:
+    """
+    Rows labeled and their lag since the last report, shared by the workers.
+    lag is the time from created_utc to the row being written, in_daemon the
+    part of it spent between leaving the stream and being written
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = 0
+        self.lags = []
+        self.in_daemon = []
+        self.producer_blocked = 0.0
+        self.last_report = time.monotonic()
+
+    def add(self, lags: list, in_daemon: list) -> None:
+        """
+        Records the lags of a written micro-batch
+        """
+        with self.lock:
+            self.rows += len(lags)
+            self.lags += lags
+            self.in_daemon += in_daemon
+
+    def blocked(self, seconds: float) -> None:
+        """
+        Records time the producer waited for space in the queue
+        """
+        with self.lock:
+            self.producer_blocked += seconds
+
+    def report(self, queued: int, queue_size: int) -> str:
+        """
+        Summary of the interval since the last report, then starts a new one
+        """
+        with self.lock:
+            now = time.monotonic()
+            seconds = max(now - self.last_report, 1e-9)
+            line = (
+                f"{self.rows} rows labeled ({self.rows / seconds:.1f}/s), "
+                f"queue {queued}/{queue_size}, "
+                f"producer blocked {self.producer_blocked:.1f}s"
+            )
+            if self.lags:
+                lag_p50, lag_max = np.percentile(self.lags, [50, 100])
+                line += (
+                    f", lag p50 {lag_p50:.1f}s max {lag_max:.1f}s"
+                    f", in daemon p50 {np.percentile(self.in_daemon, 50):.2f}s"
+                )
+            self.rows = 0
+            self.lags, self.in_daemon = [], []
+            self.producer_blocked = 0.0
+            self.last_report = now
+            return line
+
+
+class StreamLabeler:
+    """
+    Producer thread, bounded queue and labeling workers. A full queue blocks
+    the producer, so a slow labeler holds back reading the stream instead of
+    buffering without limit. stop() makes the producer quit, the workers
+    then label what is queued and exit
+    """
+
+    def __init__(
+        self,
+        records,
+        output_dataset: str,
+        output_format: str = "csv",
+        drop_dir: str = None,
+        workers: int = 1,
+        queue_size: int = QUEUE_SIZE,
+        batch_size: int = BATCH_SIZE,
+        batch_seconds: float = BATCH_SECONDS,
+        max_records: int = None,
+        clean_options: dict = None,
+        recent_ids: int = RECENT_IDS,
+    ):
+        self.records = records
+        self.output_dataset = output_dataset
+        self.output_format = output_format
+        self.drop_dir = drop_dir
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.max_records = max_records
+        self.clean_options = clean_options
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stopping = threading.Event()
+        self.producer_done = threading.Event()
+        self.write_lock = threading.Lock()
+        self.seen_ids = RecentIds(
+            known_ids(output_dataset, output_format, recent_ids), recent_ids
+        )
+        self.stats = LagStats()
+        self.threads = []
+        self.error = None
+
+    def stop(self) -> None:
+        """
+        Stops reading the stream, queued records are still labeled
+        """
+        self.stopping.set()
+
+    def produce(self) -> None:
+        """
+        Moves new records from the stream into the queue, waiting while it is
+        full. Records recently labeled (e.g. replayed by a restarted stream)
+        are skipped. A record is only marked seen once it is queued, so one
+        interrupted by stop() is read again by the next run
+        """
+        queued = 0
+        try:
+            for record in self.records:
+                if self.stopping.is_set():
+                    break
+                if record is None or str(record["id"]) in self.seen_ids:
+                    continue
+                item = (record, time.time())
+                put = False
+                while not put and not self.stopping.is_set():
+                    start = time.monotonic()
+                    try:
+                        self.queue.put(item, timeout=POLL_SECONDS)
+                        put = True
+                    except queue.Full:
+                        pass
+                    finally:
+                        self.stats.blocked(time.monotonic() - start)
+                if not put:
+                    break
+                self.seen_ids.add(str(record["id"]))
+                queued += 1
+                if self.max_records is not None and queued >= self.max_records:
+                    break
+        finally:
+            self.producer_done.set()
+
+    def next_batch(self) -> list:
+        """
+        Up to batch_size queued records, returned once batch_seconds passed
+        since the first of them arrived. Empty if nothing arrived in time
+        """
+        try:
+            batch = [self.queue.get(timeout=POLL_SECONDS)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.producer_done.is_set() and self.queue.empty():
+                break
+            try:
+                batch.append(self.queue.get(timeout=min(remaining, POLL_SECONDS)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def label_batch(self, batch: list) -> None:
+        """
+        Cleans, scores and city tags a micro-batch and appends it to the
+        outputs. link_id is kept, so the rows can be grouped by thread like
+        the updated comments
+        """
+        source_df = pd.DataFrame([record for record, _ in batch], columns=RAW_COLUMNS)
+        labeled_df = label_frame(source_df, clean_options=self.clean_options)
+        if labeled_df.empty:
+            return
+        link_ids = source_df.set_index("id")["link_id"]
+        # label_frame returns a column selection, assign makes a new frame
+        # instead of writing into it
+        labeled_df = labeled_df.assign(link_id=labeled_df["id"].map(link_ids))
+        with self.write_lock:
+            if self.output_format in ("csv", "both"):
+                exists = os.path.isfile(self.output_dataset)
+                if exists:
+                    # Lined up with the header of the file, e.g. link_id is
+                    # left out of a labeled dataset written by label_data.py
+                    header = pd.read_csv(self.output_dataset, nrows=0).columns
+                    csv_df = labeled_df.reindex(columns=header)
+                else:
+                    csv_df = labeled_df
+                csv_df.to_csv(
+                    self.output_dataset,
+                    mode="a",
+                    header=not exists,
+                    encoding="utf-8",
+                    index=False,
+                )
+            if self.output_format in ("parquet", "both"):
+                write_dataset(
+                    labeled_df, columnar_path(self.output_dataset), append=True
+                )
+        if self.drop_dir is not None:
+            # Written under a hidden name and moved, so the dashboard never
+            # reads a partial file
+            name = f"comments-{uuid.uuid4().hex}.csv"
+            tmp = os.path.join(self.drop_dir, f".{name}.tmp")
+            labeled_df.to_csv(tmp, encoding="utf-8", index=False)
+            os.replace(tmp, os.path.join(self.drop_dir, name))
+
+        written = time.time()
+        self.stats.add(
+            [written - float(record["created_utc"]) for record, _ in batch],
+            [written - received for _, received in batch],
+        )
+
+    def work(self) -> None:
+        """
+        Labels micro-batches until the producer is done and the queue empty.
+        A failed batch stops the daemon, so records do not pile up unlabeled
+        """
+        while True:
+            batch = self.next_batch()
+            if batch:
+                try:
+                    self.label_batch(batch)
+                except Exception as error:
+                    self.error = error
+                    self.stop()
+                    raise
+            elif self.producer_done.is_set() and self.queue.empty():
+                return
+
+    def start(self) -> None:
+        """
+        Starts the producer and worker threads
+        """
+        if self.drop_dir is not None:
+            os.makedirs(self.drop_dir, exist_ok=True)
+        self.threads = [threading.Thread(target=self.produce, name="stream-producer")]
+        self.threads += [
+            threading.Thread(target=self.work, name=f"stream-worker-{i}")
+            for i in range(self.workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def join(self, report_seconds: float = REPORT_SECONDS) -> None:
+        """
+        Waits for all threads, printing a lag report every report_seconds
+        and once at the end
+        """
+        for thread in self.threads:
+            while thread.is_alive():
+                thread.join(timeout=report_seconds)
+                if thread.is_alive():
+                    print(self.stats.report(self.queue.qsize(), self.queue.maxsize))
+        print(self.stats.report(self.queue.qsize(), self.queue.maxsize))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--output-dataset",
+        type=str,
+        required=False,
+        help="labeled comments dataset the stream is appended to, appending to "
+        "an existing CSV keeps its columns",
+        default="./data/UkrainianConflict-comments-labeled-stream.csv",
+    )
+    parser.add_argument(
+        "--output-format",
+        type=str,
+        required=False,
+        choices=["csv", "parquet", "both"],
+        help="append to the CSV, the Parquet dataset (<output>.parquet), or both",
+        default="csv",
+    )
+    parser.add_argument(
+        "--drop-dir",
+        type=str,
+        required=False,
+        help="also move each labeled micro-batch into this directory, e.g. the "
+        "DASHBOARD_DROP_DIR of a running dashboard",
+        default=None,
+    )
+    parser.add_argument(
+        "--replay",
+        type=str,
+        required=False,
+        help="raw comments CSV replayed instead of reading the Reddit stream",
+        default=None,
+    )
+    parser.add_argument(
+        "--replay-rate",
+        type=float,
+        required=False,
+        help="records per second replayed, 0 as fast as possible",
+        default=0.0,
+    )
+    parser.add_argument(
+        "--max-records",
+        type=int,
+        required=False,
+        help="stop after this many new records, default runs until interrupted",
+        default=None,
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        required=False,
+        help="labeling threads",
+        default=1,
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        required=False,
+        help="records buffered between the stream and the workers",
+        default=QUEUE_SIZE,
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        required=False,
+        help="most records labeled per micro-batch",
+        default=BATCH_SIZE,
+    )
+    parser.add_argument(
+        "--batch-seconds",
+        type=float,
+        required=False,
+        help="longest wait for a micro-batch to fill",
+        default=BATCH_SECONDS,
+    )
+    parser.add_argument(
+        "--report-seconds",
+        type=float,
+        required=False,
+        help="seconds between lag reports",
+        default=REPORT_SECONDS,
+    )
+    parser.add_argument(
+        "--recent-ids",
+        type=int,
+        required=False,
+        help="most recent ids remembered to skip records the stream replays",
+        default=RECENT_IDS,
+    )
+    parser.add_argument(
+        "--strip-urls",
+        action="store_true",
+        help="remove URLs from comment text",
+    )
+    parser.add_argument(
+        "--collapse-whitespace",
+        action="store_true",
+        help="collapse runs of whitespace to one space",
+    )
+    parser.add_argument(
+        "--normalize-unicode",
+        action="store_true",
+        help="transliterate accents and typographic punctuation to ASCII "
+        "instead of dropping them",
+    )
+    args = parser.parse_args()
+
+    if args.replay is not None:
+        records = replay_records(args.replay, rate=args.replay_rate)
+    else:
+        import praw
+
+        with open("creds.json", mode="r", encoding="utf-8") as fh:
+            creds = json.loads(fh.read())[0]
+        records = reddit_records(
+            praw.Reddit(
+                client_id=creds["client_id"],
+                client_secret=creds["client_secret"],
+                user_agent=creds["user_agent"],
+            )
+        )
+
+    labeler = StreamLabeler(
+        records,
+        args.output_dataset,
+        output_format=args.output_format,
+        drop_dir=args.drop_dir,
+        workers=args.workers,
+        queue_size=args.queue_size,
+        batch_size=args.batch_size,
+        batch_seconds=args.batch_seconds,
+        max_records=args.max_records,
+        recent_ids=args.recent_ids,
+        clean_options={
+            "strip_urls": args.strip_urls,
+            "collapse_whitespace": args.collapse_whitespace,
+            "normalize_unicode": args.normalize_unicode,
+        },
+    )
+
+    # Ctrl-C or SIGTERM stops reading, what is queued is labeled before exit
+    def shutdown(signum, frame) -> None:
+        print(f"{signal.Signals(signum).name} received, draining the queue")
+        labeler.stop()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    labeler.start()
+    labeler.join(args.report_seconds)
+    if labeler.error is not None:
+        sys.exit(1)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Generates synthetic Reddit headline and comment datasets for benchmarks.
+Output: Raw headline or comment CSV with the columns written by
+extract_data.write_file. The same seed always gives the same file.
+"""
+
+import argparse
+import numpy as np
+import pandas as pd
+from gazetteer import load_gazetteer
+
+# 2022-11-16 00:00 UTC, start of the dashboard date range
+START_UTC = 1668556800
+DAYS = 20
+CHUNK_SIZE = 100000
+SIZES = {"1k": 1000, "100k": 100000, "10m": 10000000}
+
+NEUTRAL_WORDS = (
+    "the a of to in and on for with at from by is are was were has have will "
+    "russian ukrainian forces army troops soldiers president minister official "
+    "report says said front line region city village near after before during "
+    "new more than over under about against says today week night morning"
+).split()
+POSITIVE_WORDS = (
+    "support help win victory liberated free hope brave good great strong "
+    "success peace thanks agree safe rescue"
+).split()
+NEGATIVE_WORDS = (
+    "attack war killed dead shelling missile strike destroyed fear lost loss "
+    "crisis threat bad terrible blackout damage wounded"
+).split()
+NOISE = [
+    "https://t.co/x1y2z3",
+    "www.reuters.com/world",
+    "’s",
+    "“claims”",
+    "—",
+    "café",
+    "\U0001f1fa\U0001f1e6",
+    "!!",
+    "?",
+]
+KINDS = {
+    # words per body, share of AutoModerator rows, id offset
+    "headlines": (8, 24, 0.0, 10**9),
+    "comments": (3, 60, 0.02, 2 * 10**9),
+}
+
+
+def base36(values: np.ndarray) -> list:
+    """
+    Reddit style base36 ids
+    """
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    ids = []
+    for value in values.tolist():
+        chars = []
+        while value:
+            value, rem = divmod(value, 36)
+            chars.append(digits[rem])
+        ids.append("".join(reversed(chars)))
+    return ids
+
+
+def vocabulary() -> tuple:
+    """
+    Words bodies are drawn from and their probabilities. Locations from the
+    gazetteer and sentiment words are rare, like in real text
+    """
+    locations = [n for n in load_gazetteer().index]
+    groups = [
+        (NEUTRAL_WORDS, 0.80),
+        (POSITIVE_WORDS, 0.07),
+        (NEGATIVE_WORDS, 0.09),
+        (locations, 0.02),
+        (NOISE, 0.02),
+    ]
+    words = [w for group, _ in groups for w in group]
+    weights = [share / len(group) for group, share in groups for _ in group]
+    return np.array(words, dtype=object), np.array(weights)
+
+
+def generate_chunk(
+    kind: str, start: int, rows: int, rng: np.random.Generator, vocab: tuple
+) -> pd.DataFrame:
+    """
+    Generates rows [start, start + rows) of a synthetic dataset
+    """
+    min_words, max_words, automod_share, id_offset = KINDS[kind]
+    words, weights = vocab
+
+    lengths = rng.integers(min_words, max_words, rows)
+    tokens = rng.choice(words, size=int(lengths.sum()), p=weights)
+    bodies = [" ".join(body) for body in np.split(tokens, np.cumsum(lengths)[:-1])]
+    if kind == "comments":
+        # Multi-line comments exercise the "\n" line terminator handling
+        multiline = np.flatnonzero(rng.random(rows) < 0.05)
+        for i in multiline.tolist():
+            bodies[i] = bodies[i].replace(" ", "\n", 1)
+
+    authors = rng.integers(0, 5000, rows).astype(str).astype(object)
+    authors = "user_" + authors
+    authors[rng.random(rows) < automod_share] = "AutoModerator"
+    created_utc = START_UTC + rng.integers(0, DAYS * 86400, rows)
+
+    return pd.DataFrame(
+        {
+            "created_utc": created_utc.astype(float),
+            "id": base36(np.arange(start, start + rows) + id_offset),
+            "subreddit_id": "t5_synthetic",
+            "downs": 0,
+            "ups": np.minimum(rng.zipf(1.7, rows), 50000),
+            "author": authors,
+            "total_awards_received": rng.poisson(0.05, rows),
+            "body": bodies,
+        }
+    )
+
+
+def generate_dataset(kind: str, rows: int, output_dataset: str, seed: int = 0) -> None:
+    """
+    Writes a synthetic raw dataset chunk by chunk, so 10M rows fit in memory
+    """
+    rng = np.random.default_rng(seed)
+    vocab = vocabulary()
+    for start in range(0, rows, CHUNK_SIZE):
+        chunk = generate_chunk(kind, start, min(CHUNK_SIZE, rows - start), rng, vocab)
+        chunk.to_csv(
+            output_dataset,
+            mode="w" if start == 0 else "a",
+            header=start == 0,
+            index=False,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--kind",
+        type=str,
+        required=False,
+        choices=list(KINDS),
+        help="generate headlines or comments",
+        default="comments",
+    )
+    parser.add_argument(
+        "--size",
+        type=str,
+        required=False,
+        choices=list(SIZES),
+        help="number of rows",
+        default="1k",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        required=False,
+        help="random seed",
+        default=0,
+    )
+    parser.add_argument(
+        "--output-dataset",
+        type=str,
+        required=False,
+        help="raw dataset to write, ./data/synthetic-<kind>-<size>-seed<seed>.csv "
+        "by default",
+        default=None,
+    )
+    args = parser.parse_args()
+    output_dataset = args.output_dataset or (
+        f"./data/synthetic-{args.kind}-{args.size}-seed{args.seed}.csv"
+    )
+    generate_dataset(args.kind, SIZES[args.size], output_dataset, seed=args.seed)
@@ -0,0 +1,9 @@
+"""
+The pipeline scripts import their sibling modules by name, so tests run with
+the extract_data directory on the path
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
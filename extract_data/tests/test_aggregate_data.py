@@ -0,0 +1,110 @@
+"""
+Tests of the incremental summary tables of aggregate_data.py
+"""
+
+import json
+import os
+import pandas as pd
+from aggregate_data import MANIFEST, HEADLINE_COLUMNS, aggregate, day_hashes, with_day
+
+DAYS = ["2022-11-20", "2022-11-21", "2022-11-22"]
+
+
+def headlines() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "created_utc": [
+                f"{day} 1{hour}:00:00" for day in DAYS for hour in range(3)
+            ],
+            "id": [f"h{i}" for i in range(9)],
+            "compound": [0.1 * i for i in range(9)],
+            "city": ["Kyiv", "Kherson", ""] * 3,
+        }
+    )
+
+
+def comments() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "created_utc": [f"{day} 12:00:00" for day in DAYS for _ in range(2)],
+            "id": [f"c{i}" for i in range(6)],
+            "compound": [0.5, -0.5] * 3,
+            "label": [1, -1] * 3,
+            "link_id": [f"t3_h{i // 2 * 3}" for i in range(6)],
+        }
+    )
+
+
+def write(tmp_path, headlines_df: pd.DataFrame, comments_df: pd.DataFrame) -> tuple:
+    headlines_path = str(tmp_path / "headlines.csv")
+    comments_path = str(tmp_path / "comments.csv")
+    headlines_df.to_csv(headlines_path, index=False)
+    comments_df.to_csv(comments_path, index=False)
+    return headlines_path, comments_path
+
+
+def partition_times(summary_dir: str) -> dict:
+    return {
+        os.path.join(root, name): os.stat(os.path.join(root, name)).st_mtime_ns
+        for root, _, names in os.walk(summary_dir)
+        for name in names
+        if name.endswith(".parquet")
+    }
+
+
+def test_only_changed_days_are_rewritten(tmp_path):
+    summary_dir = str(tmp_path / "summary")
+    paths = write(tmp_path, headlines(), comments())
+    assert aggregate(*paths, summary_dir) == {
+        "daily_sentiment": DAYS,
+        "city_sentiment": DAYS,
+        "thread_sentiment": DAYS,
+    }
+    before = partition_times(summary_dir)
+
+    edited = headlines()
+    edited.loc[4, "compound"] = -0.9
+    paths = write(tmp_path, edited, comments())
+    assert aggregate(*paths, summary_dir) == {
+        "daily_sentiment": ["2022-11-21"],
+        "city_sentiment": ["2022-11-21"],
+        "thread_sentiment": [],
+    }
+
+    after = partition_times(summary_dir)
+    assert before.keys() == after.keys()
+    changed = {path for path in after if after[path] != before[path]}
+    assert changed == {
+        os.path.join(summary_dir, table, "created_utc=2022-11-21", "part-0.parquet")
+        for table in ("daily_sentiment", "city_sentiment")
+    }
+    daily = pd.read_parquet(os.path.join(summary_dir, "daily_sentiment"))
+    assert daily["count"].sum() == 9 + 6
+
+
+def test_reordered_rows_keep_the_manifest(tmp_path):
+    summary_dir = str(tmp_path / "summary")
+    aggregate(*write(tmp_path, headlines(), comments()), summary_dir)
+    with open(os.path.join(summary_dir, MANIFEST), encoding="utf-8") as fh:
+        manifest = json.load(fh)
+
+    shuffled = (
+        headlines().sample(frac=1, random_state=1),
+        comments().sample(frac=1, random_state=2),
+    )
+    rewritten = aggregate(*write(tmp_path, *shuffled), summary_dir)
+
+    assert all(days == [] for days in rewritten.values())
+    with open(os.path.join(summary_dir, MANIFEST), encoding="utf-8") as fh:
+        assert json.load(fh) == manifest
+
+
+def test_day_hash_keeps_every_bit_of_the_sum():
+    labeled_df = with_day(headlines().iloc[:1])
+    row_hash = pd.util.hash_pandas_object(
+        labeled_df[HEADLINE_COLUMNS], index=False
+    ).iloc[0]
+
+    assert day_hashes(labeled_df, HEADLINE_COLUMNS) == {
+        "2022-11-20": f"{int(row_hash):016x}-1"
+    }
@@ -0,0 +1,37 @@
+"""
+Tests of the NRC emotion counts of emotions.py
+"""
+
+import pandas as pd
+from emotions import build_index, load_lexicon, score_headlines
+
+
+def test_headlines_are_scored_with_the_nrclex_lexicon():
+    headlines = pd.DataFrame(
+        {
+            "id": ["a", "b", "c"],
+            "headline": ["war and peace", "Kyiv attack", None],
+        }
+    )
+    lexicon = load_lexicon()
+
+    scores = score_headlines(headlines["headline"].fillna("").tolist(), build_index())
+
+    assert len(scores) == len(headlines)
+    assert scores.loc[0].to_dict() == {
+        emotion: lexicon["war"].count(emotion) + lexicon["peace"].count(emotion)
+        for emotion in scores.columns
+    }
+    assert scores.loc[1].to_dict() == {
+        emotion: lexicon["attack"].count(emotion) for emotion in scores.columns
+    }
+    assert scores.loc[2].sum() == 0
+
+
+def test_given_lexicon_is_used_instead_of_nrclex():
+    index = build_index({"war": ["fear", "negative"], "peace": ["joy"]})
+
+    scores = score_headlines(["war war peace", "nothing here"], index)
+
+    assert list(scores.columns) == ["fear", "joy", "negative"]
+    assert scores.values.tolist() == [[2, 1, 2], [0, 0, 0]]
@@ -0,0 +1,64 @@
+"""
+Tests of the gazetteer location matcher
+"""
+
+import filecmp
+import os
+import pandas as pd
+import pytest
+from gazetteer import GAZETTEER_PATH, Gazetteer
+
+EXTRACT_DATA = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DASHBOARD_GAZETTEER = os.path.join(
+    os.path.dirname(EXTRACT_DATA), "dashboard", "data", "ukraine-gazetteer.csv"
+)
+
+
+@pytest.fixture(scope="module")
+def gazetteer():
+    return Gazetteer.from_csv()
+
+
+@pytest.mark.parametrize(
+    "text, location",
+    [
+        ("Explosions in Kyiv tonight", "Kyiv"),
+        ("KYIV: air raid alert", "Kyiv"),
+        ("Shelling near Kiev", "Kyiv"),
+        ("Kyivstar network is down", ""),
+        ("Lvov, then Kharkov", "Lviv"),
+        ("Fighting in the Kherson region", "Kherson Oblast"),
+        ("Kherson is liberated", "Kherson"),
+        ("Lugansk Oblast frontline", "Luhansk Oblast"),
+        ("Odessa port reopens", "Odesa"),
+        ("Drone over (Donetsk).", "Donetsk"),
+        ("Peace talks", ""),
+    ],
+)
+def test_find_first(gazetteer, text, location):
+    assert gazetteer.find_first(text) == location
+
+
+def test_find_all_in_order_of_first_appearance(gazetteer):
+    text = "From Kharkov to Kyiv, then back to Kharkiv and the Donbass"
+    assert gazetteer.find_all(text) == ["Kharkiv", "Kyiv", "Donbas"]
+
+
+def test_oblast_aliases_are_preferred_over_their_city(gazetteer):
+    text = "Kyiv region and Zaporozhye region, not Zaporizhzhia"
+    assert gazetteer.find_all(text) == [
+        "Kyiv Oblast",
+        "Zaporizhzhia Oblast",
+        "Zaporizhzhia",
+    ]
+
+
+def test_every_alias_maps_to_its_name(gazetteer):
+    gazetteer_df = pd.read_csv(GAZETTEER_PATH, keep_default_na=False)
+    for name, aliases in zip(gazetteer_df["name"], gazetteer_df["aliases"]):
+        for alias in [name] + [a for a in aliases.split("|") if a]:
+            assert gazetteer.find_first(f"News from {alias} today") == name
+
+
+def test_dashboard_copy_matches_the_pipeline_gazetteer():
+    assert filecmp.cmp(GAZETTEER_PATH, DASHBOARD_GAZETTEER, shallow=False)
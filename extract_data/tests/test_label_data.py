@@ -0,0 +1,127 @@
+"""
+Tests of label_data.py scoring and its command line
+"""
+
+import os
+import subprocess
+import sys
+import pandas as pd
+import pytest
+import label_data
+from label_data import (
+    LABELED_COLUMNS,
+    SCORE_COLUMNS,
+    label_frame,
+    process_dataset_streaming,
+    score_column,
+)
+
+EXTRACT_DATA = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def raw_rows(authors: list) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "created_utc": 1668938400,
+            "id": [f"c{i}" for i in range(len(authors))],
+            "subreddit_id": "t5_2s4kb",
+            "downs": 0,
+            "ups": 3,
+            "author": authors,
+            "total_awards_received": 0,
+            "body": "Great news from Kyiv",
+        }
+    )
+
+
+def test_empty_column_scores_to_an_empty_frame():
+    scored = score_column(pd.Series([], dtype=str), workers=2)
+
+    assert scored.empty
+    assert list(scored.columns) == SCORE_COLUMNS
+
+
+def test_streaming_scores_every_chunk_in_one_pool(tmp_path, monkeypatch):
+    pools = []
+
+    class CountedPool(label_data.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            pools.append(self)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(label_data, "ProcessPoolExecutor", CountedPool)
+    raw_rows(["someone"] * 30).to_csv(tmp_path / "comments.csv", index=False)
+    for workers in (1, 2):
+        process_dataset_streaming(
+            str(tmp_path / "comments.csv"),
+            str(tmp_path / f"labeled-{workers}.csv"),
+            chunk_size=10,
+            workers=workers,
+        )
+
+    assert len(pools) == 1
+    pd.testing.assert_frame_equal(
+        pd.read_csv(tmp_path / "labeled-1.csv"),
+        pd.read_csv(tmp_path / "labeled-2.csv"),
+    )
+
+
+def test_chunk_of_only_automoderator_rows_labels_to_an_empty_frame():
+    labeled_df = label_frame(raw_rows(["AutoModerator", "AutoModerator"]))
+
+    assert labeled_df.empty
+    assert list(labeled_df.columns) == LABELED_COLUMNS
+
+
+@pytest.mark.parametrize(
+    "option", ["--strip-urls", "--collapse-whitespace", "--normalize-unicode"]
+)
+def test_clean_options_are_rejected_with_row_scoring(option):
+    result = subprocess.run(
+        [sys.executable, "label_data.py", "--scoring-mode", "row", option],
+        cwd=EXTRACT_DATA,
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 2
+    assert "require --scoring-mode batch" in result.stderr
+
+
+def test_kinds_labels_only_the_datasets_given(tmp_path):
+    raw_rows(["someone", "someone else"]).to_csv(tmp_path / "comments.csv", index=False)
+
+    subprocess.run(
+        [
+            sys.executable,
+            "label_data.py",
+            "--kinds",
+            "comments",
+            "--comments-input-dataset",
+            str(tmp_path / "comments.csv"),
+            "--comments-output-dataset",
+            str(tmp_path / "comments-labeled.csv"),
+            "--headlines-output-dataset",
+            str(tmp_path / "headlines-labeled.csv"),
+            "--score-cache",
+            "",
+        ],
+        cwd=EXTRACT_DATA,
+        check=True,
+        capture_output=True,
+    )
+
+    assert len(pd.read_csv(tmp_path / "comments-labeled.csv")) == 2
+    assert not (tmp_path / "headlines-labeled.csv").exists()
+
+
+def test_unknown_kind_is_rejected():
+    result = subprocess.run(
+        [sys.executable, "label_data.py", "--kinds", "comments,posts"],
+        cwd=EXTRACT_DATA,
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 2
+    assert "unknown dataset posts" in result.stderr
@@ -0,0 +1,118 @@
+"""
+Tests of pipeline.py running stub stage scripts
+"""
+
+import pytest
+import pipeline
+from pipeline import Stage, build_stages, code_files, run_pipeline
+
+# Copies its input to its output with the marker of helper.py appended
+PRODUCE = """
+import sys
+import helper
+
+with open(sys.argv[1], encoding="utf-8") as fh:
+    text = fh.read()
+with open(sys.argv[2], mode="w", encoding="utf-8") as fh:
+    fh.write(text + helper.MARKER)
+"""
+FAIL = """
+import sys
+
+sys.exit(1)
+"""
+
+
+@pytest.fixture
+def scripts(tmp_path, monkeypatch):
+    script_dir = tmp_path / "scripts"
+    script_dir.mkdir()
+    (script_dir / "produce.py").write_text(PRODUCE, encoding="utf-8")
+    (script_dir / "helper.py").write_text('MARKER = "a"\n', encoding="utf-8")
+    (script_dir / "fail.py").write_text(FAIL, encoding="utf-8")
+    monkeypatch.setattr(pipeline, "SCRIPT_DIR", str(script_dir))
+    monkeypatch.setattr(pipeline, "CODE_DATA", [])
+    return script_dir
+
+
+def chain(tmp_path, first_script: str = "produce.py") -> list:
+    """
+    raw.csv -> first -> mid.csv -> second -> out.csv
+    """
+    raw, mid, out = (str(tmp_path / name) for name in ("raw.csv", "mid.csv", "out.csv"))
+    return [
+        Stage("first", first_script, [raw, mid], [raw], [mid]),
+        Stage("second", "produce.py", [mid, out], [mid], [out]),
+    ]
+
+
+def statuses(results: dict) -> dict:
+    return {name: status for name, (status, _) in results.items()}
+
+
+def run(tmp_path, stages: list) -> dict:
+    return statuses(run_pipeline(stages, str(tmp_path / "state.json"), workers=2))
+
+
+def test_code_files_follow_local_imports(scripts):
+    assert code_files("produce.py") == ["helper.py", "produce.py"]
+    assert code_files("fail.py") == ["fail.py"]
+
+
+def test_unchanged_rerun_is_skipped(scripts, tmp_path):
+    (tmp_path / "raw.csv").write_text("id\n1\n", encoding="utf-8")
+    stages = chain(tmp_path)
+
+    assert run(tmp_path, stages) == {"first": "ran", "second": "ran"}
+    assert run(tmp_path, stages) == {"first": "skipped", "second": "skipped"}
+    assert (tmp_path / "out.csv").read_text(encoding="utf-8") == "id\n1\naa"
+
+
+def test_changed_input_reruns_its_dependents(scripts, tmp_path):
+    (tmp_path / "raw.csv").write_text("id\n1\n", encoding="utf-8")
+    stages = chain(tmp_path)
+    run(tmp_path, stages)
+
+    (tmp_path / "raw.csv").write_text("id\n2\n", encoding="utf-8")
+    assert run(tmp_path, stages) == {"first": "ran", "second": "ran"}
+    assert (tmp_path / "out.csv").read_text(encoding="utf-8") == "id\n2\naa"
+
+
+def test_changed_imported_module_reruns(scripts, tmp_path):
+    (tmp_path / "raw.csv").write_text("id\n1\n", encoding="utf-8")
+    stages = chain(tmp_path)
+    run(tmp_path, stages)
+
+    (scripts / "helper.py").write_text('MARKER = "b"\n', encoding="utf-8")
+    assert run(tmp_path, stages) == {"first": "ran", "second": "ran"}
+    assert (tmp_path / "out.csv").read_text(encoding="utf-8") == "id\n1\nbb"
+
+
+def test_edited_output_reruns_the_stage_that_wrote_it(scripts, tmp_path):
+    (tmp_path / "raw.csv").write_text("id\n1\n", encoding="utf-8")
+    stages = chain(tmp_path)
+    run(tmp_path, stages)
+
+    (tmp_path / "out.csv").write_text("edited", encoding="utf-8")
+    assert run(tmp_path, stages) == {"first": "skipped", "second": "ran"}
+
+
+def test_failed_producer_marks_dependents_not_run(scripts, tmp_path):
+    (tmp_path / "raw.csv").write_text("id\n1\n", encoding="utf-8")
+    stages = chain(tmp_path, first_script="fail.py")
+    out, last = str(tmp_path / "out.csv"), str(tmp_path / "last.csv")
+    stages.append(Stage("third", "produce.py", [out, last], [out], [last]))
+
+    assert run(tmp_path, stages) == {
+        "first": "failed",
+        "second": "not run",
+        "third": "not run",
+    }
+    assert not (tmp_path / "out.csv").exists()
+
+
+def test_stages_write_to_the_data_dir(tmp_path):
+    data_dir = str(tmp_path / "data")
+    for stage in build_stages(data_dir, workers=1):
+        assert data_dir in " ".join(stage.args)
+        assert all(path.startswith(data_dir) for path in stage.inputs + stage.outputs)
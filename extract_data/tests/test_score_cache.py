@@ -0,0 +1,40 @@
+"""
+Tests of the SQLite score cache
+"""
+
+import pandas as pd
+from score_cache import ScoreCache
+
+SCORES = pd.DataFrame(
+    {"neg": [0.1, 0.0], "neu": [0.8, 1.0], "pos": [0.1, 0.0], "compound": [0.2, 0.0]}
+)
+
+
+def test_added_scores_survive_without_close(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ScoreCache(path)
+    keys = cache.keys(pd.Series(["a", "b"]), pd.Series(["good", "fine"]))
+    cache.add(keys, SCORES)
+
+    # A second process, e.g. the re-run after a crash, sees the entries
+    found = ScoreCache(path).lookup(keys)
+    pd.testing.assert_frame_equal(found, SCORES)
+
+
+def test_lookup_counts_hits_and_misses(tmp_path):
+    cache = ScoreCache(str(tmp_path / "cache.sqlite"))
+    keys = cache.keys(pd.Series(["a", "b"]), pd.Series(["good", "fine"]))
+    cache.add(keys[:1], SCORES[:1])
+
+    found = cache.lookup(keys)
+    assert found["compound"].isna().tolist() == [False, True]
+    assert (cache.hits, cache.scored) == (1, 1)
+
+
+def test_edited_body_is_a_miss(tmp_path):
+    cache = ScoreCache(str(tmp_path / "cache.sqlite"))
+    cache.add(cache.keys(pd.Series(["a"]), pd.Series(["good"])), SCORES[:1])
+
+    found = cache.lookup(cache.keys(pd.Series(["a"]), pd.Series(["good, edited"])))
+    assert found["compound"].isna().all()
+
@@ -0,0 +1,151 @@
+"""
+Tests of stream_label.py replaying a raw comments CSV
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+import pandas as pd
+from label_data import label_frame
+from stream_label import RecentIds, StreamLabeler
+
+EXTRACT_DATA = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LABELED_COLUMNS = [
+    "created_utc",
+    "id",
+    "subreddit_id",
+    "downs",
+    "ups",
+    "author",
+    "total_awards_received",
+    "neg",
+    "neu",
+    "pos",
+    "compound",
+    "label",
+    "city",
+    "headline",
+]
+
+
+def raw_comments(path: str, count: int, start: int = 0) -> None:
+    pd.DataFrame(
+        {
+            "created_utc": 1668938400,
+            "id": [f"c{i}" for i in range(start, start + count)],
+            "subreddit_id": "t5_2s4kb",
+            "downs": 0,
+            "ups": 3,
+            "author": "someone",
+            "total_awards_received": 0,
+            "body": [
+                f"Comment {i} about the great news from Kyiv" for i in range(count)
+            ],
+            "link_id": [f"t3_post{i % 4}" for i in range(start, start + count)],
+        }
+    ).to_csv(path, index=False)
+
+
+def replay(raw_path: str, output_path: str, *args: str) -> None:
+    subprocess.run(
+        [
+            sys.executable,
+            "stream_label.py",
+            "--replay",
+            raw_path,
+            "--output-dataset",
+            output_path,
+            "--batch-size",
+            "10",
+            "--batch-seconds",
+            "0.1",
+            *args,
+        ],
+        cwd=EXTRACT_DATA,
+        check=True,
+        capture_output=True,
+    )
+
+
+def test_replay_writes_labeled_rows_with_link_id(tmp_path):
+    raw_path = str(tmp_path / "raw.csv")
+    output_path = str(tmp_path / "stream.csv")
+    raw_comments(raw_path, 25)
+
+    replay(raw_path, output_path)
+
+    output = pd.read_csv(output_path, lineterminator="\n")
+    assert output.columns.tolist() == LABELED_COLUMNS + ["link_id"]
+    assert sorted(output["id"]) == sorted(f"c{i}" for i in range(25))
+    assert output.set_index("id").loc["c5", "link_id"] == "t3_post1"
+    assert output["city"].eq("Kyiv").all()
+    assert output["label"].eq(1).all()
+
+
+def test_replay_keeps_columns_of_existing_labeled_csv(tmp_path):
+    raw_path = str(tmp_path / "raw.csv")
+    output_path = str(tmp_path / "labeled.csv")
+    # A dataset as written by label_data.py, without link_id
+    raw_comments(raw_path, 5)
+    existing = label_frame(pd.read_csv(raw_path).drop(columns="link_id"))
+    existing.to_csv(output_path, index=False)
+    raw_comments(raw_path, 30, start=5)
+
+    replay(raw_path, output_path)
+
+    output = pd.read_csv(output_path, lineterminator="\n")
+    assert output.columns.tolist() == LABELED_COLUMNS
+    assert sorted(output["id"]) == sorted(f"c{i}" for i in range(35))
+
+
+def test_replay_skips_ids_already_written(tmp_path):
+    raw_path = str(tmp_path / "raw.csv")
+    output_path = str(tmp_path / "stream.csv")
+    raw_comments(raw_path, 20)
+    replay(raw_path, output_path, "--max-records", "8")
+    assert len(pd.read_csv(output_path, lineterminator="\n")) == 8
+
+    replay(raw_path, output_path)
+
+    output = pd.read_csv(output_path, lineterminator="\n")
+    assert len(output) == 20
+    assert output["id"].is_unique
+
+
+def test_replay_parquet_output(tmp_path):
+    raw_path = str(tmp_path / "raw.csv")
+    raw_comments(raw_path, 15)
+
+    replay(raw_path, str(tmp_path / "stream.csv"), "--output-format", "parquet")
+
+    output = pd.read_parquet(tmp_path / "stream.parquet")
+    assert sorted(output["id"]) == sorted(f"c{i}" for i in range(15))
+    assert output["link_id"].notna().all()
+
+
+def test_recent_ids_forget_the_oldest():
+    recent = RecentIds(["a", "b", "a"], maxlen=3)
+    recent.add("c")
+    recent.add("d")
+
+    assert len(recent) == 3
+    assert "a" not in recent
+    assert all(i in recent for i in ("b", "c", "d"))
+
+
+def test_record_interrupted_by_stop_is_not_marked_seen(tmp_path):
+    records = [{"id": f"c{i}"} for i in range(3)]
+    labeler = StreamLabeler(iter(records), str(tmp_path / "stream.csv"), queue_size=1)
+    producer = threading.Thread(target=labeler.produce)
+    producer.start()
+    # c0 fills the queue, c1 waits for space until the labeler stops
+    while labeler.queue.empty():
+        time.sleep(0.01)
+    labeler.stop()
+    producer.join()
+
+    assert "c0" in labeler.seen_ids
+    assert "c1" not in labeler.seen_ids
+    assert labeler.queue.qsize() == 1
@@ -0,0 +1,279 @@
+"""
+Tests of update_data.py against a local stand-in for the Reddit API
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pandas as pd
+import praw
+import pytest
+from prawcore.exceptions import Forbidden, ServerError
+from update_data import RateLimiter, load_checkpoint, load_data, update_dataset
+
+
+class FakeReddit(ThreadingHTTPServer):
+    """
+    Answers the OAuth token request and /api/info with the comments it
+    holds. fail_requests makes the next info requests fail with that status,
+    every request for a comment in fail_ids answers 500
+    """
+
+    def __init__(self, comments: dict):
+        super().__init__(("127.0.0.1", 0), FakeRedditHandler)
+        self.comments = comments
+        self.info_requests = []
+        self.fail_requests = []
+        self.fail_ids = set()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class FakeRedditHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args) -> None:
+        pass
+
+    def send_json(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_json(
+            200,
+            {
+                "access_token": "token",
+                "token_type": "bearer",
+                "expires_in": 3600,
+                "scope": "*",
+            },
+        )
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        fullnames = parse_qs(url.query)["id"][0].split(",")
+        with self.server.lock:
+            self.server.info_requests.append((time.monotonic(), fullnames))
+            status = (
+                self.server.fail_requests.pop(0) if self.server.fail_requests else 200
+            )
+            if self.server.fail_ids.intersection(fullnames):
+                status = 500
+        if status != 200:
+            self.send_json(status, {"message": "unavailable"})
+            return
+        children = [
+            {"kind": "t1", "data": self.server.comments[name[3:]]}
+            for name in fullnames
+            if name[3:] in self.server.comments
+        ]
+        self.send_json(
+            200, {"kind": "Listing", "data": {"children": children, "after": None}}
+        )
+
+
+def fake_comment(comment_id: str, ups: int) -> dict:
+    return {
+        "id": comment_id,
+        "name": f"t1_{comment_id}",
+        "ups": ups,
+        "downs": 0,
+        "link_id": f"t3_post{int(comment_id[1:]) % 3}",
+        "total_awards_received": 1,
+        "body": "text",
+    }
+
+
+@pytest.fixture
+def reddit_api():
+    server = FakeReddit(
+        {f"c{i}": fake_comment(f"c{i}", ups=100 + i) for i in range(250)}
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def factory(server: FakeReddit):
+    def reddit_factory() -> praw.Reddit:
+        return praw.Reddit(
+            client_id="id",
+            client_secret="secret",
+            user_agent="update_data tests",
+            oauth_url=server.url,
+            reddit_url=server.url,
+            check_for_updates=False,
+        )
+
+    return reddit_factory
+
+
+def labeled(count: int) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "id": [f"c{i}" for i in range(count)],
+            "ups": 1,
+            "downs": 0,
+            "total_awards_received": 0,
+            "compound": 0.5,
+        }
+    )
+
+
+def test_fetches_100_fullnames_per_request(reddit_api, tmp_path):
+    updated = update_dataset(
+        labeled(250),
+        factory(reddit_api),
+        str(tmp_path / "checkpoint.csv"),
+        max_workers=2,
+        requests_per_second=100,
+    )
+
+    sizes = sorted(len(fullnames) for _, fullnames in reddit_api.info_requests)
+    assert sizes == [50, 100, 100]
+    assert updated["ups"].tolist() == [100 + i for i in range(250)]
+    assert updated["link_id"].iloc[4] == "t3_post1"
+    assert updated["compound"].eq(0.5).all()
+
+
+def test_rate_limit_spaces_requests(reddit_api, tmp_path):
+    update_dataset(
+        labeled(250),
+        factory(reddit_api),
+        str(tmp_path / "checkpoint.csv"),
+        batch_size=50,
+        max_workers=4,
+        requests_per_second=10,
+    )
+
+    times = sorted(at for at, _ in reddit_api.info_requests)
+    assert len(times) == 5
+    # 0.1 s apart. Times are taken by the server thread, so a single gap
+    # can shrink by the jitter of sending a request, the span cannot
+    assert times[-1] - times[0] > 0.38
+
+
+def test_rate_limiter_shared_by_threads():
+    limiter = RateLimiter(20)
+    calls = []
+
+    def call() -> None:
+        limiter.wait()
+        calls.append(time.monotonic())
+
+    threads = [threading.Thread(target=call) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    calls.sort()
+    assert calls[-1] - calls[0] >= 5 * 0.05 - 0.01
+
+
+def test_server_error_is_retried(reddit_api, tmp_path):
+    reddit_api.fail_requests = [503]
+    updated = update_dataset(
+        labeled(100),
+        factory(reddit_api),
+        str(tmp_path / "checkpoint.csv"),
+        requests_per_second=100,
+    )
+
+    assert len(reddit_api.info_requests) == 2
+    assert updated["ups"].tolist() == [100 + i for i in range(100)]
+
+
+def test_resumes_from_checkpoint(reddit_api, tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.csv")
+    # The second batch is refused (not retried), the first is checkpointed
+    reddit_api.fail_requests = [200, 403]
+    with pytest.raises(Forbidden):
+        update_dataset(
+            labeled(200),
+            factory(reddit_api),
+            checkpoint,
+            max_workers=1,
+            requests_per_second=100,
+        )
+    assert len(load_checkpoint(checkpoint)) == 100
+
+    reddit_api.info_requests.clear()
+    reddit_api.fail_requests = []
+    updated = update_dataset(
+        labeled(200),
+        factory(reddit_api),
+        checkpoint,
+        max_workers=1,
+        requests_per_second=100,
+    )
+
+    # Only the comments missing from the checkpoint are fetched again
+    fetched = [name for _, fullnames in reddit_api.info_requests for name in fullnames]
+    assert fetched == [f"t1_c{i}" for i in range(100, 200)]
+    assert updated["ups"].tolist() == [100 + i for i in range(200)]
+
+
+def test_failed_batch_does_not_discard_the_others(reddit_api, tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.csv")
+    # Every request of the second batch fails, also when PRAW retries it
+    reddit_api.fail_ids = {"t1_c150"}
+    with pytest.raises(ServerError):
+        update_dataset(
+            labeled(250),
+            factory(reddit_api),
+            checkpoint,
+            max_workers=1,
+            requests_per_second=100,
+        )
+    done = set(load_checkpoint(checkpoint)["id"])
+    assert done == {f"c{i}" for i in list(range(100)) + list(range(200, 250))}
+
+    reddit_api.info_requests.clear()
+    reddit_api.fail_ids = set()
+    updated = update_dataset(
+        labeled(250), factory(reddit_api), checkpoint, requests_per_second=100
+    )
+
+    fetched = [name for _, fullnames in reddit_api.info_requests for name in fullnames]
+    assert fetched == [f"t1_c{i}" for i in range(100, 200)]
+    assert updated["ups"].tolist() == [100 + i for i in range(250)]
+
+
+def test_comments_not_returned_are_checkpointed(reddit_api, tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.csv")
+    # c250 to c259 are deleted, the API does not return them
+    updated = update_dataset(
+        labeled(260), factory(reddit_api), checkpoint, requests_per_second=100
+    )
+    assert len(load_checkpoint(checkpoint)) == 260
+    assert updated["ups"].tolist() == [100 + i for i in range(250)] + [1] * 10
+
+    reddit_api.info_requests.clear()
+    update_dataset(
+        labeled(260), factory(reddit_api), checkpoint, requests_per_second=100
+    )
+    assert reddit_api.info_requests == []
+
+
+def test_numeric_ids_are_read_as_strings(tmp_path):
+    path = tmp_path / "labeled.csv"
+    ids = ["12345", "00123", "abc"]
+    pd.DataFrame({"id": ids, "link_id": ["t3_1", "t3_2", "t3_3"]}).to_csv(
+        path, index=False
+    )
+    dataset = load_data(str(path))
+
+    assert dataset["id"].tolist() == ids
+    updates = pd.Series({"12345": 7}, name="ups")
+    assert dataset["id"].map(updates).iloc[0] == 7
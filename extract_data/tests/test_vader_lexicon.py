@@ -0,0 +1,84 @@
+"""
+Tests of the cached VADER lexicon
+"""
+
+import pickle
+
+import nltk
+import pytest
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+import vader_lexicon
+from vader_lexicon import (
+    CACHE_VERSION,
+    NLTK_LEXICON,
+    CachedSentimentAnalyzer,
+    load_lexicon,
+    parse_lexicon,
+)
+
+TEXTS = [
+    "Kyiv is not bad at all :)",
+    "Shelling in Kharkiv, VERY sad news!!!",
+    "The bridge was rebuilt but the city still lacks power",
+    "",
+]
+
+
+@pytest.fixture
+def small_lexicon(tmp_path, monkeypatch):
+    """
+    nltk_data lexicon replaced by a two word file, and nothing loaded yet
+    """
+    nltk_data = tmp_path / "nltk_data"
+    (nltk_data / "sentiment").mkdir(parents=True)
+    lexicon_file = nltk_data / "sentiment" / "small_lexicon.txt"
+    lexicon_file.write_text("good\t1.9\t0.9\t[]\nbad\t-2.5\t0.5\t[]")
+    monkeypatch.setattr(nltk.data, "path", [str(nltk_data)])
+    monkeypatch.setattr(vader_lexicon, "NLTK_LEXICON", "sentiment/small_lexicon.txt")
+    monkeypatch.setattr(vader_lexicon, "_LEXICON", None)
+    monkeypatch.setattr(nltk, "download", pytest.fail)
+    return {"good": 1.9, "bad": -2.5}
+
+
+def test_outdated_cache_is_rebuilt(tmp_path, small_lexicon):
+    cache = tmp_path / "vader-lexicon.pickle"
+    with open(cache, mode="wb") as fh:
+        pickle.dump({"version": CACHE_VERSION - 1, "lexicon": {"stale": 1.0}}, fh)
+
+    assert load_lexicon(str(cache)) == small_lexicon
+    with open(cache, mode="rb") as fh:
+        assert pickle.load(fh) == {"version": CACHE_VERSION, "lexicon": small_lexicon}
+
+
+def test_current_cache_is_not_rebuilt(tmp_path, small_lexicon):
+    cache = tmp_path / "vader-lexicon.pickle"
+    with open(cache, mode="wb") as fh:
+        pickle.dump({"version": CACHE_VERSION, "lexicon": {"cached": 1.0}}, fh)
+
+    assert load_lexicon(str(cache)) == {"cached": 1.0}
+
+
+def test_missing_lexicon_is_not_downloaded(tmp_path, monkeypatch, small_lexicon):
+    monkeypatch.setattr(
+        vader_lexicon, "NLTK_LEXICON", "sentiment/missing.zip/missing/missing.txt"
+    )
+    with pytest.raises(LookupError, match="python vader_lexicon.py"):
+        load_lexicon(str(tmp_path / "vader-lexicon.pickle"))
+
+
+def test_untested_nltk_is_refused(monkeypatch):
+    monkeypatch.setattr(nltk, "__version__", "9.0.0")
+    with pytest.raises(RuntimeError, match="untested"):
+        CachedSentimentAnalyzer({})
+
+
+def test_scores_match_sentiment_intensity_analyzer():
+    try:
+        lexicon_text = nltk.data.load(NLTK_LEXICON)
+    except LookupError:
+        pytest.skip("nltk_data has no vader_lexicon")
+    cached = CachedSentimentAnalyzer(parse_lexicon(lexicon_text))
+    reference = SentimentIntensityAnalyzer()
+    for text in TEXTS:
+        assert cached.polarity_scores(text) == reference.polarity_scores(text)
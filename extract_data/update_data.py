@@ -2,49 +2,224 @@
 """
 Updates dataset columns with current reddit metrics
 """
+import argparse
 import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import praw
 import pandas as pd
+from columnar import columnar_path, write_dataset
+
+# Reddit's /api/info accepts up to 100 fullnames per request
+BATCH_SIZE = 100
+MAX_WORKERS = 4
+# Reddit allows 100 OAuth requests per minute
+REQUESTS_PER_SECOND = 1.5
+UPDATE_COLUMNS = ["ups", "downs", "link_id", "total_awards_received"]
+
+
+class RateLimiter:
+    """
+    Spaces requests shared by all worker threads at least 1 / rate seconds apart
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self.next_request = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        """
+        Blocks until the caller may send its request
+        """
+        with self.lock:
+            now = time.monotonic()
+            request_at = max(now, self.next_request)
+            self.next_request = request_at + self.interval
+        time.sleep(request_at - now)
 
 
 def load_data(source_data: str) -> pd.DataFrame:
     """
-    Loads dataset
+    Loads dataset, ids are read as strings so base36 ids made only of
+    digits still match the checkpoint
     """
-    source_df = pd.read_csv(source_data, lineterminator="\n")
+    source_df = pd.read_csv(
+        source_data, lineterminator="\n", dtype={"id": str, "link_id": str}
+    )
     return source_df
 
 
-def update_dataset(dataset: str):
+def load_checkpoint(checkpoint: str) -> pd.DataFrame:
+    """
+    Loads metrics fetched by an earlier, interrupted run
+    """
+    if not os.path.isfile(checkpoint):
+        return pd.DataFrame(columns=["id"] + UPDATE_COLUMNS)
+    return pd.read_csv(checkpoint, dtype={"id": str, "link_id": str})
+
+
+def fetch_batch(reddit: praw.Reddit, comment_ids: list, limiter: RateLimiter) -> list:
+    """
+    Fetches current metrics for up to BATCH_SIZE comments in one request.
+    Comments the API does not return (deleted or removed) get a record
+    without metrics, so they are checkpointed and keep their old values
+    """
+    limiter.wait()
+    fullnames = [f"t1_{comment_id}" for comment_id in comment_ids]
+    records = [
+        {
+            "id": comment.id,
+            "ups": comment.ups,
+            "downs": comment.downs,
+            "link_id": comment.link_id,
+            "total_awards_received": comment.total_awards_received,
+        }
+        for comment in reddit.info(fullnames=fullnames)
+    ]
+    returned = {record["id"] for record in records}
+    records += [{"id": i} for i in comment_ids if i not in returned]
+    return records
+
+
+def update_dataset(
+    dataset: pd.DataFrame,
+    reddit_factory,
+    checkpoint: str,
+    batch_size: int = BATCH_SIZE,
+    max_workers: int = MAX_WORKERS,
+    requests_per_second: float = REQUESTS_PER_SECOND,
+) -> pd.DataFrame:
     """
     Updates selected columns in existing dataset with new data extracted from
-    Reddit API
-    """
-    for i in range(len(dataset)):
-        comment_id = dataset.loc[i, "id"]
-        comment = reddit.comment(comment_id)
-        dataset.loc[i, "ups"] = comment.ups
-        dataset.loc[i, "downs"] = comment.downs
-        dataset.loc[i, "link_id"] = comment.link_id
-        dataset.loc[i, "total_awards_received"] = comment.total_awards_received
-        print(f"record {i} updated")
+    Reddit API. Comments are fetched in batches by a bounded pool of threads,
+    each with its own client from reddit_factory. Every finished batch is
+    appended to the checkpoint CSV, comments already in it are not fetched
+    again, so an interrupted run resumes where it stopped. A failed batch
+    does not stop the others, the first error is raised once they finished
+    """
+    done = set(load_checkpoint(checkpoint)["id"])
+    pending = [i for i in dataset["id"].drop_duplicates() if i not in done]
+    batches = [pending[i : i + batch_size] for i in range(0, len(pending), batch_size)]
+    print(f"{len(done)} records checkpointed, {len(pending)} records to update")
+
+    limiter = RateLimiter(requests_per_second)
+    local = threading.local()
+
+    def fetch(comment_ids: list) -> list:
+        if not hasattr(local, "reddit"):
+            local.reddit = reddit_factory()
+        return fetch_batch(local.reddit, comment_ids, limiter)
+
+    updated = 0
+    errors = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(fetch, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            try:
+                records = future.result()
+            except Exception as error:  # keep checkpointing the other batches
+                batch = futures[future]
+                print(f"batch {batch[0]}..{batch[-1]} failed: {error!r}")
+                errors.append(error)
+                continue
+            batch_df = pd.DataFrame(records, columns=["id"] + UPDATE_COLUMNS)
+            batch_df.to_csv(
+                checkpoint,
+                mode="a",
+                header=not os.path.isfile(checkpoint),
+                index=False,
+            )
+            updated += len(records)
+            print(f"records updated {updated}")
+    if errors:
+        print(f"{len(errors)} of {len(batches)} batches failed, rerun to resume")
+        raise errors[0]
+
+    updates = load_checkpoint(checkpoint).drop_duplicates("id", keep="last")
+    updates = updates.set_index("id")
+    for column in UPDATE_COLUMNS:
+        fresh = dataset["id"].map(updates[column])
+        if column in dataset:
+            fresh = fresh.fillna(dataset[column]).astype(dataset[column].dtype)
+        dataset[column] = fresh
     return dataset
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--input-dataset",
+        type=str,
+        required=False,
+        help="labeled comments dataset",
+        default="./data/UkrainianConflict-comments-labeled.csv",
+    )
+    parser.add_argument(
+        "--output-dataset",
+        type=str,
+        required=False,
+        help="labeled comments dataset with current metrics",
+        default="./data/UkrainianConflict-comments-labeled-updated.csv",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        required=False,
+        help="comments fetched per request, at most 100",
+        default=BATCH_SIZE,
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        required=False,
+        help="concurrent requests",
+        default=MAX_WORKERS,
+    )
+    parser.add_argument(
+        "--requests-per-second",
+        type=float,
+        required=False,
+        help="client-side rate limit shared by all workers",
+        default=REQUESTS_PER_SECOND,
+    )
+    parser.add_argument(
+        "--output-format",
+        type=str,
+        required=False,
+        choices=["csv", "parquet", "both"],
+        help="CSV, Parquet partitioned by day (<output>.parquet), or both",
+        default="csv",
+    )
+    args = parser.parse_args()
+
     with open("creds.json", mode="r", encoding="utf-8") as fh:
         creds = json.loads(fh.read())[0]
 
-    reddit = praw.Reddit(
-        client_id=creds["client_id"],
-        client_secret=creds["client_secret"],
-        user_agent=creds["user_agent"],
-    )
-    source_dataset = load_data("./data/UkrainianConflict-comments-labeled.csv")
-    updated_dataset = update_dataset(source_dataset)
+    # Any other PRAW setting in creds.json (e.g. oauth_url) is passed through
+    def reddit_factory() -> praw.Reddit:
+        return praw.Reddit(**creds)
 
-    updated_dataset.to_csv(
-        "./data/UkrainianConflict-comments-labeled-updated.csv",
-        header=True,
-        index=False,
+    checkpoint = f"{args.output_dataset}.checkpoint"
+    source_dataset = load_data(args.input_dataset)
+    updated_dataset = update_dataset(
+        source_dataset,
+        reddit_factory,
+        checkpoint,
+        batch_size=args.batch_size,
+        max_workers=args.workers,
+        requests_per_second=args.requests_per_second,
     )
+
+    if args.output_format in ("csv", "both"):
+        updated_dataset.to_csv(
+            args.output_dataset,
+            header=True,
+            index=False,
+        )
+    if args.output_format in ("parquet", "both"):
+        write_dataset(updated_dataset, columnar_path(args.output_dataset))
+    if os.path.isfile(checkpoint):
+        os.remove(checkpoint)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+VADER lexicon for label_data.py, parsed once and cached as a pickle so
+analyzers are built without reading nltk_data or reaching the network.
+Run directly to build the cache, e.g. before copying it to workers without
+network access.
+Input: vader_lexicon from nltk_data (downloaded if missing when run directly)
+Output: Pickled lexicon dictionary next to the gazetteer
+"""
+
+import argparse
+import os
+import pickle
+import nltk
+from nltk.sentiment.vader import SentimentIntensityAnalyzer, VaderConstants
+
+LEXICON_CACHE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "vader-lexicon.pickle"
+)
+NLTK_LEXICON = "sentiment/vader_lexicon.zip/vader_lexicon/vader_lexicon.txt"
+# Bump when the cached format changes, older caches are rebuilt
+CACHE_VERSION = 1
+# nltk releases whose SentimentIntensityAnalyzer.__init__ only sets
+# lexicon_file, lexicon and constants, see CachedSentimentAnalyzer
+NLTK_VERSIONS = ("3.7", "3.8", "3.9", "3.10")
+
+# Lexicon loaded by the current process, see load_lexicon
+_LEXICON = None
+
+
+class CachedSentimentAnalyzer(SentimentIntensityAnalyzer):
+    """
+    Vader analyzer using an already parsed lexicon instead of parsing the
+    nltk_data text file, scores are the same.
+    SentimentIntensityAnalyzer.__init__ is skipped because it reads nltk_data,
+    so the attributes it sets are set here instead. That was checked against
+    NLTK_VERSIONS only, other nltk releases are refused rather than risk an
+    analyzer missing attributes
+    """
+
+    def __init__(self, lexicon: dict):
+        if ".".join(nltk.__version__.split(".")[:2]) not in NLTK_VERSIONS:
+            raise RuntimeError(
+                f"nltk {nltk.__version__} is untested with CachedSentimentAnalyzer, "
+                f"supported versions are {', '.join(NLTK_VERSIONS)}"
+            )
+        self.lexicon_file = None
+        self.lexicon = lexicon
+        self.constants = VaderConstants()
+
+
+def parse_lexicon(lexicon_text: str) -> dict:
+    """
+    Word to valence dictionary, parsed like SentimentIntensityAnalyzer does
+    """
+    lexicon = {}
+    for line in lexicon_text.split("\n"):
+        word, measure = line.strip().split("\t")[0:2]
+        lexicon[word] = float(measure)
+    return lexicon
+
+
+def build_cache(path: str = LEXICON_CACHE, download: bool = True) -> dict:
+    """
+    Parses the nltk_data lexicon and writes the cache. The lexicon is only
+    downloaded when it is not in nltk_data and download is set
+    """
+    try:
+        lexicon_text = nltk.data.load(NLTK_LEXICON)
+    except LookupError:
+        if not download:
+            raise
+        print(f"{path} and nltk_data vader_lexicon not found, downloading it")
+        nltk.download("vader_lexicon", quiet=True)
+        lexicon_text = nltk.data.load(NLTK_LEXICON)
+    lexicon = parse_lexicon(lexicon_text)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, mode="wb") as fh:
+        pickle.dump(
+            {"version": CACHE_VERSION, "lexicon": lexicon},
+            fh,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(tmp, path)
+    return lexicon
+
+
+def load_lexicon(path: str = LEXICON_CACHE) -> dict:
+    """
+    Returns the lexicon, loaded from the cache on first use and built from
+    nltk_data if the cache is missing or outdated. Never downloads, run
+    vader_lexicon.py for that
+    """
+    global _LEXICON
+    if _LEXICON is None:
+        cached = {}
+        if os.path.isfile(path):
+            with open(path, mode="rb") as fh:
+                cached = pickle.load(fh)
+        if cached.get("version") == CACHE_VERSION:
+            _LEXICON = cached["lexicon"]
+        else:
+            try:
+                _LEXICON = build_cache(path, download=False)
+            except LookupError:
+                raise LookupError(
+                    f"VADER lexicon cache {path} is missing or outdated and "
+                    "nltk_data has no vader_lexicon, run `python vader_lexicon.py` "
+                    "to download it and build the cache"
+                ) from None
+    return _LEXICON
+
+
+def sentiment_analyzer() -> CachedSentimentAnalyzer:
+    """
+    Vader analyzer on the cached lexicon
+    """
+    return CachedSentimentAnalyzer(load_lexicon())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--output",
+        type=str,
+        required=False,
+        help="lexicon cache file",
+        default=LEXICON_CACHE,
+    )
+    args = parser.parse_args()
+    lexicon = build_cache(args.output)
+    print(f"{len(lexicon)} words written to {args.output}")